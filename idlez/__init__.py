@@ -1,5 +1,51 @@
-from . import events as events
-from . import store as store
-from . import data as data
-from . import game as game
-from . import bot as bot
+import importlib
+from typing import TYPE_CHECKING, Any
+
+# Submodules are imported on first access, so tools that only need the engine
+# (store, game, data) do not pay for importing discord.py through idlez.bot.
+_SUBMODULES = {
+    "bot",
+    "cli",
+    "data",
+    "events",
+    "game",
+    "leaderboard",
+    "loadtest",
+    "log",
+    "query",
+    "rollup",
+    "replication",
+    "rng",
+    "scheduler",
+    "store",
+    "storetool",
+    "timing",
+}
+
+if TYPE_CHECKING:
+    from . import log as log
+    from . import events as events
+    from . import store as store
+    from . import storetool as storetool
+    from . import leaderboard as leaderboard
+    from . import rng as rng
+    from . import rollup as rollup
+    from . import query as query
+    from . import replication as replication
+    from . import scheduler as scheduler
+    from . import timing as timing
+    from . import data as data
+    from . import game as game
+    from . import bot as bot
+    from . import loadtest as loadtest
+    from . import cli as cli
+
+
+def __getattr__(name: str) -> Any:
+    if name in _SUBMODULES:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | _SUBMODULES)
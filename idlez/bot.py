@@ -1,14 +1,22 @@
 import discord
 import asyncio
-from typing import Any
+import logging
+import time
+from typing import Any, Awaitable, Callable, Iterable, Optional
 import pathlib
 
 import idlez.data
 import idlez.game
+import idlez.query
+import idlez.scheduler
 import idlez.store
 import idlez.events as events
 import idlez.events.components as components
 from idlez.store import GuildId
+from idlez.log import MESSAGES_LOGGER
+
+logger = logging.getLogger(__name__)
+message_logger = logging.getLogger(MESSAGES_LOGGER)
 
 
 class IdleZBot(discord.Client):
@@ -17,8 +25,48 @@ class IdleZBot(discord.Client):
     data: idlez.data.Data
 
     data_picker: idlez.data.DataPicker
+    game_event_handlers: events.HandlerRegistry
     channel_name: str = "idlez"
     channel: dict[int, discord.TextChannel]
+    # Ids of the #idlez channels and their threads, so messages anywhere else
+    # are dropped with a single lookup
+    channel_ids: set[int]
+    guild_channel_ids: dict[GuildId, set[int]]
+
+    command_prefix: str = "!"
+    commands: dict[str, Callable[[discord.Message, list[str]], Awaitable[None]]]
+    leaderboard_size: int = 10
+    # Seconds a player has to wait between two status commands
+    status_cooldown: float = 30.0
+    # Rendered status messages together with the time they were rendered and
+    # the level and experience they show. Entries are only used while the
+    # player still has these; the rank in them may be up to status_cache_ttl
+    # seconds old.
+    status_cache: dict[
+        idlez.store.PlayerId,
+        tuple[float, idlez.store.Level, idlez.store.Experience, str],
+    ]
+    status_cache_ttl: float = 300.0
+    status_requested: dict[idlez.store.PlayerId, float]
+    _status_pruned: float = 0.0
+    tick_scheduler: idlez.scheduler.AdaptiveTickScheduler
+    # If set, each guild ticks on its own at a phase within the interval,
+    # instead of all guilds at once. The key None stands for the part of the
+    # tick that concerns all guilds.
+    guild_ticker: Optional[idlez.scheduler.StaggeredTicker[Optional[GuildId]]]
+
+    # In low memory mode, no members and messages are cached. Instead, the
+    # status of registered players is tracked from raw presence updates.
+    low_memory: bool
+    presences: dict[tuple[GuildId, idlez.store.PlayerId], discord.Status]
+
+    # If set, the game content is reloaded whenever a file in it changes
+    content_dir: Optional[pathlib.Path]
+    content_check_interval: float = 30.0
+    # If set, snapshots of the store are published to it for queries
+    query_server: Optional[idlez.query.QueryServer]
+    snapshot_interval: float = 30.0
+    change_flush_interval: float = 1.0
 
     def __init__(
         self,
@@ -27,14 +75,56 @@ class IdleZBot(discord.Client):
         game: idlez.game.IdleZ,
         store_path: pathlib.Path,
         data: idlez.data.Data,
+        low_memory: bool = False,
+        content_dir: Optional[pathlib.Path] = None,
+        query_server: Optional[idlez.query.QueryServer] = None,
+        staggered_ticks: bool = False,
         **kwargs: Any,
     ):
+        if low_memory:
+            kwargs.setdefault("member_cache_flags", discord.MemberCacheFlags.none())
+            kwargs.setdefault("chunk_guilds_at_startup", False)
+            kwargs.setdefault("max_messages", None)
+            kwargs.setdefault("enable_raw_presences", True)
         super().__init__(intents=intents, **kwargs)
+        self.low_memory = low_memory
+        self.presences = dict()
         self.game = game
         self.store_path = store_path
         self.data = data
         self.channel: dict[GuildId, discord.TextChannel] = dict()
+        self.channel_ids = set()
+        self.guild_channel_ids = dict()
         self.data_picker = idlez.data.DataPicker(data)
+        self.content_dir = content_dir
+        self.query_server = query_server
+
+        self.game_event_handlers = events.HandlerRegistry()
+        self.game_event_handlers.register(events.LevelUpEvent, self.on_level_up)
+        self.game_event_handlers.register(
+            events.LevelUpSummaryEvent, self.on_level_up_summary
+        )
+        self.game_event_handlers.register(events.NewPlayerEvent, self.on_new_player)
+        self.game_event_handlers.register(events.NewPlayersEvent, self.on_new_players)
+        self.game_event_handlers.register(events.PlayerNoiseEvent, self.on_player_noise)
+        self.game_event_handlers.register(
+            events.SinglePlayerEvent, self.on_single_player
+        )
+        self.game_event_handlers.register(events.PlayerFightEvent, self.on_player_fight)
+
+        self.commands = {
+            "top": self.on_top_command,
+            "rank": self.on_rank_command,
+            "status": self.on_status_command,
+        }
+        self.status_cache = dict()
+        self.status_requested = dict()
+        self.tick_scheduler = idlez.scheduler.AdaptiveTickScheduler()
+        self.guild_ticker = None
+        if staggered_ticks:
+            self.guild_ticker = idlez.scheduler.StaggeredTicker(
+                interval=self.tick_scheduler.min_interval
+            )
 
         game.register_handler(self.on_game_event)
         game.player_idle_state_callback = self.get_player_idle_state
@@ -42,47 +132,285 @@ class IdleZBot(discord.Client):
     def get_player_idle_state(
         self, player_id: int, guild_id: int
     ) -> idlez.game.IdleState:
+        if self.low_memory:
+            status = self.presences.get((guild_id, player_id), discord.Status.offline)
+            return idle_state_from_status(status)
+
         guild = self.get_guild(guild_id)
         if not guild:
             return idlez.game.IdleState.OFFLINE
         member = guild.get_member(player_id)
         if not member:
             return idlez.game.IdleState.OFFLINE
-        if member.status == discord.Status.offline:
-            return idlez.game.IdleState.OFFLINE
-        elif member.status in [discord.Status.online, discord.Status.idle]:
-            return idlez.game.IdleState.ONLINE
-        return idlez.game.IdleState.AWAY
+        return idle_state_from_status(member.status)
+
+    async def on_raw_presence_update(
+        self, payload: discord.RawPresenceUpdateEvent
+    ) -> None:
+        if not self.low_memory or payload.guild_id is None:
+            return
+        if self.game.player_guild(payload.user_id) != payload.guild_id:
+            # Only the presence of registered players is kept
+            return
+        self.set_presence(
+            payload.guild_id, payload.user_id, payload.client_status.status
+        )
+
+    def set_presence(
+        self, guild_id: GuildId, player_id: idlez.store.PlayerId, status: discord.Status
+    ) -> None:
+        # Otherwise, the status is taken from the member cache
+        if self.low_memory:
+            if status == discord.Status.offline:
+                self.presences.pop((guild_id, player_id), None)
+            else:
+                self.presences[(guild_id, player_id)] = status
+        self.game.presence_changed(player_id, idle_state_from_status(status))
+
+    async def on_presence_update(
+        self, before: discord.Member, after: discord.Member
+    ) -> None:
+        if self.low_memory or before.status == after.status:
+            return
+        if self.game.player_guild(after.id) == after.guild.id:
+            self.game.presence_changed(after.id, idle_state_from_status(after.status))
+
+    async def fetch_player_presences(self, guild: discord.Guild) -> None:
+        # Request the presence of all registered players of the guild, instead
+        # of chunking all members of the guild
+        player_ids = list(self.game.store.guild_players.get(guild.id, ()))
+        for i in range(0, len(player_ids), 100):
+            members = await guild.query_members(
+                user_ids=player_ids[i : i + 100], presences=True, cache=False
+            )
+            for member in members:
+                self.set_presence(guild.id, member.id, member.status)
 
     async def setup_hook(self) -> None:
         # Invoke regular idlez ticks
-        self.loop.create_task(self.idlez_game_task())
+        if self.guild_ticker is not None:
+            self.loop.create_task(self.idlez_staggered_game_task())
+        else:
+            self.loop.create_task(self.idlez_game_task())
         self.loop.create_task(self.idlez_save_store())
+        if self.game.change_log is not None:
+            self.loop.create_task(self.idlez_flush_changes())
+        if self.content_dir is not None:
+            self.loop.create_task(self.idlez_watch_content())
+        if self.query_server is not None:
+            self.loop.create_task(self.idlez_publish_snapshots())
 
     async def idlez_game_task(self):
         await self.wait_until_ready()
-        last_tick = discord.utils.utcnow()
+        scheduler = self.tick_scheduler
+        scheduler.start(discord.utils.utcnow())
         while not self.is_closed():
-            await asyncio.sleep(10)  # Sleep some seconds
-            now = discord.utils.utcnow()
-            diff, last_tick = now - last_tick, now
-            await self.game.tick(diff.seconds)
+            await asyncio.sleep(scheduler.interval)
+            seconds = scheduler.elapsed(discord.utils.utcnow())
+            swept = await self.game.tick(seconds)
+            scheduler.record_tick(swept, len(self.game.store.players))
+
+    async def idlez_staggered_game_task(self):
+        await self.wait_until_ready()
+        ticker = self.guild_ticker
+        assert ticker is not None
+        ticker.add(None, time.time())
+        while not self.is_closed():
+            due = ticker.next_due()
+            await asyncio.sleep(max(0.0, (due or 0.0) - time.time()))
+            for guild_id, seconds in ticker.pop_due(time.time()):
+                if guild_id is None:
+                    await self.game.tick_shared(seconds)
+                else:
+                    await self.game.tick_guild(guild_id, seconds)
 
     async def idlez_save_store(self):
         await self.wait_until_ready()
         while not self.is_closed():
             await asyncio.sleep(30)  # Sleep 30 seconds
+            async with self.game.tick_lock:
+                # Only copying the players needs the lock
+                saved = self.save_store_async()
+            await saved
+
+    def save_store_async(self) -> "asyncio.Future[None]":
+        change_log = self.game.change_log
+        if change_log is None:
+            return self.game.store.save_async(self.store_path)
+        return change_log.checkpoint_async(self.game.store)
+
+    def save_store(self) -> None:
+        change_log = self.game.change_log
+        if change_log is None:
             self.game.store.save(self.store_path)
+        else:
+            change_log.checkpoint(self.game.store)
+
+    async def idlez_flush_changes(self):
+        # Followers are at most this far behind
+        change_log = self.game.change_log
+        assert change_log is not None
+        while not self.is_closed():
+            await asyncio.sleep(self.change_flush_interval)
+            async with self.game.tick_lock:
+                # Only copying the changed players needs the lock
+                flushed = change_log.flush_async(self.game.store)
+            await flushed
+
+    async def idlez_publish_snapshots(self):
+        await self.wait_until_ready()
+        while not self.is_closed():
+            await self.publish_snapshot()
+            await asyncio.sleep(self.snapshot_interval)
+
+    async def publish_snapshot(self) -> None:
+        # Only copying the players happens in the game loop; indexing them for
+        # queries is done in a thread
+        if self.query_server is None:
+            return
+        async with self.game.tick_lock:
+            records = idlez.query.store_records(self.game.store)
+        await asyncio.to_thread(self.query_server.publish, records)
+
+    async def idlez_watch_content(self):
+        version = content_version(self.content_dir)
+        while not self.is_closed():
+            await asyncio.sleep(self.content_check_interval)
+            new_version = content_version(self.content_dir)
+            if new_version != version:
+                version = new_version
+                await self.reload_content()
+
+    async def reload_content(self) -> bool:
+        # Content is loaded, validated and compiled in a thread; the game only
+        # ever sees the old or the new version.
+        try:
+            game_picker, bot_picker = await asyncio.to_thread(
+                self.load_content, self.content_dir
+            )
+        except (OSError, idlez.data.InvalidData) as e:
+            logger.error("Keeping old content, cannot load new content: %s", e)
+            return False
+        self.game.replace_data(game_picker)
+        self.data = bot_picker.data
+        self.data_picker = bot_picker
+        logger.info("Loaded new content from %s", self.content_dir)
+        return True
+
+    def load_content(
+        self, content_dir: pathlib.Path
+    ) -> tuple[idlez.data.DataPicker, idlez.data.DataPicker]:
+        data = idlez.data.Data.from_dir(content_dir)
+        return (
+            idlez.data.DataPicker(data, random=self.game.random).precompile(),
+            idlez.data.DataPicker(data).precompile(),
+        )
 
     async def on_ready(self):
-        print(f"Logged in as {self.user}")
+        logger.info("Logged in as %s", self.user)
         for guild in self.guilds:
-            channel = discord.utils.get(guild.text_channels, name=self.channel_name)
-            if channel:
-                print(f"Found channel {channel.id} for guild {guild.id}")
-                self.channel[guild.id] = channel
+            self.index_guild(guild)
+
+    def index_guild(self, guild: discord.Guild) -> None:
+        # Finds the #idlez channel of the guild and its threads
+        channel = discord.utils.get(guild.text_channels, name=self.channel_name)
+        if channel and channel != self.channel.get(guild.id):
+            logger.info(
+                "Found channel %d for guild %d",
+                channel.id,
+                guild.id,
+                extra={"channel_id": channel.id, "guild_id": guild.id},
+            )
+        thread_ids = (
+            [t.id for t in guild.threads if t.parent_id == channel.id]
+            if channel
+            else []
+        )
+        self.set_channel(guild.id, channel, thread_ids)
+
+    def set_channel(
+        self,
+        guild_id: GuildId,
+        channel: Optional[discord.TextChannel],
+        thread_ids: Iterable[int] = (),
+    ) -> None:
+        self.channel_ids -= self.guild_channel_ids.pop(guild_id, set())
+        if channel is None:
+            self.channel.pop(guild_id, None)
+            return
+        self.channel[guild_id] = channel
+        ids = {channel.id, *thread_ids}
+        self.guild_channel_ids[guild_id] = ids
+        self.channel_ids |= ids
+
+    async def on_guild_channel_create(self, channel: discord.abc.GuildChannel) -> None:
+        self.index_guild(channel.guild)
+
+    async def on_guild_channel_update(
+        self, before: discord.abc.GuildChannel, after: discord.abc.GuildChannel
+    ) -> None:
+        if before.name != after.name:
+            self.index_guild(after.guild)
+
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel) -> None:
+        self.index_guild(channel.guild)
+
+    def index_thread(
+        self, guild_id: GuildId, thread_id: int, parent_id: Optional[int]
+    ) -> None:
+        channel = self.channel.get(guild_id)
+        if channel and parent_id == channel.id:
+            self.guild_channel_ids[guild_id].add(thread_id)
+            self.channel_ids.add(thread_id)
+
+    def unindex_thread(self, guild_id: Optional[GuildId], thread_id: int) -> None:
+        self.channel_ids.discard(thread_id)
+        if guild_id is not None:
+            self.guild_channel_ids.get(guild_id, set()).discard(thread_id)
+
+    async def on_thread_create(self, thread: discord.Thread) -> None:
+        self.index_thread(thread.guild.id, thread.id, thread.parent_id)
+
+    async def on_thread_join(self, thread: discord.Thread) -> None:
+        # Also sent for threads that are unarchived or synced later on
+        self.index_thread(thread.guild.id, thread.id, thread.parent_id)
+
+    async def on_raw_thread_update(self, payload: discord.RawThreadUpdateEvent) -> None:
+        # Archived threads are not part of guild.threads, so they are only
+        # picked up once they are unarchived
+        if payload.data.get("thread_metadata", {}).get("archived", False):
+            self.unindex_thread(payload.guild_id, payload.thread_id)
+        else:
+            self.index_thread(payload.guild_id, payload.thread_id, payload.parent_id)
+
+    async def on_raw_thread_delete(self, payload: discord.RawThreadDeleteEvent) -> None:
+        self.unindex_thread(payload.guild_id, payload.thread_id)
+
+    async def on_guild_available(self, guild: discord.Guild) -> None:
+        self.index_guild(guild)
+        await self.game.activate_guild(guild.id)
+        if self.guild_ticker is not None:
+            self.guild_ticker.add(guild.id, time.time())
+        if self.low_memory:
+            self.loop.create_task(self.fetch_player_presences(guild))
+            return
+        for player_id in self.game.store.guild_players.get(guild.id, ()):
+            self.game.presence_changed(
+                player_id, self.get_player_idle_state(player_id, guild.id)
+            )
+
+    async def on_guild_join(self, guild: discord.Guild) -> None:
+        await self.on_guild_available(guild)
+
+    async def on_guild_remove(self, guild: discord.Guild) -> None:
+        self.set_channel(guild.id, None)
+        if self.guild_ticker is not None:
+            self.guild_ticker.remove(guild.id)
 
     async def on_message(self, message: discord.Message) -> None:
+        if message.channel.id not in self.channel_ids:
+            # Most messages are neither in an idlez channel nor in its threads
+            return
         if message.type != discord.MessageType.default:
             # Ignore non-default text messages
             return
@@ -95,29 +423,34 @@ class IdleZBot(discord.Client):
         if not message.guild:
             # Message has no guild, igoring
             return
-        idlez_channel = self.channel.get(message.guild.id)
-        if not idlez_channel:
-            # Guild does not have an idlez channel set up.
-            return
-        if not (
-            message.channel == idlez_channel
-            or isinstance(message, discord.Thread)
-            and message.parent == idlez_channel
-        ):
-            # Ignore messages / threads not in idlez channel
-            return
 
+        await self.game.activate_guild(message.guild.id)
         await self.on_idlez_message(message)
 
     async def on_idlez_message(self, message: discord.Message) -> None:
+        if message.content.startswith(self.command_prefix):
+            name, *args = message.content[len(self.command_prefix) :].split() or [""]
+            command = self.commands.get(name.lower())
+            if command:
+                # Commands do not make any noise
+                await command(message, args)
+                return
+
         player_id = message.author.id
 
-        print(
-            f"{message.author.name}#{message.author.discriminator} has said something: {message.content}"
+        message_logger.info(
+            "%s#%s has said something",
+            message.author.name,
+            message.author.discriminator,
+            extra={
+                "player_id": player_id,
+                "guild_id": message.guild.id if message.guild else None,
+                "content": message.content,
+            },
         )
 
         try:
-            self.game.make_noise(player_id=player_id)
+            self.game.queue_noise(player_id=player_id)
         except idlez.game.PlayerNotFound:
             author = message.author
             nick = None
@@ -127,8 +460,10 @@ class IdleZBot(discord.Client):
                 nick = f"{author.name}#{author.discriminator}"
 
             if not message.guild:
-                print(
-                    "Cannot register user {nick} because message has no guild: {message}"
+                logger.warning(
+                    "Cannot register user %s because message has no guild",
+                    nick,
+                    extra={"player_id": player_id, "message_id": message.id},
                 )
                 return
 
@@ -139,92 +474,243 @@ class IdleZBot(discord.Client):
                 level=0,
                 guild_id=message.guild.id,
             )
-            self.game.new_player(player)
-            print(f"New player: {player}")
+            self.game.queue_new_player(player)
+            # The player just said something, so they are online
+            self.set_presence(player.guild_id, player.id, discord.Status.online)
+            logger.info(
+                "New player: %s",
+                player.name,
+                extra={"player_id": player.id, "guild_id": player.guild_id},
+            )
+
+    async def on_top_command(self, message: discord.Message, args: list[str]):
+        if args[:1] == ["global"]:
+            title = "Top survivors everywhere"
+            players = self.game.leaderboard.top(self.leaderboard_size)
+        elif message.guild:
+            title = "Top survivors"
+            players = self.game.leaderboard.top(
+                self.leaderboard_size, guild_id=message.guild.id
+            )
+        else:
+            return
+
+        lines = [f"{title}:"]
+        for i, player in enumerate(players, start=1):
+            lines.append(f"{i}. {player.name} (level {player.level})")
+        await message.channel.send("\n".join(lines))
+
+    async def on_rank_command(self, message: discord.Message, args: list[str]):
+        player = self.game.player(message.author.id)
+        if not player:
+            await message.channel.send(
+                f"{message.author.name} is not part of any group of survivors yet."
+            )
+            return
+
+        guild_rank = self.game.leaderboard.guild_rank(player.id)
+        rank = self.game.leaderboard.rank(player.id)
+        await message.channel.send(
+            f"{player.name} is ranked #{guild_rank} in this group"
+            f" and #{rank} among all survivors."
+        )
+
+    async def on_status_command(self, message: discord.Message, args: list[str]):
+        now = time.monotonic()
+        self.prune_status(now)
+        last_requested = self.status_requested.get(message.author.id)
+        if last_requested is not None and now - last_requested < self.status_cooldown:
+            return
+        self.status_requested[message.author.id] = now
+
+        player = self.game.player(message.author.id)
+        if not player:
+            await message.channel.send(
+                f"{message.author.name} is not part of any group of survivors yet."
+            )
+            return
+        await message.channel.send(self.player_status(player, now))
+
+    def player_status(
+        self, player: idlez.store.Player, now: Optional[float] = None
+    ) -> str:
+        now = time.monotonic() if now is None else now
+        cached = self.status_cache.get(player.id)
+        if cached is not None:
+            rendered, level, experience, status = cached
+            if (
+                now - rendered < self.status_cache_ttl
+                and level == player.level
+                and experience == player.experience
+            ):
+                return status
+
+        # Only ranked when rendered, as ranking refreshes the leaderboard
+        guild_rank = self.game.leaderboard.guild_rank(player.id) or 0
+        secs_to_next_level = (
+            self.game.experience_for_level(player.level + 1) - player.experience
+        )
+        status = (
+            f"{player.name} is level {player.level}"
+            f" with {human_secs(max(player.experience, 0)) or 'no'} experience"
+            f" and ranked #{guild_rank} in this group."
+            f" Next level in {human_secs(secs_to_next_level)}."
+        )
+        self.status_cache[player.id] = (now, player.level, player.experience, status)
+        return status
+
+    def prune_status(self, now: float) -> None:
+        # Forgets expired cooldowns and cached statuses, at most once per
+        # cooldown
+        if now - self._status_pruned < self.status_cooldown:
+            return
+        self._status_pruned = now
+        self.status_requested = {
+            player_id: requested
+            for player_id, requested in self.status_requested.items()
+            if now - requested < self.status_cooldown
+        }
+        self.status_cache = {
+            player_id: cached
+            for player_id, cached in self.status_cache.items()
+            if now - cached[0] < self.status_cache_ttl
+        }
+
+    def guild_fields(self, guild_id: GuildId) -> dict[str, str | int | float]:
+        # Statistics of the guild, available to all event messages
+        return self.game.guild_stats(guild_id).message_fields()
 
     async def send_to_player_group(self, player: idlez.store.Player, message: str):
         await self.channel[player.guild_id].send(message)
 
     async def on_game_event(self, evt: events.Event) -> None:
-        def progress_str(percent: float) -> str:
-            if percent > 0.99:
-                return "all"
-            elif percent > 0.8:
-                return "most"
-            elif percent > 0.5:
-                return "a lot of"
-            elif percent > 0.2:
-                return "some"
-            else:
-                return "almost no"
-
-        if isinstance(evt, events.LevelUpEvent):
-            player = evt.component(components.Player).player
-            total_secs_to_next_level = self.game.experience_for_level(player.level + 1)
-            secs_to_next_level = total_secs_to_next_level - player.experience
-            await self.send_to_player_group(
-                player,
-                self.data_picker.fill_event_message(
-                    idlez.data.EventType.LEVEL_UP,
-                    {
-                        "player_name": player.name,
-                        "new_level": player.level,
-                        "ttl": human_secs(secs_to_next_level),
-                    },
-                ),
-            )
-        elif isinstance(evt, (events.NewPlayerEvent, events.PlayerNoiseEvent)):
-            player = evt.component(components.Player).player
-            all_exp_progress = evt.component(components.ExpProgress).exp_progress[
-                components.ALL_PLAYERS
-            ]
-
-            if isinstance(evt, events.NewPlayerEvent):
-                msg_type = idlez.data.EventType.NEW_PLAYER
-            else:
-                msg_type = idlez.data.EventType.LOUD_NOISE
-
-            await self.send_to_player_group(
-                player=player,
-                message=self.data_picker.fill_event_message(
-                    msg_type,
-                    {
-                        "player_name": player.name,
-                        "exp_loss": progress_str(abs(all_exp_progress)),
-                    },
-                ),
-            )
-        elif isinstance(evt, events.SinglePlayerEvent):
-            player = evt.component(components.Player).player
-            player_exp_diff = evt.component(components.ExpDiff).exp_diffs[player.id]
-            message = evt.component(components.EventMessage).message
-            await self.send_to_player_group(
-                player,
-                message.format_map(
-                    {
-                        "player_name": player.name,
-                        "time_gain": human_secs(player_exp_diff),
-                    }
-                ),
-            )
-        elif isinstance(evt, events.PlayerFightEvent):
-            player = evt.component(components.Player).player
-            other_player = evt.component(components.OtherPlayer).player
-            player_wins = evt.component(components.FightResult).player_wins
-            player_exp_diff_amount = evt.component(components.ExpDiff).exp_diffs.get(
-                player.id, 0
-            )
-            await self.send_to_player_group(
-                player=player,
-                message=self.data_picker.fill_player_fight_message(
-                    player_wins=player_wins,
-                    params={
-                        "player_name": player.name,
-                        "other_player_name": other_player.name,
-                        "time_diff": human_secs(abs(player_exp_diff_amount)),
-                    },
-                ),
-            )
+        handler = self.game_event_handlers.handler(evt)
+        if handler is not None:
+            await handler(evt)
+
+    async def on_level_up(self, evt: events.LevelUpEvent) -> None:
+        player = evt.component(components.Player).player
+        total_secs_to_next_level = self.game.experience_for_level(player.level + 1)
+        secs_to_next_level = total_secs_to_next_level - player.experience
+        await self.send_to_player_group(
+            player,
+            self.data_picker.fill_event_message(
+                idlez.data.EventType.LEVEL_UP,
+                {
+                    "player_name": player.name,
+                    "new_level": player.level,
+                    "ttl": human_secs(secs_to_next_level),
+                    **self.guild_fields(player.guild_id),
+                },
+            ),
+        )
+
+    async def on_level_up_summary(self, evt: events.LevelUpSummaryEvent) -> None:
+        players = evt.component(components.Players).players
+        await self.send_to_player_group(
+            players[0],
+            self.data_picker.fill_event_message(
+                idlez.data.EventType.LEVEL_UP_SUMMARY,
+                {
+                    "player_count": len(players),
+                    "player_names": name_list([p.name for p in players]),
+                    **self.guild_fields(players[0].guild_id),
+                },
+            ),
+        )
+
+    async def on_new_player(self, evt: events.NewPlayerEvent) -> None:
+        await self.send_exp_progress_message(idlez.data.EventType.NEW_PLAYER, evt)
+
+    async def on_new_players(self, evt: events.NewPlayersEvent) -> None:
+        players = evt.component(components.Players).players
+        all_exp_progress = evt.component(components.ExpProgress).exp_progress[
+            components.ALL_PLAYERS
+        ]
+        await self.send_to_player_group(
+            players[0],
+            self.data_picker.fill_event_message(
+                idlez.data.EventType.NEW_PLAYERS,
+                {
+                    "player_count": len(players),
+                    "player_names": name_list([p.name for p in players]),
+                    "exp_loss": progress_str(abs(all_exp_progress)),
+                    **self.guild_fields(players[0].guild_id),
+                },
+            ),
+        )
+
+    async def on_player_noise(self, evt: events.PlayerNoiseEvent) -> None:
+        await self.send_exp_progress_message(idlez.data.EventType.LOUD_NOISE, evt)
+
+    async def send_exp_progress_message(
+        self,
+        msg_type: idlez.data.EventType,
+        evt: events.NewPlayerEvent | events.PlayerNoiseEvent,
+    ) -> None:
+        player = evt.component(components.Player).player
+        all_exp_progress = evt.component(components.ExpProgress).exp_progress[
+            components.ALL_PLAYERS
+        ]
+        await self.send_to_player_group(
+            player=player,
+            message=self.data_picker.fill_event_message(
+                msg_type,
+                {
+                    "player_name": player.name,
+                    "exp_loss": progress_str(abs(all_exp_progress)),
+                    **self.guild_fields(player.guild_id),
+                },
+            ),
+        )
+
+    async def on_single_player(self, evt: events.SinglePlayerEvent) -> None:
+        player = evt.component(components.Player).player
+        player_exp_diff = evt.component(components.ExpDiff).exp_diffs[player.id]
+        message = evt.component(components.EventMessage).message
+        await self.send_to_player_group(
+            player,
+            message.format_map(
+                {
+                    "player_name": player.name,
+                    "time_gain": human_secs(player_exp_diff),
+                    **self.guild_fields(player.guild_id),
+                }
+            ),
+        )
+
+    async def on_player_fight(self, evt: events.PlayerFightEvent) -> None:
+        player = evt.component(components.Player).player
+        other_player = evt.component(components.OtherPlayer).player
+        player_wins = evt.component(components.FightResult).player_wins
+        player_exp_diff_amount = evt.component(components.ExpDiff).exp_diffs.get(
+            player.id, 0
+        )
+        await self.send_to_player_group(
+            player=player,
+            message=self.data_picker.fill_player_fight_message(
+                player_wins=player_wins,
+                params={
+                    "player_name": player.name,
+                    "other_player_name": other_player.name,
+                    "time_diff": human_secs(abs(player_exp_diff_amount)),
+                    **self.guild_fields(player.guild_id),
+                },
+            ),
+        )
+
+
+def progress_str(percent: float) -> str:
+    if percent > 0.99:
+        return "all"
+    elif percent > 0.8:
+        return "most"
+    elif percent > 0.5:
+        return "a lot of"
+    elif percent > 0.2:
+        return "some"
+    else:
+        return "almost no"
 
 
 def human_secs(secs: int) -> str:
@@ -257,6 +743,44 @@ def human_secs(secs: int) -> str:
     return ", ".join(parts)
 
 
-def make_intents() -> discord.Intents:
-    intents = discord.Intents.all()
+def content_version(content_dir: pathlib.Path) -> tuple[Optional[int], ...]:
+    # Changes whenever one of the content files changes
+    version: list[Optional[int]] = []
+    for file in idlez.data.CONTENT_FILES:
+        try:
+            version.append((content_dir / file).stat().st_mtime_ns)
+        except FileNotFoundError:
+            version.append(None)
+    return tuple(version)
+
+
+def name_list(names: list[str], limit: int = 5) -> str:
+    # "a, b and c"; long lists are cut short with "and n others"
+    if len(names) > limit:
+        names = names[: limit - 1] + [f"{len(names) - limit + 1} others"]
+    if len(names) <= 1:
+        return "".join(names)
+    return ", ".join(names[:-1]) + " and " + names[-1]
+
+
+def idle_state_from_status(status: discord.Status) -> idlez.game.IdleState:
+    if status == discord.Status.offline:
+        return idlez.game.IdleState.OFFLINE
+    elif status in [discord.Status.online, discord.Status.idle]:
+        return idlez.game.IdleState.ONLINE
+    return idlez.game.IdleState.AWAY
+
+
+def make_intents(low_memory: bool = False) -> discord.Intents:
+    if not low_memory:
+        return discord.Intents.all()
+
+    # Only what the game needs: guilds and their channels, messages in #idlez,
+    # and presences of players. The members intent allows querying players.
+    intents = discord.Intents.none()
+    intents.guilds = True
+    intents.guild_messages = True
+    intents.message_content = True
+    intents.members = True
+    intents.presences = True
     return intents
@@ -3,9 +3,12 @@ import sys
 import pathlib
 from typing import Optional
 import argparse
+import logging
 
 import idlez
 
+logger = logging.getLogger(__name__)
+
 LICENSE_NOTICE = """
     idlez  Copyright (C) 2023  Wanja Chresta
     This program comes with ABSOLUTELY NO WARRANTY; see the README.md file.
@@ -31,12 +34,124 @@ def parse_args() -> argparse.Namespace:
         default=".env",
         help="Read env variables from the given file, if provided.",
     )
+    parser.add_argument(
+        "--load-workers",
+        type=int,
+        default=None,
+        help="Number of processes used to load large stores; defaults to the number of CPUs",
+    )
+    parser.add_argument(
+        "--store-format",
+        choices=sorted(idlez.store.FORMATS),
+        default=None,
+        help="Format used to save the store; defaults to the format it was loaded from",
+    )
+    parser.add_argument(
+        "--compression-level",
+        type=int,
+        choices=idlez.storetool.COMPRESSION_LEVELS,
+        metavar="{0-9}",
+        default=None,
+        help="Compression level of the compressed store formats",
+    )
+    parser.add_argument(
+        "--per-guild-store",
+        action="store_true",
+        help="Keep each guild's players in their own file and only load active guilds",
+    )
+    parser.add_argument(
+        "--max-loaded-players",
+        type=int,
+        default=None,
+        help="With --per-guild-store, keep at most this many players in memory",
+    )
+    parser.add_argument(
+        "--replicate",
+        action="store_true",
+        help="Log every change of a player, so a follower can take over",
+    )
+    parser.add_argument(
+        "--follow",
+        action="store_true",
+        help="Follow the primary using the same data directory and take over when it stops",
+    )
+    parser.add_argument(
+        "--seed",
+        type=str,
+        default=None,
+        help="Seed the random number generators of the game, for reproducible runs",
+    )
+    parser.add_argument(
+        "--log-level",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+        default="INFO",
+        help="Only log messages of at least this level",
+    )
+    parser.add_argument(
+        "--log-json",
+        action="store_true",
+        help="Log one JSON object per line",
+    )
+    parser.add_argument(
+        "--message-log-sample-rate",
+        type=float,
+        default=1.0,
+        help="Fraction of #idlez messages that are logged",
+    )
+    parser.add_argument(
+        "--tick-budget",
+        type=float,
+        default=5.0,
+        help="Milliseconds a tick may hold the event loop before letting other work run",
+    )
+    parser.add_argument(
+        "--timed-encounters",
+        action="store_true",
+        help="Schedule encounters per guild, more often in larger guilds",
+    )
+    parser.add_argument(
+        "--staggered-ticks",
+        action="store_true",
+        help="Tick each guild at its own time instead of all guilds at once",
+    )
+    parser.add_argument(
+        "--content-dir",
+        type=str,
+        help="Load the game content from this directory and reload it when it changes",
+    )
+    parser.add_argument(
+        "--query-port",
+        type=int,
+        default=None,
+        help="Serve read-only queries about players and guilds on this local port",
+    )
+    parser.add_argument(
+        "--low-memory",
+        action="store_true",
+        help="Only cache what the game needs; recommended for large servers",
+    )
     return parser.parse_args()
 
 
 def main():
+    if sys.argv[1:2] == ["store"]:
+        sys.exit(idlez.storetool.main(sys.argv[2:]))
+    if sys.argv[1:2] == ["loadtest"]:
+        sys.exit(idlez.loadtest.main(sys.argv[2:]))
+
     args = parse_args()
+    log_listener = idlez.log.setup_logging(
+        level=args.log_level,
+        json_output=args.log_json,
+        message_sample_rate=args.message_log_sample_rate,
+    )
+    try:
+        run(args)
+    finally:
+        log_listener.stop()
+
 
+def run(args: argparse.Namespace) -> None:
     if args.env_file:
         load_dotenv(args.env_file)
 
@@ -45,28 +160,99 @@ def main():
         token = token_from_env(args.env_file)
 
     if not token:
-        print("No token found, provide a token through IDLEZ_TOKEN", file=sys.stderr)
+        logger.error("No token found, provide a token through IDLEZ_TOKEN")
         sys.exit(1)
 
     store_path = pathlib.Path(args.data_dir).expanduser()
     store: idlez.game.Store
-    try:
-        store = idlez.game.Store.load(store_path)
-    except FileNotFoundError:
+    change_log = None
+    if args.per_guild_store and (args.replicate or args.follow):
+        logger.error("Replication does not support --per-guild-store")
+        sys.exit(1)
+
+    if args.replicate or args.follow:
+        store_path.mkdir(parents=True, exist_ok=True)
+        follower = idlez.replication.Follower(
+            store_path, workers=args.load_workers, progress=log_load_progress
+        )
+        if args.follow:
+            logger.info("Following the primary in %s", store_path)
+            change_log = follower.follow()
+            logger.info("Taking over as primary")
+        else:
+            # Changes logged after the last save of a crashed primary are
+            # recovered as well
+            change_log = follower.try_promote()
+            if change_log is None:
+                logger.error("Another primary is running in %s", store_path)
+                sys.exit(1)
+        store = follower.store
+    elif args.per_guild_store:
         store_path.mkdir(parents=True, exist_ok=True)
-        store = idlez.game.Store(players=dict())
-        store.save(store_path)
+        store = idlez.store.GuildStore.open(
+            store_path, max_players=args.max_loaded_players
+        )
+    else:
+        try:
+            store = idlez.game.Store.load(
+                store_path, workers=args.load_workers, progress=log_load_progress
+            )
+        except FileNotFoundError:
+            store_path.mkdir(parents=True, exist_ok=True)
+            store = idlez.game.Store(players=dict())
+            store.save(store_path)
+    if args.store_format:
+        store.format = idlez.store.FORMATS[args.store_format]
+    if args.compression_level is not None and store.format.codec is not None:
+        store.format = idlez.store.compressed_format(
+            store.format.codec, args.compression_level
+        )
 
     print(LICENSE_NOTICE)
 
-    data = idlez.data.Data.from_lib_resources()
-    game = idlez.game.IdleZ(store=store, data=data, event_handlers=[], event_queue=[])
-    intents = idlez.bot.make_intents()
+    content_dir = None
+    if args.content_dir:
+        content_dir = pathlib.Path(args.content_dir).expanduser()
+        data = idlez.data.Data.from_dir(content_dir)
+    else:
+        data = idlez.data.Data.from_lib_resources()
+    game = idlez.game.IdleZ(
+        store=store,
+        data=data,
+        event_handlers=[],
+        event_queue=[],
+        random_streams=idlez.rng.RandomStreams(seed=args.seed),
+        timed_encounters=args.timed_encounters,
+        tick_budget=args.tick_budget / 1000 if args.tick_budget > 0 else None,
+        change_log=change_log,
+    )
+    query_server = None
+    if args.query_port is not None:
+        query_server = idlez.query.QueryServer(("127.0.0.1", args.query_port))
+        query_server.serve_in_thread()
+        logger.info("Serving queries on port %d", args.query_port)
+    intents = idlez.bot.make_intents(low_memory=args.low_memory)
     bot = idlez.bot.IdleZBot(
-        intents=intents, game=game, store_path=store_path, data=data
+        intents=intents,
+        game=game,
+        store_path=store_path,
+        data=data,
+        low_memory=args.low_memory,
+        content_dir=content_dir,
+        query_server=query_server,
+        staggered_ticks=args.staggered_ticks,
     )
-    bot.run(token)
-    store.save(store_path)
+    # Logging has already been set up
+    bot.run(token, log_handler=None)
+    if query_server is not None:
+        query_server.shutdown()
+    bot.save_store()
+    if change_log is not None:
+        change_log.close()
+
+
+def log_load_progress(done: int, total: int) -> None:
+    logger.info("Loaded %d%% of the store", done * 100 // max(total, 1))
 
 
 def token_from_token_file(token_file_path: str) -> Optional[str]:
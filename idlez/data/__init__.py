@@ -5,7 +5,9 @@ import collections
 import enum
 import json
 import importlib.resources
-from typing import Any, Callable
+import pathlib
+import string
+from typing import Any, Callable, Optional
 import random as _random
 
 
@@ -17,9 +19,19 @@ class EffectType(enum.Enum):
     GAIN_EXP_ELEMENT_SUM = "gain_exp_element_sum"
 
 
+# Files that make up the game content
+CONTENT_FILES = ("event_messages.json", "elements.json", "encounters.json")
+
+
+class InvalidData(Exception):
+    pass
+
+
 class EventType(enum.Enum):
     NEW_PLAYER = "new_player"
+    NEW_PLAYERS = "new_players"
     LEVEL_UP = "level_up"
+    LEVEL_UP_SUMMARY = "level_up_summary"
     LOUD_NOISE = "loud_noise"
 
 
@@ -130,12 +142,52 @@ class Data:
         def load(file: str) -> dict[str, Any]:
             return json.loads(importlib.resources.read_text("idlez.data", file))
 
+        return Data.from_loader(load)
+
+    @staticmethod
+    def from_dir(path: pathlib.Path) -> "Data":
+        # Loads and validates the content files from the given directory
+        def load(file: str) -> dict[str, Any]:
+            return json.loads((path / file).read_text())
+
+        try:
+            data = Data.from_loader(load)
+        except (KeyError, TypeError, ValueError) as e:
+            raise InvalidData(f"{path}: {e!r}") from e
+        data.validate()
+        return data
+
+    @staticmethod
+    def from_loader(load: Callable[[str], dict[str, Any]]) -> "Data":
         return Data(
             event_messages=load("event_messages.json"),
             elements=Elements.from_dict(load("elements.json")),
             encounters=Encounters.from_dict(load("encounters.json")),
         )
 
+    def templates(self) -> list[str]:
+        ts = [t for messages in self.event_messages.values() for t in messages]
+        ts.extend(e.message for e in self.encounters.single_gain_random)
+        for f in self.encounters.player_fight:
+            ts.extend((f.success_message, f.fail_message))
+        return ts
+
+    def validate(self) -> None:
+        for t in EventType:
+            if not self.event_messages.get(t.value):
+                raise InvalidData(f"No messages for event {t.value}")
+        if not self.encounters.single_gain_random or not self.encounters.player_fight:
+            raise InvalidData("Encounters must not be empty")
+        for enc in self.encounters.single_gain_random:
+            for elem in enc.elements:
+                if not getattr(self.elements, elem, None):
+                    raise InvalidData(f"No elements {elem!r} for {enc.message!r}")
+        for t in self.templates():
+            try:
+                Template.compile(t)
+            except ValueError as e:
+                raise InvalidData(f"Invalid template {t!r}: {e}") from e
+
 
 @dataclasses.dataclass(frozen=True, slots=True)
 class PickedSingleEncounter:
@@ -147,32 +199,56 @@ class PickedSingleEncounter:
 class DataPicker:
     data: Data
     random: _random.Random = dataclasses.field(default_factory=_random.Random)
-
-    def pick_element(self, element: str) -> Loot | Crate | BodyCrate:
+    # Compiled templates of data; each template is compiled once per picker
+    templates: dict[str, "Template"] = dataclasses.field(
+        default_factory=dict, init=False
+    )
+
+    def precompile(self) -> "DataPicker":
+        for t in self.data.templates():
+            self.template(t)
+        return self
+
+    def template(self, template: str) -> "Template":
+        compiled = self.templates.get(template)
+        if compiled is None:
+            compiled = Template.compile(template)
+            self.templates[template] = compiled
+        return compiled
+
+    def pick_element(
+        self, element: str, random: Optional[_random.Random] = None
+    ) -> Loot | Crate | BodyCrate:
+        rnd = random or self.random
         if element == "loot":
-            return self.random.choice(self.data.elements.loot)
+            return rnd.choice(self.data.elements.loot)
         if element == "crate":
-            return self.random.choice(self.data.elements.crate)
+            return rnd.choice(self.data.elements.crate)
         if element == "body_crate":
-            return self.random.choice(self.data.elements.body_crate)
+            return rnd.choice(self.data.elements.body_crate)
         raise NotImplementedError(element)
 
-    def pick_single_encounter(self) -> PickedSingleEncounter:
-        enc: SingleGainRandomEncounter = self.random.choice(
+    def pick_single_encounter(
+        self, random: Optional[_random.Random] = None
+    ) -> PickedSingleEncounter:
+        # Picks from the given random stream, e.g. the one of a guild, instead
+        # of the picker's own
+        rnd = random or self.random
+        enc: SingleGainRandomEncounter = rnd.choice(
             self.data.encounters.single_gain_random
         )
-        chosen_elements = {elem: self.pick_element(elem) for elem in enc.elements}
+        chosen_elements = {elem: self.pick_element(elem, rnd) for elem in enc.elements}
 
         combined_format_map = dict(
             player_name="{player_name}",
             time_gain="{time_gain}",
-            **collections.ChainMap(*(e.format_map() for e in chosen_elements.values()))
+            **collections.ChainMap(*(e.format_map() for e in chosen_elements.values())),
         )
         combined_worth = sum(e.worth for e in chosen_elements.values()) / len(
             chosen_elements
         )
 
-        message = eval_template(enc.message, combined_format_map)
+        message = self.template(enc.message).fill(combined_format_map)
 
         return PickedSingleEncounter(
             message=message,
@@ -182,7 +258,7 @@ class DataPicker:
     def fill_event_message(self, type: EventType, params: dict[str, str | int]) -> str:
         ts = self.data.event_messages[type.value]
         t = self.random.choice(ts)
-        return eval_template(t, params)
+        return self.template(t).fill(params)
 
     def fill_player_fight_message(
         self, player_wins: bool, params: dict[str, str | int]
@@ -190,8 +266,8 @@ class DataPicker:
         ts = self.data.encounters.player_fight
         t = self.random.choice(ts)
         if player_wins:
-            return eval_template(t.success_message, params)
-        return eval_template(t.fail_message, params)
+            return self.template(t.success_message).fill(params)
+        return self.template(t.fail_message).fill(params)
 
 
 TEMPLATE_FORMATTERS: dict[str, Callable[[str], str]] = {
@@ -201,15 +277,35 @@ TEMPLATE_FORMATTERS: dict[str, Callable[[str], str]] = {
 }
 
 
+@dataclasses.dataclass(frozen=True, slots=True)
+class Template:
+    template: str
+    # Placeholders with a formatter, like {ttl|capitalize}, as
+    # (placeholder, identifier, formatter)
+    formatted: tuple[tuple[str, str, Callable[[str], str]], ...]
+
+    @staticmethod
+    def compile(template: str) -> "Template":
+        # Raises ValueError if the template is not a valid format string
+        list(string.Formatter().parse(template))
+        formatted = []
+        for ident_fmt in findall(r"\{([^|}]+\|[^|}]+)\}", template):
+            ident, fmt = ident_fmt.split("|")
+            formatter = TEMPLATE_FORMATTERS.get(fmt)
+            if formatter is None:
+                continue
+            formatted.append((ident_fmt, ident, formatter))
+        return Template(template=template, formatted=tuple(formatted))
+
+    def fill(self, params: dict[str, str] | dict[str, str | int]) -> str:
+        form_params: dict[str, Any] = params.copy()
+        for ident_fmt, ident, formatter in self.formatted:
+            value = params.get(ident)
+            if value is None:
+                continue
+            form_params[ident_fmt] = formatter(str(value))
+        return self.template.format_map(form_params)
+
+
 def eval_template(template: str, params: dict[str, str] | dict[str, str | int]) -> str:
-    form_params = params.copy()
-    for ident_fmt in findall(r"\{([^|}]+\|[^|}]+)\}", template):
-        ident, fmt = ident_fmt.split("|")
-        value = params.get(ident)
-        if value is None:
-            continue
-        formatter = TEMPLATE_FORMATTERS.get(fmt)
-        if formatter is None:
-            continue
-        form_params[ident_fmt] = formatter(str(value))
-    return template.format_map(form_params)
+    return Template.compile(template).fill(params)
@@ -1,61 +1,191 @@
-import abc
 import dataclasses
-from typing import Optional, Type, TypeVar
+from typing import Any, Callable, ClassVar, Optional, Type, TypeVar
 
 import idlez.events.components as _components
+from idlez.store import GuildId, Player, PlayerId
 
 _C = TypeVar("_C", bound=_components.Component)
+_E = TypeVar("_E", bound="Event")
 
 
 class Event:
-    pass
+    __slots__ = ()
 
 
-@dataclasses.dataclass(slots=True)
-class ComponentEvent(abc.ABC, Event):
-    needs_components: list[Type[_components.Component]]
-    components: dict[Type[_components.Component], _components.Component]
+class ComponentEvent(Event):
+    # Components are kept in a tuple in the order of needs_components, so every
+    # event type has a fixed layout and lookups are a single index access.
+    __slots__ = ("components",)
+
+    needs_components: ClassVar[list[Type[_components.Component]]] = []
+    _component_index: ClassVar[dict[Type[_components.Component], int]] = {}
+
+    components: tuple[_components.Component, ...]
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        cls._component_index = {t: i for i, t in enumerate(cls.needs_components)}
 
     def __init__(self, *comps: _components.Component) -> None:
-        self.components = {}
+        slots: list[Optional[_components.Component]] = [None] * len(
+            self.needs_components
+        )
         for c in comps:
-            self.components[c.__class__] = c
+            i = self._component_index.get(c.__class__)
+            if i is None:
+                raise _components.NoSuchComponentError(
+                    f"{self.__class__.__name__} does not take component {c.__class__}"
+                )
+            slots[i] = c
+        for t, c in zip(self.needs_components, slots):
+            if c is None:
+                raise _components.NoSuchComponentError(
+                    f"{self.__class__.__name__} is missing component {t}"
+                )
+        self.components = tuple(slots)  # type: ignore
+
+    def __eq__(self, other: object) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self.components == other.components  # type: ignore
+
+    def __repr__(self) -> str:
+        comps = ", ".join(repr(c) for c in self.components)
+        return f"{self.__class__.__name__}({comps})"
 
     def safe_component(self, t: Type[_C]) -> Optional[_C]:
-        return self.components.get(t)  # type: ignore
+        i = self._component_index.get(t)
+        if i is None:
+            return None
+        return self.components[i]  # type: ignore
 
     def component(self, t: Type[_C]) -> _C:
-        c = self.safe_component(t)
-        if c is None:
+        try:
+            i = self._component_index[t]
+        except KeyError:
             raise _components.NoSuchComponentError(
-                f"{__name__} does not have component {t}"
-            )
-        return c
+                f"{self.__class__.__name__} does not have component {t}"
+            ) from None
+        return self.components[i]  # type: ignore
 
     def has_component(self, t: Type[_C]) -> bool:
-        return t in self.components
+        return t in self._component_index
 
 
 class PlayerNoiseEvent(ComponentEvent):
+    __slots__ = ()
     needs_components = [_components.Player, _components.ExpProgress]
 
 
 class NewPlayerEvent(ComponentEvent):
+    __slots__ = ()
     needs_components = [_components.Player, _components.ExpProgress]
 
 
+class NewPlayersEvent(ComponentEvent):
+    # Several players of a guild joined within one tick
+    __slots__ = ()
+    needs_components = [_components.Players, _components.ExpProgress]
+
+
 class LevelUpEvent(ComponentEvent):
+    __slots__ = ()
     needs_components = [_components.Player]
 
 
+class LevelUpSummaryEvent(ComponentEvent):
+    # Replaces the LevelUpEvents of a guild if there are too many in one tick
+    __slots__ = ()
+    needs_components = [_components.Players]
+
+    @staticmethod
+    def summarize(evts: list[Event]) -> "LevelUpSummaryEvent":
+        # Every player is listed once, even if they levelled up several times
+        players: dict[PlayerId, Player] = {}
+        for e in evts:
+            if isinstance(e, LevelUpEvent):
+                player = e.component(_components.Player).player
+                players[player.id] = player
+        return LevelUpSummaryEvent(_components.Players(players=list(players.values())))
+
+
 class SinglePlayerEvent(ComponentEvent):
-    needs_components = [_components.Player, _components.ExpDiff]
+    __slots__ = ()
+    needs_components = [
+        _components.Player,
+        _components.ExpDiff,
+        _components.EventMessage,
+    ]
 
 
 class PlayerFightEvent(ComponentEvent):
+    __slots__ = ()
     needs_components = [
         _components.Player,
         _components.OtherPlayer,
         _components.FightResult,
         _components.ExpDiff,
     ]
+
+
+@dataclasses.dataclass
+class HandlerRegistry:
+    # Maps event types to their handler, so dispatching is a single dict lookup
+    handlers: dict[Type[Event], Callable[[Any], Any]] = dataclasses.field(
+        default_factory=dict
+    )
+
+    def register(self, event_type: Type[_E], handler: Callable[[_E], Any]) -> None:
+        self.handlers[event_type] = handler
+
+    def handler(self, evt: Event) -> Optional[Callable[[Any], Any]]:
+        return self.handlers.get(evt.__class__)
+
+
+def event_guild(evt: Event) -> Optional[GuildId]:
+    if not isinstance(evt, ComponentEvent):
+        return None
+    player = evt.safe_component(_components.Player)
+    if player is None:
+        return None
+    return player.player.guild_id
+
+
+@dataclasses.dataclass
+class EventAggregator:
+    # Folds bursts of events into summary events. If a guild has more than
+    # threshold events of a type with a summary within one batch, they are
+    # replaced by a single summary event at the position of the first one.
+    summaries: dict[Type[Event], Callable[[list[Event]], Event]]
+    threshold: int = 3
+
+    def aggregate(self, evts: list[Event]) -> list[Event]:
+        groups: dict[tuple[Type[Event], GuildId], list[Event]] = {}
+        for evt in evts:
+            if evt.__class__ not in self.summaries:
+                continue
+            guild_id = event_guild(evt)
+            if guild_id is not None:
+                groups.setdefault((evt.__class__, guild_id), []).append(evt)
+
+        folded = {
+            id(evt): key
+            for key, group in groups.items()
+            if len(group) > self.threshold
+            for evt in group
+        }
+        if not folded:
+            return evts
+
+        result: list[Event] = []
+        for evt in evts:
+            key = folded.get(id(evt))
+            if key is None:
+                result.append(evt)
+            elif groups[key][0] is evt:
+                result.append(self.summaries[key[0]](groups[key]))
+        return result
+
+
+def default_aggregator() -> EventAggregator:
+    return EventAggregator(summaries={LevelUpEvent: LevelUpSummaryEvent.summarize})
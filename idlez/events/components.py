@@ -12,6 +12,8 @@ Name = str
 
 
 class Component(abc.ABC):
+    __slots__ = ()
+
     def message_fields(self) -> dict[str, str | int | float]:
         return {}
 
@@ -22,10 +24,10 @@ class Component(abc.ABC):
 
 
 class Input(Component):
-    pass
+    __slots__ = ()
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class Player(Input):
     player: _Player
 
@@ -36,7 +38,7 @@ class Player(Input):
         }
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class OtherPlayer(Input):
     player: _Player
 
@@ -47,7 +49,16 @@ class OtherPlayer(Input):
         }
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
+class Players(Input):
+    # Several players of the same guild
+    players: list[_Player]
+
+    def message_fields(self) -> dict[str, str | int | float]:
+        return {"player_count": len(self.players)}
+
+
+@dataclasses.dataclass(slots=True)
 class ExpDiff(Component):
     exp_diffs: dict[EffectTarget, Experience]
 
@@ -69,7 +80,7 @@ class ExpDiff(Component):
         return {}
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class ExpProgress(Component):
     exp_progress: dict[EffectTarget, float]
 
@@ -91,12 +102,12 @@ class ExpProgress(Component):
         return {}
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class FightResult(Component):
     player_wins: bool
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class EventMessage(Component):
     message: str
 
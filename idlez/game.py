@@ -1,11 +1,18 @@
 import dataclasses
 import math
-from typing import Any, Optional, Callable
+from typing import Any, Generator, Iterator, Optional, Callable
 import enum
 import asyncio
+import time
 import random as _random
 
 from idlez import data as _data
+from idlez import leaderboard as _leaderboard
+from idlez import replication as _replication
+from idlez import rng as _rng
+from idlez import rollup as _rollup
+from idlez import scheduler as _scheduler
+from idlez import timing as _timing
 import idlez.events as events
 import idlez.events.components as components
 from idlez.store import Player, Store, PlayerId, Level, Experience, GuildId
@@ -20,6 +27,30 @@ class PlayerNotFound(IdleZError):
     player_id: PlayerId
 
 
+# Ticks longer than this (e.g. after a suspend or a lost connection) are
+# processed as a catch-up, which may contain several encounters
+CATCH_UP_SECONDS = 600
+# Upper bound of encounters of each kind during a catch-up; with timed
+# encounters, the lower bound of encounters of each kind a guild may have in a
+# tick
+MAX_CATCH_UP_ENCOUNTERS = 3
+# Sweeps over all players may pause after this many players
+SLICE_PLAYERS = 64
+
+
+class Encounter(enum.Enum):
+    SINGLE_PLAYER = 1
+    FIGHT = 2
+
+
+# With timed encounters, each player causes on average one encounter of each
+# kind per interval, so larger guilds have more frequent encounters
+PLAYER_ENCOUNTER_INTERVALS = {
+    Encounter.SINGLE_PLAYER: 6 * 3600.0,
+    Encounter.FIGHT: 12 * 3600.0,
+}
+
+
 class NoiseType(enum.Enum):
     SPEAK = 1
 
@@ -32,13 +63,18 @@ class Emitter:
     def emit(self, evt: events.Event) -> None:
         self.event_queue.append(evt)
 
-    async def send_events(self):
-        for evt in self.event_queue:
+    def pending_events(self) -> list[events.Event]:
+        return self.event_queue
+
+    async def send_events(self, slicer: Optional[_scheduler.TimeSlicer] = None):
+        for evt in self.pending_events():
             for handler in self.event_handlers:
                 if asyncio.iscoroutinefunction(handler):
                     await handler(evt)
                 else:
                     handler(evt)
+            if slicer is not None:
+                await slicer.pause()
         self.event_queue.clear()
 
     def register_handler(self, handler: Callable[[events.Event], Any]):
@@ -57,52 +93,268 @@ class IdleZ(Emitter):
     data: _data.Data
 
     data_picker: _data.DataPicker = dataclasses.field(init=False)
+    leaderboard: _leaderboard.Leaderboard = dataclasses.field(init=False)
     player_idle_state_callback: Callable[
         [PlayerId, GuildId], IdleState
     ] = lambda _p, _g: IdleState.ONLINE
 
     random: _random.Random = dataclasses.field(default_factory=_random.Random)
+    # If set, each guild draws from its own stream and random is replaced by
+    # the shared stream of random_streams.
+    random_streams: Optional[_rng.RandomStreams] = None
     _exp_for_level: dict[Level, Experience] = dataclasses.field(
         default_factory=dict, init=False
     )
+    # If set, encounters are scheduled per guild on a timing wheel instead of
+    # being rolled for all guilds together on every tick
+    timed_encounters: bool = False
+    encounter_wheel: _timing.TimingWheel[tuple[Encounter, GuildId]] = dataclasses.field(
+        default_factory=_timing.TimingWheel, init=False
+    )
+    _scheduled_encounters: set[tuple[Encounter, GuildId]] = dataclasses.field(
+        default_factory=set, init=False
+    )
+    # Due time of encounters left over from the previous tick
+    _deferred_encounters: dict[tuple[Encounter, GuildId], int] = dataclasses.field(
+        default_factory=dict, init=False
+    )
+    # If set, a tick holds the event loop for at most about this many seconds
+    # at a time. The result of the tick is the same either way; messages that
+    # arrive in between are queued for the next tick.
+    tick_budget: Optional[float] = None
+    # Held while a tick changes players. Anything that reads all players, or
+    # loads and evicts them, takes it so it never sees a half-applied tick.
+    tick_lock: asyncio.Lock = dataclasses.field(
+        default_factory=asyncio.Lock, init=False, repr=False, compare=False
+    )
+    # If set, every change of a player is written to it for followers
+    change_log: Optional[_replication.ChangeLog] = None
+    # Folds bursts of events within a tick, so a big tick does not cause a
+    # message per player
+    event_aggregator: events.EventAggregator = dataclasses.field(
+        default_factory=events.default_aggregator
+    )
+    # Noise made since the last tick, as number of messages per player
+    _noise: dict[PlayerId, int] = dataclasses.field(default_factory=dict, init=False)
+    # Players that joined since the last tick
+    _joining: dict[PlayerId, Player] = dataclasses.field(
+        default_factory=dict, init=False
+    )
+    # Statistics per guild, updated with every change of a player
+    rollups: _rollup.Rollups = dataclasses.field(
+        default_factory=_rollup.Rollups, init=False
+    )
 
     def __post_init__(self):
-        self.data_picker = _data.DataPicker(self.data)
-
-    async def tick(self, seconds_diff: int) -> None:
+        if self.random_streams is not None:
+            self.random = self.random_streams.shared
+        self.data_picker = _data.DataPicker(self.data, random=self.random)
+        self.leaderboard = _leaderboard.Leaderboard(self.store)
         for player in self.store.players.values():
-            self.gain_experience(player.id, seconds_diff)
-
+            self.rollups.update(player)
+
+    def replace_data(self, data_picker: _data.DataPicker) -> None:
+        # Switches to new game content
+        self.data = data_picker.data
+        self.data_picker = data_picker
+
+    def pending_events(self) -> list[events.Event]:
+        return self.event_aggregator.aggregate(self.event_queue)
+
+    def rng(self, guild_id: GuildId) -> _random.Random:
+        if self.random_streams is None:
+            return self.random
+        return self.random_streams.guild(guild_id)
+
+    async def tick(self, seconds_diff: int) -> float:
+        # Returns how long the sweep over the players took, without the time
+        # other work ran in between or sending the events took
+        slicer = _scheduler.TimeSlicer(self.tick_budget)
+        async with self.tick_lock:
+            started = time.perf_counter()
+            await self.resolve_penalties(slicer)
+            await slicer.run(self.tick_experience_steps(seconds_diff))
+            await slicer.run(self.encounter_steps(seconds_diff))
+            swept = time.perf_counter() - started - slicer.waited
+        await slicer.run(self.leaderboard.refresh_steps())
+        await self.send_events(slicer)
+        return swept
+
+    async def tick_shared(self, seconds_diff: int) -> None:
+        # With staggered ticks, the part of a tick that concerns all guilds;
+        # each guild gains its experience in tick_guild
+        slicer = _scheduler.TimeSlicer(self.tick_budget)
+        async with self.tick_lock:
+            await self.resolve_penalties(slicer)
+            await slicer.run(self.encounter_steps(seconds_diff))
+        await slicer.run(self.leaderboard.refresh_steps())
+        await self.send_events(slicer)
+
+    async def tick_guild(self, guild_id: GuildId, seconds_diff: int) -> None:
+        slicer = _scheduler.TimeSlicer(self.tick_budget)
+        async with self.tick_lock:
+            await slicer.run(self.tick_experience_steps(seconds_diff, guild_id))
+        await slicer.run(self.leaderboard.refresh_steps())
+        await self.send_events(slicer)
+
+    async def resolve_penalties(self, slicer: _scheduler.TimeSlicer) -> None:
+        penalty = self.join_penalty()
+        if penalty is not None:
+            await slicer.run(self.lose_progress_steps(penalty))
+        penalty = await slicer.evaluate(self.noise_penalty_steps())
+        if penalty is not None:
+            await slicer.run(self.lose_progress_steps(penalty))
+
+    def run_encounters(self, seconds_diff: int) -> None:
+        for _ in self.encounter_steps(seconds_diff):
+            pass
+
+    def encounter_steps(self, seconds_diff: int) -> Iterator[None]:
         # Once every 30 minutes, 1 player event
         # Once every hour, 2 player event
-        if self.random.random() < float(seconds_diff) / 1800.0:
-            self.single_player_event()
-        elif self.random.random() < float(seconds_diff) / 3600.0:
-            self.two_player_event()
-
-        await self.send_events()
+        if self.timed_encounters:
+            yield from self.timed_encounter_steps(seconds_diff)
+        elif seconds_diff <= CATCH_UP_SECONDS:
+            if self.random.random() < float(seconds_diff) / 1800.0:
+                self.single_player_event()
+            elif self.random.random() < float(seconds_diff) / 3600.0:
+                self.two_player_event()
+        else:
+            for _ in range(self.encounter_count(seconds_diff, 1800.0)):
+                self.single_player_event()
+            for _ in range(self.encounter_count(seconds_diff, 3600.0)):
+                self.two_player_event()
+
+    def encounter_count(self, seconds: int, mean_interval: float) -> int:
+        # Number of encounters within the given time if they happen on average
+        # once per mean_interval, capped at MAX_CATCH_UP_ENCOUNTERS
+        count = 0
+        t = self.random.expovariate(1 / mean_interval)
+        while t < seconds and count < MAX_CATCH_UP_ENCOUNTERS:
+            count += 1
+            t += self.random.expovariate(1 / mean_interval)
+        return count
+
+    def schedule_encounters(self, guild_id: GuildId) -> None:
+        # Makes sure every kind of encounter is scheduled for the guild
+        if not self.timed_encounters:
+            return
+        for kind in Encounter:
+            if (kind, guild_id) not in self._scheduled_encounters:
+                self.schedule_encounter(kind, guild_id, self.encounter_wheel.now)
+
+    def schedule_encounter(self, kind: Encounter, guild_id: GuildId, after: int) -> int:
+        # Schedules the next encounter following the one at the given time, and
+        # returns its time. Guilds without players get no encounters until
+        # schedule_encounters is called again.
+        self._scheduled_encounters.discard((kind, guild_id))
+        rollup = self.rollups.guild(guild_id)
+        # Evicted guilds do not progress, so they get no encounters either
+        players = rollup.players if rollup.loaded else 0
+        if players == 0:
+            return -1
+        rate = players / PLAYER_ENCOUNTER_INTERVALS[kind]
+        at = after + max(1, math.ceil(self.rng(guild_id).expovariate(rate)))
+        if at > self.encounter_wheel.now:
+            self.encounter_wheel.schedule(
+                at - self.encounter_wheel.now, (kind, guild_id)
+            )
+            self._scheduled_encounters.add((kind, guild_id))
+        return at
+
+    def run_timed_encounters(self, seconds: int) -> None:
+        for _ in self.timed_encounter_steps(seconds):
+            pass
+
+    def timed_encounter_steps(self, seconds: int) -> Iterator[None]:
+        # Encounters due within the tick happen at its end, one step per
+        # encounter. Encounters beyond the limit of a tick are left for the next
+        # one, and those due longer than CATCH_UP_SECONDS ago are skipped.
+        expired = self.encounter_wheel.advance(seconds)
+        now = self.encounter_wheel.now
+        for timer in expired:
+            kind, guild_id = timer.item
+            at = self._deferred_encounters.pop(timer.item, timer.at)
+            limit = self.encounter_limit(kind, guild_id, seconds)
+            count = 0
+            while 0 <= at <= now:
+                if at < now - CATCH_UP_SECONDS:
+                    at = self.schedule_encounter(kind, guild_id, now - CATCH_UP_SECONDS)
+                    continue
+                if count == limit:
+                    self._deferred_encounters[timer.item] = at
+                    self.encounter_wheel.schedule(1, timer.item)
+                    self._scheduled_encounters.add(timer.item)
+                    break
+                if kind == Encounter.SINGLE_PLAYER:
+                    self.single_player_event(guild_id)
+                else:
+                    self.two_player_event(guild_id)
+                count += 1
+                # The next encounter may be due within this tick as well
+                at = self.schedule_encounter(kind, guild_id, at)
+                yield
+
+    def encounter_limit(self, kind: Encounter, guild_id: GuildId, seconds: int) -> int:
+        # Encounters of a kind a guild may have in a tick: twice as many as
+        # expected, so the rate stays proportional to the players of the guild
+        players = self.rollups.guild(guild_id).players
+        expected = (
+            players * min(seconds, CATCH_UP_SECONDS) / PLAYER_ENCOUNTER_INTERVALS[kind]
+        )
+        return max(MAX_CATCH_UP_ENCOUNTERS, math.ceil(2 * expected))
 
     def player(self, player_id: PlayerId) -> Optional[Player]:
         return self.store.players.get(player_id)
 
-    def online_players(self) -> list[Player]:
+    def guild_players(self, guild_id: GuildId) -> list[Player]:
+        players = self.store.players
+        return [players[p] for p in self.store.guild_players.get(guild_id, ())]
+
+    def online_players(self, guild_id: Optional[GuildId] = None) -> list[Player]:
+        # Online players of all guilds, or only of the given guild
+        players = (
+            self.store.players.values()
+            if guild_id is None
+            else self.guild_players(guild_id)
+        )
         on_players: list[Player] = []
-        for p in self.store.players.values():
+        for p in players:
             idle_state = self.player_idle_state_callback(p.id, p.guild_id)
             if idle_state in [IdleState.ONLINE, IdleState.AWAY]:
                 on_players.append(p)
         return on_players
 
+    def guild_stats(self, guild_id: GuildId) -> _rollup.GuildRollup:
+        # Population and progress of a guild, without a scan over its players
+        return self.rollups.guild(guild_id)
+
+    def player_guild(self, player_id: PlayerId) -> Optional[GuildId]:
+        # Guild of a player, also if their guild is not loaded
+        player = self.player(player_id)
+        if player is not None:
+            return player.guild_id
+        return self.rollups.guild_of(player_id)
+
+    def presence_changed(self, player_id: PlayerId, idle_state: IdleState) -> None:
+        # Must be called whenever the idle state of a player changes, to keep
+        # the online count of the guild statistics up to date
+        self.rollups.set_online(
+            player_id, idle_state in [IdleState.ONLINE, IdleState.AWAY]
+        )
+
     def make_noise(self, player_id: PlayerId) -> None:
         player = self.player(player_id)
         if not player:
             raise PlayerNotFound(player_id=player_id)
+        rnd = self.rng(player.guild_id)
         exp_for_next_lvl = self.experience_for_next_level(player_id)
         if exp_for_next_lvl is not None:
-            player.experience -= self.random.randint(1, exp_for_next_lvl)
+            player.experience -= rnd.randint(1, exp_for_next_lvl)
+            self.player_changed(player)
 
-        if self.random.random() < 0.05:
-            progress_percent = self.random.random()
+        if rnd.random() < 0.05:
+            progress_percent = rnd.random()
             self.all_lose_progress(progress_percent)
 
             self.emit(
@@ -114,12 +366,112 @@ class IdleZ(Emitter):
                 )
             )
 
-    def single_player_event(self) -> None:
-        on_players = self.online_players()
-        if len(on_players) <= 0:
+    def queue_noise(self, player_id: PlayerId) -> None:
+        # Noise is only counted here and resolved in one go on the next tick
+        if player_id not in self.store.players:
+            if player_id in self._joining:
+                # Joining players are busy finding the group
+                return
+            raise PlayerNotFound(player_id=player_id)
+        self._noise[player_id] = self._noise.get(player_id, 0) + 1
+
+    def resolve_noise(self) -> None:
+        # Same as calling make_noise once per message, except that all triggered
+        # penalties are combined into a single sweep over all players.
+        penalty = self.noise_penalty()
+        if penalty is not None:
+            self.all_lose_progress(penalty)
+
+    def noise_penalty(self) -> Optional[float]:
+        # Resolves the noise except for the sweep over all players; returns the
+        # progress everyone loses, if any
+        steps = self.noise_penalty_steps()
+        while True:
+            try:
+                next(steps)
+            except StopIteration as done:
+                return done.value
+
+    def noise_penalty_steps(self) -> Generator[None, None, Optional[float]]:
+        # Same as noise_penalty, one step per message
+        if not self._noise:
+            return None
+        noise, self._noise = self._noise, {}
+
+        loud_player: Optional[Player] = None
+        remaining_progress = 1.0
+        for player_id, count in noise.items():
+            player = self.player(player_id)
+            if not player:
+                continue
+            rnd = self.rng(player.guild_id)
+            exp_for_next_lvl = self.experience_for_next_level(player_id)
+            for _ in range(count):
+                if exp_for_next_lvl is not None:
+                    loss = rnd.randint(1, exp_for_next_lvl)
+                    player.experience -= loss
+                    exp_for_next_lvl += loss
+
+                if rnd.random() < 0.05:
+                    # Consecutive losses compound on the remaining progress
+                    remaining_progress *= 1 - rnd.random()
+                    loud_player = player
+                yield
+            self.player_changed(player)
+
+        if loud_player is None:
+            return None
+
+        progress_percent = 1 - remaining_progress
+        self.emit(
+            events.PlayerNoiseEvent(
+                components.Player(player=loud_player),
+                components.ExpProgress(
+                    exp_progress={components.ALL_PLAYERS: -progress_percent},
+                ),
+            )
+        )
+        return progress_percent
+
+    def encounter_players(
+        self, guild_id: Optional[GuildId], fight: bool
+    ) -> Optional[tuple[_random.Random, Player, Optional[Player]]]:
+        # Picks the random stream, an online player and, for fights, another
+        # player. Encounters of a guild use its own stream and pick from the
+        # rollups in O(1); encounters of all guilds go over all players.
+        if guild_id is None:
+            on_players = self.online_players()
+            if not on_players:
+                return None
+            player = self.random.choice(on_players)
+            if not fight:
+                return self.random, player, None
+            others = [p for p in self.store.players.values() if p != player]
+            if not others:
+                return None
+            return self.random, player, self.random.choice(others)
+
+        if not self.rollups.guild(guild_id).loaded:
+            # Evicted after the encounter was scheduled
+            return None
+        rnd = self.rng(guild_id)
+        player_id = self.rollups.random_player(guild_id, rnd, online=True)
+        if player_id is None:
+            return None
+        player = self.store.players[player_id]
+        if not fight:
+            return rnd, player, None
+        other_id = self.rollups.random_player(guild_id, rnd, other_than=player_id)
+        if other_id is None:
+            return None
+        return rnd, player, self.store.players[other_id]
+
+    def single_player_event(self, guild_id: Optional[GuildId] = None) -> None:
+        picked_players = self.encounter_players(guild_id, fight=False)
+        if picked_players is None:
             return
-        player = self.random.choice(on_players)
-        picked = self.data_picker.pick_single_encounter()
+        rnd, player, _ = picked_players
+        picked = self.data_picker.pick_single_encounter(rnd)
         amount = self.gain_progress(player.id, 0.3 * picked.worth)
 
         if amount > 0:
@@ -131,21 +483,19 @@ class IdleZ(Emitter):
                 )
             )
 
-    def two_player_event(self) -> None:
-        on_players = self.online_players()
-        if len(on_players) <= 0:
+    def two_player_event(self, guild_id: Optional[GuildId] = None) -> None:
+        picked_players = self.encounter_players(guild_id, fight=True)
+        if picked_players is None:
             return
-        player = self.random.choice(on_players)
-
-        other_player = self.random.choice(
-            [p for p in self.store.players.values() if p != player]
-        )
+        picking_rnd, player, other_player = picked_players
+        assert other_player is not None
 
         # Half the time, switch online player with maybe offline player
-        if self.random.random() > 0.5:
+        if picking_rnd.random() > 0.5:
             player, other_player = other_player, player
 
-        success = self.random.random() * player.level > other_player.level / 2
+        rnd = self.rng(player.guild_id)
+        success = rnd.random() * player.level > other_player.level / 2
 
         # >1 if player has more experience than other_player
         player_percent_diff = player.experience / other_player.experience
@@ -164,10 +514,10 @@ class IdleZ(Emitter):
                 other_player_scale = other_player_percent_diff
 
             player_exp_diff_amount = self.gain_progress(
-                player.id, 0.1 + player_scale * self.random.random() / 5
+                player.id, 0.1 + player_scale * rnd.random() / 5
             )
             other_player_exp_diff_amount = self.lose_progress(
-                other_player.id, 0.1 + other_player_scale * self.random.random() / 5
+                other_player.id, 0.1 + other_player_scale * rnd.random() / 5
             )
         else:
             if player.experience > other_player.experience:
@@ -182,10 +532,10 @@ class IdleZ(Emitter):
                 other_player_scale = 2 - other_player_percent_diff
 
             player_exp_diff_amount = self.lose_progress(
-                player.id, 0.1 + player_scale * self.random.random() / 5
+                player.id, 0.1 + player_scale * rnd.random() / 5
             )
             other_player_exp_diff_amount = self.gain_progress(
-                other_player.id, 0.1 + other_player_scale * self.random.random() / 5
+                other_player.id, 0.1 + other_player_scale * rnd.random() / 5
             )
 
         self.emit(
@@ -203,10 +553,13 @@ class IdleZ(Emitter):
         )
 
     def new_player(self, player: Player) -> None:
-        self.store.players[player.id] = player
+        self.activate_guild_blocking(player.guild_id)
+        self.store.add_player(player)
+        self.player_changed(player)
+        self.schedule_encounters(player.guild_id)
 
         # Everyone loses experience if a new player joins
-        progress_percent = self.random.random() / 2
+        progress_percent = self.rng(player.guild_id).random() / 2
         self.all_lose_progress(progress_percent)
 
         self.emit(
@@ -218,13 +571,101 @@ class IdleZ(Emitter):
             )
         )
 
+    def queue_new_player(self, player: Player) -> None:
+        # The player joins on the next tick, together with everyone else who
+        # joined since the last one
+        self._joining.setdefault(player.id, player)
+
+    def resolve_joins(self) -> None:
+        # Same as calling new_player for every joining player, except that the
+        # penalties are combined into a single sweep over all players, and each
+        # guild gets one announcement for all its new players.
+        penalty = self.join_penalty()
+        if penalty is not None:
+            self.all_lose_progress(penalty)
+
+    def join_penalty(self) -> Optional[float]:
+        # Registers the joining players; returns the progress everyone loses
+        if not self._joining:
+            return None
+        joining, self._joining = self._joining, {}
+
+        guilds: dict[GuildId, list[Player]] = {}
+        remaining_progress = 1.0
+        for player in joining.values():
+            if player.id in self.store.players:
+                continue
+            self.activate_guild_blocking(player.guild_id)
+            self.store.add_player(player)
+            self.player_changed(player)
+            self.schedule_encounters(player.guild_id)
+            remaining_progress *= 1 - self.rng(player.guild_id).random() / 2
+            guilds.setdefault(player.guild_id, []).append(player)
+
+        if not guilds:
+            return None
+
+        # Everyone loses experience if new players join
+        progress_percent = 1 - remaining_progress
+        exp_progress = components.ExpProgress(
+            exp_progress={components.ALL_PLAYERS: -progress_percent},
+        )
+        for players in guilds.values():
+            if len(players) == 1:
+                evt: events.Event = events.NewPlayerEvent(
+                    components.Player(player=players[0]), exp_progress
+                )
+            else:
+                evt = events.NewPlayersEvent(
+                    components.Players(players=players), exp_progress
+                )
+            self.emit(evt)
+        return progress_percent
+
+    async def activate_guild(self, guild_id: GuildId) -> None:
+        # Make sure the players of the guild are in the store, without blocking
+        # the event loop while they are read or others are written
+        if self.store.has_guild(guild_id):
+            # Only marks the guild as used, which needs no file IO
+            self.activate_guild_blocking(guild_id)
+            return
+        async with self.tick_lock:
+            loaded, evicted = await self.store.load_guild(guild_id)
+            self.guild_loaded(guild_id, loaded, evicted)
+
+    def activate_guild_blocking(self, guild_id: GuildId) -> None:
+        # Same as activate_guild, but blocks on file IO. Used when players
+        # join, whose guild has usually been activated for their message.
+        loaded, evicted = self.store.ensure_guild(guild_id)
+        self.guild_loaded(guild_id, loaded, evicted)
+
+    def guild_loaded(
+        self, guild_id: GuildId, loaded: list[Player], evicted: list[Player]
+    ) -> None:
+        for player in loaded:
+            self.leaderboard.touch(player.id)
+            self.rollups.update(player)
+        for player in evicted:
+            self.leaderboard.touch(player.id)
+        for evicted_guild_id in {player.guild_id for player in evicted}:
+            self.rollups.evict(evicted_guild_id)
+        self.schedule_encounters(guild_id)
+
     def all_gain_experience(self, amount: Experience) -> None:
         for player_id in self.store.players:
             self.gain_experience(player_id=player_id, amount=amount)
 
     def all_lose_progress(self, percent: float) -> None:
-        for player_id in self.store.players:
+        for _ in self.lose_progress_steps(percent):
+            pass
+
+    def lose_progress_steps(self, percent: float) -> Iterator[None]:
+        # Yields after every SLICE_PLAYERS players; the players are taken at
+        # the start, so the store may change in between
+        for i, player_id in enumerate(list(self.store.players), start=1):
             self.lose_progress(player_id, percent)
+            if i % SLICE_PLAYERS == 0:
+                yield
 
     def lose_progress(self, player_id: PlayerId, percent: float) -> Experience:
         level_progress = self.level_progress(player_id)
@@ -251,6 +692,7 @@ class IdleZ(Emitter):
             lower_bound = self.experience_for_level(player.level)
             # Do not lose more experience than experience need for the current level
             player.experience = max(lower_bound, player.experience + amount)
+            self.player_changed(player)
             return
 
         idle_state = self.player_idle_state_callback(player_id, player.guild_id)
@@ -258,13 +700,51 @@ class IdleZ(Emitter):
             return
 
         if idle_state == IdleState.ONLINE:
-            player.experience += amount
+            self.add_experience(player, amount)
         else:
-            player.experience += self.random.randint(0, amount)
+            self.add_experience(player, self.rng(player.guild_id).randint(0, amount))
+
+    def add_experience(self, player: Player, amount: Experience) -> None:
+        player.experience += amount
+        self.player_changed(player)
 
-        if self.experience_for_level(player.level + 1) <= player.experience:
+        # Long catch-up ticks can be worth several levels
+        while self.experience_for_level(player.level + 1) <= player.experience:
             self.level_up(player.id)
 
+    def all_gain_tick_experience(self, amount: Experience) -> None:
+        # Same as calling gain_experience for every player, but the random gains
+        # of away players are drawn in one go per guild.
+        for _ in self.tick_experience_steps(amount):
+            pass
+
+    def tick_experience_steps(
+        self, amount: Experience, guild_id: Optional[GuildId] = None
+    ) -> Iterator[None]:
+        # Yields after every SLICE_PLAYERS players. Only the players of the
+        # given guild gain experience, if one is given.
+        players = (
+            list(self.store.players.values())
+            if guild_id is None
+            else self.guild_players(guild_id)
+        )
+        away: dict[GuildId, list[Player]] = {}
+        for i, player in enumerate(players, start=1):
+            idle_state = self.player_idle_state_callback(player.id, player.guild_id)
+            if idle_state == IdleState.ONLINE:
+                self.add_experience(player, amount)
+            elif idle_state == IdleState.AWAY:
+                away.setdefault(player.guild_id, []).append(player)
+            if i % SLICE_PLAYERS == 0:
+                yield
+
+        for guild_id, players in away.items():
+            gains = _rng.randints(self.rng(guild_id), 0, amount, len(players))
+            for i, (player, gain) in enumerate(zip(players, gains), start=1):
+                self.add_experience(player, gain)
+                if i % SLICE_PLAYERS == 0:
+                    yield
+
     def gain_progress(self, player_id: PlayerId, percent: float) -> Experience:
         player = self.player(player_id)
         if not player:
@@ -285,9 +765,17 @@ class IdleZ(Emitter):
         if not player:
             return
         player.level += 1
+        self.player_changed(player)
 
         self.emit(events.LevelUpEvent(components.Player(player=player)))
 
+    def player_changed(self, player: Player) -> None:
+        # Must be called whenever a player's experience or level changes
+        self.leaderboard.touch(player.id)
+        self.rollups.update(player)
+        if self.change_log is not None:
+            self.change_log.touch(player.id)
+
     def level_progress(self, player_id: PlayerId) -> Optional[Experience]:
         player = self.player(player_id)
         if not player:
@@ -315,4 +803,6 @@ class IdleZ(Emitter):
         lower_level_exp = self.experience_for_level(lvl - 1)
         step = 1.05 + math.exp(-lvl / 10)
 
-        return int(lower_level_exp * step)
+        exp = int(lower_level_exp * step)
+        self._exp_for_level[lvl] = exp
+        return exp
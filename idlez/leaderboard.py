@@ -0,0 +1,234 @@
+import bisect
+import dataclasses
+import itertools
+from typing import Iterator, Optional
+
+from idlez.store import GuildId, Player, PlayerId, Store
+
+# Players are ordered by level, then experience, best first. The player id
+# makes keys unique so a player's key can be found again for removal.
+RankKey = tuple[int, int, PlayerId]
+
+# The leaderboard is built from scratch instead of moving the changed players
+# once more than this fraction of them changed
+REBUILD_DIRTY_FRACTION = 0.1
+
+
+def rank_key(player: Player) -> RankKey:
+    return (-player.level, -player.experience, player.id)
+
+
+class SortedKeys:
+    # A sorted list split into sublists of bounded size. Inserting or removing
+    # only shifts one sublist, and a Fenwick tree over the sublist lengths
+    # gives the position of a key in O(log n).
+    LOAD = 512
+
+    def __init__(self, keys: Optional[list[RankKey]] = None) -> None:
+        keys = sorted(keys or [])
+        self._len = len(keys)
+        self._lists = [keys[i : i + self.LOAD] for i in range(0, len(keys), self.LOAD)]
+        self._maxes = [lst[-1] for lst in self._lists]
+        self._rebuild_tree()
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self) -> Iterator[RankKey]:
+        return itertools.chain.from_iterable(self._lists)
+
+    def _rebuild_tree(self) -> None:
+        tree = [0] + [len(lst) for lst in self._lists]
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _tree_add(self, pos: int, diff: int) -> None:
+        pos += 1
+        while pos < len(self._tree):
+            self._tree[pos] += diff
+            pos += pos & -pos
+
+    def _tree_prefix(self, pos: int) -> int:
+        # Number of keys in the sublists before sublist pos
+        total = 0
+        while pos > 0:
+            total += self._tree[pos]
+            pos -= pos & -pos
+        return total
+
+    def add(self, key: RankKey) -> None:
+        self._len += 1
+        if not self._lists:
+            self._lists.append([key])
+            self._maxes.append(key)
+            self._rebuild_tree()
+            return
+
+        pos = bisect.bisect_left(self._maxes, key)
+        if pos == len(self._maxes):
+            pos -= 1
+            self._lists[pos].append(key)
+            self._maxes[pos] = key
+        else:
+            bisect.insort(self._lists[pos], key)
+
+        lst = self._lists[pos]
+        if len(lst) > 2 * self.LOAD:
+            self._lists.insert(pos + 1, lst[self.LOAD :])
+            del lst[self.LOAD :]
+            self._maxes.insert(pos, lst[-1])
+            self._rebuild_tree()
+        else:
+            self._tree_add(pos, 1)
+
+    def remove(self, key: RankKey) -> None:
+        pos = bisect.bisect_left(self._maxes, key)
+        lst = self._lists[pos] if pos < len(self._lists) else []
+        idx = bisect.bisect_left(lst, key)
+        if idx == len(lst) or lst[idx] != key:
+            raise KeyError(key)
+
+        self._len -= 1
+        del lst[idx]
+        if not lst:
+            del self._lists[pos]
+            del self._maxes[pos]
+            self._rebuild_tree()
+        else:
+            self._maxes[pos] = lst[-1]
+            self._tree_add(pos, -1)
+
+    def index(self, key: RankKey) -> int:
+        # Number of keys that sort before the given key
+        pos = bisect.bisect_left(self._maxes, key)
+        if pos == len(self._maxes):
+            return self._len
+        return self._tree_prefix(pos) + bisect.bisect_left(self._lists[pos], key)
+
+    def top(self, k: int) -> list[RankKey]:
+        return list(itertools.islice(self, k))
+
+
+@dataclasses.dataclass
+class Leaderboard:
+    # Ranks are not updated on every change. Changed players are only marked,
+    # and re-sorted by the tick (see refresh_steps) or, for changes since
+    # then, the next time the leaderboard is queried.
+    store: Store
+
+    ranking: SortedKeys = dataclasses.field(default_factory=SortedKeys, init=False)
+    guild_rankings: dict[GuildId, SortedKeys] = dataclasses.field(
+        default_factory=dict, init=False
+    )
+    _keys: dict[PlayerId, tuple[GuildId, RankKey]] = dataclasses.field(
+        default_factory=dict, init=False
+    )
+    _dirty: set[PlayerId] = dataclasses.field(default_factory=set, init=False)
+    _built: bool = dataclasses.field(default=False, init=False)
+    # Players changed while _build_steps runs
+    _changed_while_building: Optional[set[PlayerId]] = dataclasses.field(
+        default=None, init=False
+    )
+
+    def touch(self, player_id: PlayerId) -> None:
+        if self._built:
+            self._dirty.add(player_id)
+        if self._changed_while_building is not None:
+            self._changed_while_building.add(player_id)
+
+    def needs_rebuild(self) -> bool:
+        # Moving a player costs about ten times as much as sorting them
+        # during a rebuild
+        return (
+            not self._built
+            or len(self._dirty) > len(self._keys) * REBUILD_DIRTY_FRACTION
+        )
+
+    def refresh(self) -> None:
+        if self.needs_rebuild():
+            for _ in self._build_steps():
+                pass
+            return
+        while self._dirty:
+            self._refresh_player(self._dirty.pop())
+
+    def refresh_steps(self) -> Iterator[None]:
+        # Same as refresh, one step per player. Used by the tick, so queries
+        # only have to sort in the players changed since.
+        if self.needs_rebuild():
+            yield from self._build_steps()
+            return
+        while self._dirty:
+            self._refresh_player(self._dirty.pop())
+            yield
+
+    def _refresh_player(self, player_id: PlayerId) -> None:
+        old = self._keys.get(player_id)
+        player = self.store.players.get(player_id)
+        new = (player.guild_id, rank_key(player)) if player else None
+        if old == new:
+            return
+
+        if old is not None:
+            old_guild_id, old_key = old
+            self.ranking.remove(old_key)
+            self.guild_rankings[old_guild_id].remove(old_key)
+            del self._keys[player_id]
+        if new is not None:
+            guild_id, key = new
+            self.ranking.add(key)
+            self.guild_rankings.setdefault(guild_id, SortedKeys()).add(key)
+            self._keys[player_id] = new
+
+    def _build_steps(self) -> Iterator[None]:
+        # Builds the rankings from scratch, one step per player, and only
+        # switches to them once done. Players that change in the meantime are
+        # marked to be sorted in again.
+        changed: set[PlayerId] = set()
+        # A query may build the leaderboard at once while the tick is building
+        # it; keep marking players for the tick then
+        outer, self._changed_while_building = self._changed_while_building, changed
+        keys: dict[PlayerId, tuple[GuildId, RankKey]] = {}
+        guild_keys: dict[GuildId, list[RankKey]] = {}
+        try:
+            for player in list(self.store.players.values()):
+                key = rank_key(player)
+                keys[player.id] = (player.guild_id, key)
+                guild_keys.setdefault(player.guild_id, []).append(key)
+                yield
+        finally:
+            self._changed_while_building = outer
+
+        self._keys = keys
+        self.ranking = SortedKeys([key for _, key in keys.values()])
+        self.guild_rankings = {
+            guild_id: SortedKeys(keys) for guild_id, keys in guild_keys.items()
+        }
+        self._dirty = changed
+        self._built = True
+
+    def rank(self, player_id: PlayerId) -> Optional[int]:
+        self.refresh()
+        entry = self._keys.get(player_id)
+        if entry is None:
+            return None
+        return self.ranking.index(entry[1]) + 1
+
+    def guild_rank(self, player_id: PlayerId) -> Optional[int]:
+        self.refresh()
+        entry = self._keys.get(player_id)
+        if entry is None:
+            return None
+        guild_id, key = entry
+        return self.guild_rankings[guild_id].index(key) + 1
+
+    def top(self, k: int, guild_id: Optional[GuildId] = None) -> list[Player]:
+        self.refresh()
+        if guild_id is None:
+            ranking = self.ranking
+        else:
+            ranking = self.guild_rankings.get(guild_id, SortedKeys())
+        return [self.store.players[player_id] for _, _, player_id in ranking.top(k)]
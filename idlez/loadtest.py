@@ -0,0 +1,299 @@
+import argparse
+import asyncio
+import collections
+import dataclasses
+import os
+import pathlib
+import random as _random
+import sys
+import time
+
+import discord
+
+import idlez.bot
+import idlez.data
+import idlez.events as events
+import idlez.game
+import idlez.rng
+from idlez.store import GuildId, PlayerId, Store
+
+# Drives synthetic messages and presence updates through IdleZBot without a
+# connection to discord. The bot is set up as usual, but its channels are
+# replaced by FakeChannels, which record what is sent to them.
+
+
+@dataclasses.dataclass
+class FakeChannel:
+    # Stands in for the #idlez channel of a guild
+    id: int
+    # Simulated time it takes discord to accept a message
+    send_delay: float = 0.0
+    sent: list[tuple[float, str]] = dataclasses.field(default_factory=list)
+
+    async def send(self, content: str) -> None:
+        if self.send_delay:
+            await asyncio.sleep(self.send_delay)
+        self.sent.append((time.perf_counter(), content))
+
+
+@dataclasses.dataclass(frozen=True)
+class FakeGuild:
+    id: GuildId
+
+
+@dataclasses.dataclass(frozen=True)
+class FakeAuthor:
+    id: PlayerId
+    name: str
+    discriminator: str = "0"
+    bot: bool = False
+    system: bool = False
+
+
+@dataclasses.dataclass(frozen=True)
+class FakeMessage:
+    id: int
+    author: FakeAuthor
+    guild: FakeGuild
+    channel: FakeChannel
+    content: str
+    type: discord.MessageType = discord.MessageType.default
+
+
+@dataclasses.dataclass(frozen=True)
+class FakeClientStatus:
+    status: discord.Status
+
+
+@dataclasses.dataclass(frozen=True)
+class FakePresence:
+    # Stands in for discord.RawPresenceUpdateEvent
+    user_id: PlayerId
+    guild_id: GuildId
+    client_status: FakeClientStatus
+
+
+@dataclasses.dataclass
+class LoadTestConfig:
+    guilds: int = 10
+    players_per_guild: int = 100
+    messages: int = 10_000
+    # Fraction of messages that are !status commands
+    command_rate: float = 0.01
+    # Presence updates per message
+    presence_rate: float = 0.1
+    # Fraction of messages that are posted to other channels than #idlez
+    other_channel_rate: float = 0.0
+    # The game ticks after this many messages
+    messages_per_tick: int = 1_000
+    tick_seconds: int = 10
+    send_delay: float = 0.0
+    seed: int = 0
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+@dataclasses.dataclass
+class LoadTestResult:
+    # Time on_message took for each message
+    message_latencies: list[float]
+    # Time from receiving a command until its reply was sent
+    reply_latencies: list[float]
+    tick_latencies: list[float]
+    presence_updates: int
+    sends: int
+    duration: float
+    # Events handled by the bot, with the number of the tick they came from
+    handled_events: list[tuple[int, events.Event]] = dataclasses.field(
+        default_factory=list
+    )
+
+    def report(self) -> str:
+        lines = [
+            f"{len(self.message_latencies)} messages and {self.presence_updates}"
+            f" presence updates in {self.duration:.2f}s"
+            f" ({len(self.message_latencies) / max(self.duration, 1e-9):.0f} messages/s)",
+            f"{self.sends} messages sent in {len(self.tick_latencies)} ticks",
+        ]
+        counts = collections.Counter(
+            type(evt).__name__ for _, evt in self.handled_events
+        )
+        if counts:
+            lines.append(
+                "events: "
+                + ", ".join(f"{n} {name}" for name, n in sorted(counts.items()))
+            )
+        for name, values in [
+            ("message", self.message_latencies),
+            ("reply", self.reply_latencies),
+            ("tick", self.tick_latencies),
+        ]:
+            if not values:
+                continue
+            lines.append(
+                f"{name} latency: p50 {percentile(values, 0.5) * 1e3:.3f}ms"
+                f" p99 {percentile(values, 0.99) * 1e3:.3f}ms"
+                f" max {max(values) * 1e3:.3f}ms"
+            )
+        return "\n".join(lines)
+
+
+def make_bot(
+    data: idlez.data.Data, config: LoadTestConfig
+) -> tuple[idlez.bot.IdleZBot, dict[GuildId, FakeChannel]]:
+    game = idlez.game.IdleZ(
+        store=Store(players=dict()),
+        data=data,
+        event_handlers=[],
+        event_queue=[],
+        random_streams=idlez.rng.RandomStreams(seed=config.seed),
+    )
+    bot = idlez.bot.IdleZBot(
+        intents=idlez.bot.make_intents(low_memory=True),
+        game=game,
+        store_path=pathlib.Path(os.devnull),
+        data=data,
+        low_memory=True,
+    )
+    channels: dict[GuildId, FakeChannel] = {}
+    for g in range(config.guilds):
+        guild_id = g + 1
+        channels[guild_id] = FakeChannel(id=guild_id, send_delay=config.send_delay)
+        bot.set_channel(guild_id, channels[guild_id])  # type: ignore
+    return bot, channels
+
+
+async def run_load_test(
+    data: idlez.data.Data, config: LoadTestConfig
+) -> LoadTestResult:
+    bot, channels = make_bot(data, config)
+    rnd = _random.Random(config.seed)
+    statuses = [
+        discord.Status.online,
+        discord.Status.idle,
+        discord.Status.dnd,
+        discord.Status.offline,
+    ]
+
+    message_latencies: list[float] = []
+    reply_latencies: list[float] = []
+    tick_latencies: list[float] = []
+    presence_updates = 0
+    handled: list[tuple[int, events.Event]] = []
+    bot.game.register_handler(lambda evt: handled.append((len(tick_latencies), evt)))
+
+    async def tick() -> None:
+        started = time.perf_counter()
+        await bot.game.tick(config.tick_seconds)
+        tick_latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for i in range(config.messages):
+        guild_id = rnd.randrange(config.guilds) + 1
+        player_id = (guild_id - 1) * config.players_per_guild + rnd.randrange(
+            config.players_per_guild
+        )
+        author = FakeAuthor(id=player_id, name=f"player{player_id}")
+
+        if rnd.random() < config.presence_rate:
+            presence_updates += 1
+            await bot.on_raw_presence_update(
+                FakePresence(  # type: ignore
+                    user_id=player_id,
+                    guild_id=guild_id,
+                    client_status=FakeClientStatus(rnd.choice(statuses)),
+                )
+            )
+
+        is_command = rnd.random() < config.command_rate
+        channel = channels[guild_id]
+        if rnd.random() < config.other_channel_rate:
+            # Not known to the bot; nothing is ever sent to it
+            channel = FakeChannel(id=-guild_id)
+        message = FakeMessage(
+            id=i,
+            author=author,
+            guild=FakeGuild(guild_id),
+            channel=channel,
+            content="!status" if is_command else "braaains",
+        )
+        sent = len(channel.sent)
+        received = time.perf_counter()
+        await bot.on_message(message)  # type: ignore
+        message_latencies.append(time.perf_counter() - received)
+        if is_command and len(channel.sent) > sent:
+            reply_latencies.append(channel.sent[-1][0] - received)
+
+        if (i + 1) % config.messages_per_tick == 0:
+            await tick()
+    await tick()
+
+    return LoadTestResult(
+        message_latencies=message_latencies,
+        reply_latencies=reply_latencies,
+        tick_latencies=tick_latencies,
+        presence_updates=presence_updates,
+        sends=sum(len(c.sent) for c in channels.values()),
+        duration=time.perf_counter() - started,
+        handled_events=handled,
+    )
+
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    defaults = LoadTestConfig()
+    parser = argparse.ArgumentParser(
+        prog="idlez loadtest",
+        description="Drive synthetic messages through the bot, without discord",
+    )
+    parser.add_argument("--guilds", type=int, default=defaults.guilds)
+    parser.add_argument(
+        "--players-per-guild", type=int, default=defaults.players_per_guild
+    )
+    parser.add_argument("--messages", type=int, default=defaults.messages)
+    parser.add_argument("--command-rate", type=float, default=defaults.command_rate)
+    parser.add_argument("--presence-rate", type=float, default=defaults.presence_rate)
+    parser.add_argument(
+        "--other-channel-rate",
+        type=float,
+        default=defaults.other_channel_rate,
+        help="Fraction of messages posted to other channels than #idlez",
+    )
+    parser.add_argument(
+        "--messages-per-tick", type=int, default=defaults.messages_per_tick
+    )
+    parser.add_argument("--tick-seconds", type=int, default=defaults.tick_seconds)
+    parser.add_argument(
+        "--send-delay",
+        type=float,
+        default=defaults.send_delay,
+        help="Seconds each message sent to discord takes",
+    )
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument(
+        "--content-dir", type=pathlib.Path, help="Load the game content from here"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str]) -> int:
+    args = parse_args(argv)
+    try:
+        if args.content_dir:
+            data = idlez.data.Data.from_dir(args.content_dir)
+        else:
+            data = idlez.data.Data.from_lib_resources()
+    except (OSError, idlez.data.InvalidData) as e:
+        print(f"Error: cannot load content: {e}", file=sys.stderr)
+        return 1
+
+    config = LoadTestConfig(
+        **{f.name: getattr(args, f.name) for f in dataclasses.fields(LoadTestConfig)}
+    )
+    result = asyncio.run(run_load_test(data, config))
+    print(result.report())
+    return 0
@@ -0,0 +1,85 @@
+import datetime
+import json
+import logging
+import logging.handlers
+import queue
+import random as _random
+import sys
+from typing import Any, Optional
+
+# Logger for every message seen in #idlez; this is by far the busiest logger
+MESSAGES_LOGGER = "idlez.messages"
+
+# Attributes every LogRecord has; everything else was passed through extra
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry: dict[str, Any] = {
+            "time": datetime.datetime.fromtimestamp(
+                record.created, tz=datetime.timezone.utc
+            ).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    # Lets only the given fraction of records through
+    def __init__(self, rate: float, rnd: Optional[_random.Random] = None) -> None:
+        super().__init__()
+        self.rate = rate
+        self.random = rnd or _random.Random()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return self.rate >= 1 or self.random.random() < self.rate
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    # The stock QueueHandler formats records before queueing them. Records
+    # stay in this process, so formatting is left to the listener thread.
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def setup_logging(
+    level: str = "INFO",
+    json_output: bool = False,
+    message_sample_rate: float = 1.0,
+) -> logging.handlers.QueueListener:
+    # Log records are only queued by the logging call; a background thread
+    # formats and writes them, so a slow stderr does not block the event loop.
+    # The returned listener must be stopped to flush the remaining records.
+    handler = logging.StreamHandler(sys.stderr)
+    if json_output:
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(
+            logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+        )
+
+    log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, handler)
+    listener.start()
+
+    root = logging.getLogger()
+    for h in root.handlers[:]:
+        root.removeHandler(h)
+    root.addHandler(_QueueHandler(log_queue))  # type: ignore
+    root.setLevel(level)
+
+    messages = logging.getLogger(MESSAGES_LOGGER)
+    for f in messages.filters[:]:
+        messages.removeFilter(f)
+    if message_sample_rate < 1:
+        messages.addFilter(SamplingFilter(message_sample_rate))
+
+    return listener
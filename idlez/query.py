@@ -0,0 +1,187 @@
+import dataclasses
+import http.server
+import json
+import threading
+import time
+import urllib.parse
+from typing import Any, Iterable, NamedTuple, Optional
+
+from idlez.store import Experience, GuildId, Level, PlayerId, Store
+
+# A read-only HTTP service answering queries about players, guilds and
+# leaderboards. Queries are answered from an immutable snapshot of the store,
+# which the game replaces from time to time, so serving queries never has to
+# wait for the game and never sees a half-updated store.
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 100
+
+
+class PlayerRecord(NamedTuple):
+    id: PlayerId
+    name: str
+    experience: Experience
+    level: Level
+    guild_id: GuildId
+
+
+def store_records(store: Store) -> list[PlayerRecord]:
+    # Copies the players of the store; this is all the game loop has to do
+    return [
+        PlayerRecord(p.id, p.name, p.experience, p.level, p.guild_id)
+        for p in store.players.values()
+    ]
+
+
+@dataclasses.dataclass(frozen=True)
+class GuildStats:
+    players: int
+    total_experience: Experience
+    max_level: Level
+    mean_level: float
+
+
+@dataclasses.dataclass(frozen=True)
+class StateSnapshot:
+    taken: float
+    players: dict[PlayerId, PlayerRecord]
+    # Player ids in leaderboard order, globally and per guild
+    ranking: list[PlayerId]
+    guild_ranking: dict[GuildId, list[PlayerId]]
+    # Positions in the leaderboards, starting at 1
+    ranks: dict[PlayerId, int]
+    guild_ranks: dict[PlayerId, int]
+    guilds: dict[GuildId, GuildStats]
+
+    @staticmethod
+    def build(records: Iterable[PlayerRecord], taken: float) -> "StateSnapshot":
+        players = {r.id: r for r in records}
+        ranking = sorted(
+            players, key=lambda i: (-players[i].level, -players[i].experience, i)
+        )
+        guild_ranking: dict[GuildId, list[PlayerId]] = {}
+        guild_ranks: dict[PlayerId, int] = {}
+        for player_id in ranking:
+            guild = guild_ranking.setdefault(players[player_id].guild_id, [])
+            guild.append(player_id)
+            guild_ranks[player_id] = len(guild)
+
+        guilds: dict[GuildId, GuildStats] = {}
+        for guild_id, ids in guild_ranking.items():
+            levels = [players[i].level for i in ids]
+            guilds[guild_id] = GuildStats(
+                players=len(ids),
+                total_experience=sum(players[i].experience for i in ids),
+                # The first player of the ranking has the highest level
+                max_level=levels[0],
+                mean_level=sum(levels) / len(levels),
+            )
+
+        return StateSnapshot(
+            taken=taken,
+            players=players,
+            ranking=ranking,
+            guild_ranking=guild_ranking,
+            ranks={player_id: i for i, player_id in enumerate(ranking, start=1)},
+            guild_ranks=guild_ranks,
+            guilds=guilds,
+        )
+
+    def player_json(self, player_id: PlayerId) -> dict[str, Any]:
+        record = self.players[player_id]
+        return dict(
+            record._asdict(),
+            rank=self.ranks[player_id],
+            guild_rank=self.guild_ranks[player_id],
+        )
+
+    def top_json(
+        self, limit: int, guild_id: Optional[GuildId] = None
+    ) -> list[dict[str, Any]]:
+        ranking = self.ranking if guild_id is None else self.guild_ranking[guild_id]
+        return [self.player_json(i) for i in ranking[:limit]]
+
+
+EMPTY_SNAPSHOT = StateSnapshot.build([], taken=0.0)
+
+
+class NotFound(Exception):
+    pass
+
+
+class BadRequest(Exception):
+    pass
+
+
+class QueryServer(http.server.ThreadingHTTPServer):
+    # Every request is served by its own thread. Requests only read the
+    # current snapshot, which is replaced as a whole, so no locking is needed.
+    daemon_threads = True
+    snapshot: StateSnapshot
+
+    def __init__(self, address: tuple[str, int]) -> None:
+        super().__init__(address, QueryHandler)
+        self.snapshot = EMPTY_SNAPSHOT
+
+    def publish(self, records: list[PlayerRecord]) -> None:
+        # Builds a snapshot from the given records and makes it visible to
+        # queries. Meant to be called outside of the game loop.
+        self.snapshot = StateSnapshot.build(records, taken=time.time())
+
+    def serve_in_thread(self) -> threading.Thread:
+        thread = threading.Thread(
+            target=self.serve_forever, name="idlez-query", daemon=True
+        )
+        thread.start()
+        return thread
+
+
+class QueryHandler(http.server.BaseHTTPRequestHandler):
+    server: QueryServer
+
+    def do_GET(self) -> None:
+        url = urllib.parse.urlsplit(self.path)
+        params = urllib.parse.parse_qs(url.query)
+        parts = [p for p in url.path.split("/") if p]
+        try:
+            body = self.route(self.server.snapshot, parts, params)
+        except BadRequest as e:
+            self.respond(400, {"error": str(e)})
+            return
+        except (NotFound, KeyError, ValueError):
+            self.respond(404, {"error": "not found"})
+            return
+        self.respond(200, body)
+
+    def route(
+        self, snapshot: StateSnapshot, parts: list[str], params: dict[str, list[str]]
+    ) -> Any:
+        try:
+            limit = int(params.get("limit", [DEFAULT_LIMIT])[0])
+        except ValueError:
+            raise BadRequest("limit must be an integer") from None
+        limit = max(0, min(MAX_LIMIT, limit))
+        match parts:
+            case []:
+                return {"taken": snapshot.taken, "players": len(snapshot.players)}
+            case ["players", player_id]:
+                return snapshot.player_json(int(player_id))
+            case ["top"]:
+                return snapshot.top_json(limit)
+            case ["guilds", guild_id]:
+                return dataclasses.asdict(snapshot.guilds[int(guild_id)])
+            case ["guilds", guild_id, "top"]:
+                return snapshot.top_json(limit, guild_id=int(guild_id))
+        raise NotFound(self.path)
+
+    def respond(self, status: int, body: Any) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        # Queries are not worth a line on stderr each
+        pass
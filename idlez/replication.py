@@ -0,0 +1,267 @@
+import asyncio
+import concurrent.futures
+import dataclasses
+import json
+import logging
+import os
+import pathlib
+import re
+import time
+from typing import IO, Optional
+
+from idlez.store import (
+    LoadProgress,
+    Player,
+    PlayerId,
+    Store,
+    StoreError,
+    StoreFormat,
+    copy_player,
+    player_from_dict,
+    player_to_jsonl,
+    write_players,
+)
+
+logger = logging.getLogger(__name__)
+
+# The primary appends every changed player to a change log in the data
+# directory, and followers apply these changes to their own copy of the store.
+# The log is split into generations, one file each. Whenever the primary saves
+# the store, it starts a new generation and records it in the generation file;
+# the saved store contains all changes of the earlier generations. Changes are
+# whole player records, so applying a change again is harmless.
+#
+# The primary holds an exclusive lock on the lock file. When it dies, the lock
+# is released and a follower takes over, without loading the store again.
+
+LOCK_FILE = "primary.lock"
+GENERATION_FILE = "generation"
+_CHANGE_FILE_RE = re.compile(r"changes\.(\d+)\.jsonl")
+
+
+def change_file(path: pathlib.Path, generation: int) -> pathlib.Path:
+    return path / f"changes.{generation}.jsonl"
+
+
+def read_generation(path: pathlib.Path) -> int:
+    # The oldest generation needed on top of the saved store
+    try:
+        return int((path / GENERATION_FILE).read_text())
+    except FileNotFoundError:
+        return 0
+
+
+def change_generations(path: pathlib.Path) -> list[int]:
+    generations = []
+    for file in path.glob("changes.*.jsonl"):
+        m = _CHANGE_FILE_RE.fullmatch(file.name)
+        if m:
+            generations.append(int(m.group(1)))
+    return sorted(generations)
+
+
+def lock_primary(path: pathlib.Path) -> Optional[IO[str]]:
+    # Returns the locked lock file, or None if another process is the primary
+    # fcntl only exists on POSIX; the engine imports this module either way
+    import fcntl
+
+    fh = open(path / LOCK_FILE, "a")
+    try:
+        fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        fh.close()
+        return None
+    return fh
+
+
+@dataclasses.dataclass
+class ChangeLog:
+    # Written by the primary. Every player passed to touch is written to the
+    # log on the next flush.
+    path: pathlib.Path
+    # Kept open to hold the primary lock
+    lock: IO[str]
+
+    generation: int = dataclasses.field(init=False)
+    _file: IO[str] = dataclasses.field(init=False)
+    _dirty: set[PlayerId] = dataclasses.field(default_factory=set, init=False)
+    # A single thread writes the log and the store, so changes are written in
+    # the order they were taken
+    _writer: concurrent.futures.ThreadPoolExecutor = dataclasses.field(
+        default_factory=lambda: concurrent.futures.ThreadPoolExecutor(1),
+        init=False,
+        repr=False,
+    )
+
+    def __post_init__(self):
+        # A new primary never appends to the file of its predecessor, which
+        # may end in a torn line
+        generations = change_generations(self.path)
+        latest = max(generations[-1] if generations else 0, read_generation(self.path))
+        self.generation = latest + 1
+        self._file = open(change_file(self.path, self.generation), "a")
+
+    def touch(self, player_id: PlayerId) -> None:
+        self._dirty.add(player_id)
+
+    def take_changes(self, store: Store) -> list[Player]:
+        # Copies of the touched players; only this needs the game to hold still
+        dirty, self._dirty = self._dirty, set()
+        changes = []
+        for player_id in dirty:
+            player = store.players.get(player_id)
+            if player is not None:
+                changes.append(copy_player(player))
+        return changes
+
+    def flush(self, store: Store) -> int:
+        # Appends all touched players to the log. Returns how many there were.
+        return self._writer.submit(self._write, self.take_changes(store)).result()
+
+    def flush_async(self, store: Store) -> "asyncio.Future[int]":
+        # Same as flush, but only takes the changes right away and writes them
+        # in another thread. Must be called from the event loop.
+        changes = self.take_changes(store)
+        return asyncio.wrap_future(self._writer.submit(self._write, changes))
+
+    def _write(self, changes: list[Player]) -> int:
+        if not changes:
+            return 0
+        self._file.writelines(map(player_to_jsonl, changes))
+        self._file.flush()
+        return len(changes)
+
+    def checkpoint(self, store: Store) -> None:
+        # Saves the store and starts a new generation. Generations before the
+        # previous one are removed; followers still reading them reload.
+        changes = self.take_changes(store)
+        players = [copy_player(p) for p in store.players.values()]
+        self._writer.submit(self._checkpoint, changes, store.format, players).result()
+
+    def checkpoint_async(self, store: Store) -> "asyncio.Future[None]":
+        # Same as checkpoint, but only copies the players right away
+        changes = self.take_changes(store)
+        players = [copy_player(p) for p in store.players.values()]
+        return asyncio.wrap_future(
+            self._writer.submit(self._checkpoint, changes, store.format, players)
+        )
+
+    def _checkpoint(
+        self, changes: list[Player], fmt: StoreFormat, players: list[Player]
+    ) -> None:
+        self._write(changes)
+        self._file.close()
+        self.generation += 1
+        self._file = open(change_file(self.path, self.generation), "a")
+        write_players(fmt, Store.player_file(self.path, fmt), players)
+
+        tmp_path = self.path / (GENERATION_FILE + ".tmp")
+        tmp_path.write_text(str(self.generation))
+        os.replace(tmp_path, self.path / GENERATION_FILE)
+
+        for generation in change_generations(self.path):
+            if generation < self.generation - 1:
+                change_file(self.path, generation).unlink(missing_ok=True)
+
+    def close(self) -> None:
+        self._writer.shutdown()
+        self._file.close()
+        self.lock.close()
+
+
+@dataclasses.dataclass
+class Follower:
+    # Keeps a store up to date with the change log of the primary
+    path: pathlib.Path
+    workers: Optional[int] = None
+    progress: Optional[LoadProgress] = None
+
+    store: Store = dataclasses.field(init=False)
+    generation: int = dataclasses.field(init=False)
+    _file: Optional[IO[str]] = dataclasses.field(default=None, init=False)
+    # Start of a line the primary has not finished writing yet
+    _partial: str = dataclasses.field(default="", init=False)
+
+    def __post_init__(self):
+        self.resync()
+
+    def resync(self) -> None:
+        # (Re)loads the saved store and follows the changes from there on
+        self.close()
+        self.generation = read_generation(self.path)
+        try:
+            self.store = Store.load(self.path, self.workers, self.progress)
+        except FileNotFoundError:
+            self.store = Store(players=dict())
+        logger.info(
+            "Following changes from generation %d",
+            self.generation,
+            extra={"generation": self.generation},
+        )
+
+    def poll(self) -> int:
+        # Applies the changes written since the last poll. Returns how many
+        # players were changed.
+        applied = 0
+        while True:
+            if self._file is None:
+                try:
+                    self._file = open(change_file(self.path, self.generation))
+                except FileNotFoundError:
+                    pass
+            if self._file is not None:
+                applied += self._apply_available()
+
+            if not change_file(self.path, self.generation + 1).exists():
+                if read_generation(self.path) > self.generation + 1:
+                    # Fell behind, the changes needed have been removed
+                    self.resync()
+                    continue
+                return applied
+
+            # The primary moved on; the rest of this generation is written
+            if self._file is not None:
+                applied += self._apply_available()
+            self.close()
+            self.generation += 1
+
+    def _apply_available(self) -> int:
+        assert self._file is not None
+        data = self._partial + self._file.read()
+        lines = data.split("\n")
+        self._partial = lines.pop()
+        for line in lines:
+            if not line:
+                continue
+            try:
+                self.store.add_player(player_from_dict(json.loads(line)))
+            except ValueError as e:
+                raise StoreError(
+                    f"{change_file(self.path, self.generation)}: {e}"
+                ) from e
+        return len(lines)
+
+    def try_promote(self) -> Optional[ChangeLog]:
+        # Becomes the primary if there is none. A torn last line of the old
+        # primary is dropped.
+        lock = lock_primary(self.path)
+        if lock is None:
+            return None
+        self.poll()
+        self.close()
+        return ChangeLog(self.path, lock)
+
+    def follow(self, interval: float = 1.0) -> ChangeLog:
+        # Follows the primary until it is gone, then takes over
+        while True:
+            self.poll()
+            change_log = self.try_promote()
+            if change_log is not None:
+                return change_log
+            time.sleep(interval)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._partial = ""
@@ -0,0 +1,42 @@
+import dataclasses
+import random as _random
+from typing import Optional
+
+from idlez.store import GuildId
+
+
+def randints(rnd: _random.Random, a: int, b: int, k: int) -> list[int]:
+    # k random integers in [a, b]. Scaling floats is several times cheaper than
+    # calling Random.randint k times, and the bias is negligible for the small
+    # ranges used in the game.
+    r = rnd.random
+    n = b - a + 1
+    return [a + int(r() * n) for _ in range(k)]
+
+
+@dataclasses.dataclass
+class RandomStreams:
+    # One random stream per guild, derived from a common seed, so the outcome
+    # of a guild does not depend on what happens in other guilds. Without a
+    # seed, all streams are seeded from the system.
+    seed: Optional[int | str] = None
+
+    shared: _random.Random = dataclasses.field(init=False)
+    _guilds: dict[GuildId, _random.Random] = dataclasses.field(
+        default_factory=dict, init=False
+    )
+
+    def __post_init__(self):
+        self.shared = _random.Random(self._seed_for("shared"))
+
+    def _seed_for(self, name: str) -> Optional[str]:
+        if self.seed is None:
+            return None
+        return f"{self.seed}/{name}"
+
+    def guild(self, guild_id: GuildId) -> _random.Random:
+        rnd = self._guilds.get(guild_id)
+        if rnd is None:
+            rnd = _random.Random(self._seed_for(f"guild/{guild_id}"))
+            self._guilds[guild_id] = rnd
+        return rnd
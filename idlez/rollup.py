@@ -0,0 +1,159 @@
+import dataclasses
+import random as _random
+from typing import Optional
+
+from idlez.store import Experience, GuildId, Level, Player, PlayerId
+
+
+@dataclasses.dataclass
+class GuildRollup:
+    # False while the players of the guild are not in memory, e.g. with a
+    # per-guild store. The statistics are then those of when the guild was
+    # evicted, or empty if it has not been loaded yet; only online is kept up
+    # to date for evicted guilds.
+    loaded: bool = True
+    players: int = 0
+    # Players that are online or away
+    online: int = 0
+    total_level: int = 0
+    total_experience: Experience = 0
+
+    @property
+    def mean_level(self) -> float:
+        if not self.players:
+            return 0.0
+        return self.total_level / self.players
+
+    def message_fields(self) -> dict[str, str | int | float]:
+        return {
+            "guild_players": self.players,
+            "guild_online": self.online,
+            "guild_mean_level": round(self.mean_level, 1),
+            "guild_total_experience": self.total_experience,
+        }
+
+
+@dataclasses.dataclass
+class PlayerSet:
+    # Set of player ids that can pick a random member in O(1). The order of
+    # the members only depends on the order they were added and removed in.
+    _ids: list[PlayerId] = dataclasses.field(default_factory=list)
+    _index: dict[PlayerId, int] = dataclasses.field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, player_id: PlayerId) -> bool:
+        return player_id in self._index
+
+    def add(self, player_id: PlayerId) -> None:
+        if player_id not in self._index:
+            self._index[player_id] = len(self._ids)
+            self._ids.append(player_id)
+
+    def discard(self, player_id: PlayerId) -> None:
+        i = self._index.pop(player_id, None)
+        if i is None:
+            return
+        last = self._ids.pop()
+        if i < len(self._ids):
+            self._ids[i] = last
+            self._index[last] = i
+
+    def choice(
+        self, rnd: _random.Random, other_than: Optional[PlayerId] = None
+    ) -> Optional[PlayerId]:
+        # A random member, optionally other than the given one
+        n = len(self._ids)
+        if other_than in self._index:
+            n -= 1
+        if n <= 0:
+            return None
+        picked = self._ids[rnd.randrange(n)]
+        if other_than in self._index and picked == other_than:
+            # The excluded member takes the place of the last one
+            picked = self._ids[-1]
+        return picked
+
+
+@dataclasses.dataclass
+class Rollups:
+    # Statistics per guild, kept up to date with every change of a player in
+    # O(1), so they never need a scan over all players
+    guilds: dict[GuildId, GuildRollup] = dataclasses.field(default_factory=dict)
+    # What each player contributes to the rollup of their guild
+    _players: dict[PlayerId, tuple[GuildId, Level, Experience]] = dataclasses.field(
+        default_factory=dict
+    )
+    # Online players, including ones that are not known yet
+    _online: set[PlayerId] = dataclasses.field(default_factory=set)
+    # Players and online players of each guild, to pick players for encounters
+    # without going over the guild
+    members: dict[GuildId, PlayerSet] = dataclasses.field(default_factory=dict)
+    online_members: dict[GuildId, PlayerSet] = dataclasses.field(default_factory=dict)
+
+    def guild(self, guild_id: GuildId) -> GuildRollup:
+        return self.guilds.get(guild_id) or GuildRollup(loaded=False)
+
+    def guild_of(self, player_id: PlayerId) -> Optional[GuildId]:
+        # Guild of any player seen so far, including evicted ones
+        known = self._players.get(player_id)
+        return known[0] if known is not None else None
+
+    def random_player(
+        self,
+        guild_id: GuildId,
+        rnd: _random.Random,
+        online: bool = False,
+        other_than: Optional[PlayerId] = None,
+    ) -> Optional[PlayerId]:
+        # A random (online) player of the guild, in O(1)
+        players = (self.online_members if online else self.members).get(guild_id)
+        if players is None:
+            return None
+        return players.choice(rnd, other_than)
+
+    def update(self, player: Player) -> None:
+        old = self._players.get(player.id)
+        if old is None:
+            rollup = self.guilds.setdefault(player.guild_id, GuildRollup())
+            rollup.players += 1
+            self.members.setdefault(player.guild_id, PlayerSet()).add(player.id)
+            if player.id in self._online:
+                rollup.online += 1
+                self.online_members.setdefault(player.guild_id, PlayerSet()).add(
+                    player.id
+                )
+        else:
+            guild_id, level, experience = old
+            rollup = self.guilds[guild_id]
+            rollup.total_level -= level
+            rollup.total_experience -= experience
+        rollup.loaded = True
+        rollup.total_level += player.level
+        rollup.total_experience += player.experience
+        self._players[player.id] = (player.guild_id, player.level, player.experience)
+
+    def evict(self, guild_id: GuildId) -> None:
+        # The players of the guild are no longer in memory; they keep their
+        # share of the statistics, as they do not change while evicted
+        rollup = self.guilds.get(guild_id)
+        if rollup is not None:
+            rollup.loaded = False
+
+    def set_online(self, player_id: PlayerId, online: bool) -> None:
+        if online == (player_id in self._online):
+            return
+        if online:
+            self._online.add(player_id)
+        else:
+            self._online.discard(player_id)
+        known = self._players.get(player_id)
+        if known is not None:
+            guild_id = known[0]
+            self.guilds[guild_id].online += 1 if online else -1
+            online_members = self.online_members.setdefault(guild_id, PlayerSet())
+            if online:
+                online_members.add(player_id)
+            else:
+                online_members.discard(player_id)
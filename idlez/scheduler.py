@@ -0,0 +1,196 @@
+import asyncio
+import dataclasses
+import datetime
+import heapq
+import math
+import time
+from typing import Generator, Generic, Hashable, Iterable, Optional, TypeVar
+
+_K = TypeVar("_K", bound=Hashable)
+_R = TypeVar("_R")
+
+# Phases of the keys of a StaggeredTicker are multiples of this fraction of the
+# interval, so however many keys there are, they are spread evenly
+_PHASE_STEP = (math.sqrt(5) - 1) / 2
+
+
+@dataclasses.dataclass
+class AdaptiveTickScheduler:
+    # Decides how long to wait between two ticks. Large stores tick less often,
+    # so a tick never takes more than max_load of the time. The time passed to
+    # the game is measured on the wall clock, so a suspend or a long stall is
+    # handed to the game as one long catch-up tick.
+    min_interval: float = 10.0
+    max_interval: float = 60.0
+    # Fraction of time the game may spend ticking
+    max_load: float = 0.05
+    # Ticking a single player is assumed to take this long before the first
+    # tick has been measured
+    seconds_per_player: float = 5e-6
+
+    interval: float = dataclasses.field(init=False)
+    _last_tick: Optional[datetime.datetime] = dataclasses.field(
+        default=None, init=False
+    )
+    # Fractions of seconds not yet handed to the game
+    _carry: float = dataclasses.field(default=0.0, init=False)
+    # Moving average of the time needed to tick a single player
+    _player_cost: Optional[float] = dataclasses.field(default=None, init=False)
+
+    def __post_init__(self):
+        self.interval = self.min_interval
+
+    def start(self, now: datetime.datetime) -> None:
+        self._last_tick = now
+
+    def elapsed(self, now: datetime.datetime) -> int:
+        # Whole seconds passed since the last tick
+        if self._last_tick is None:
+            self._last_tick = now
+            return 0
+        diff = (now - self._last_tick).total_seconds() + self._carry
+        self._last_tick = now
+        if diff < 0:
+            # The clock went backwards, do not take any time away
+            self._carry = 0.0
+            return 0
+        seconds = int(diff)
+        self._carry = diff - seconds
+        return seconds
+
+    def record_tick(self, cost: float, player_count: int) -> float:
+        # Adapt the interval to how long the last tick took. Returns the new
+        # interval.
+        if player_count > 0:
+            player_cost = cost / player_count
+            if self._player_cost is None:
+                self._player_cost = player_cost
+            else:
+                self._player_cost = 0.8 * self._player_cost + 0.2 * player_cost
+        player_cost = (
+            self._player_cost
+            if self._player_cost is not None
+            else self.seconds_per_player
+        )
+        expected_cost = player_cost * player_count
+        self.interval = min(
+            self.max_interval, max(self.min_interval, expected_cost / self.max_load)
+        )
+        return self.interval
+
+
+@dataclasses.dataclass
+class TimeSlicer:
+    # Runs work given as steps, and yields to the event loop whenever it held
+    # the loop for budget seconds. Without a budget, the work runs in one go.
+    budget: Optional[float] = None
+    # Seconds spent letting other work run
+    waited: float = dataclasses.field(default=0.0, init=False)
+    _since: float = dataclasses.field(default_factory=time.perf_counter, init=False)
+
+    async def run(self, steps: Iterable[None]) -> None:
+        if self.budget is None:
+            for _ in steps:
+                pass
+            return
+        for _ in steps:
+            await self.pause()
+
+    async def evaluate(self, steps: Generator[None, None, _R]) -> _R:
+        # Same as run, for steps that compute a result
+        while True:
+            try:
+                next(steps)
+            except StopIteration as done:
+                return done.value
+            await self.pause()
+
+    async def pause(self) -> None:
+        # Yields to the event loop if the budget is used up
+        if self.budget is None:
+            return
+        paused = time.perf_counter()
+        if paused - self._since >= self.budget:
+            await asyncio.sleep(0)
+            self._since = time.perf_counter()
+            self.waited += self._since - paused
+
+
+@dataclasses.dataclass
+class StaggeredTicker(Generic[_K]):
+    # Ticks each key (e.g. a guild) once per interval, each at its own phase
+    # within the interval, so the work is spread over time instead of being
+    # done all at once. Times are wall clock seconds, so a suspend is handed to
+    # every key as one long catch-up tick.
+    interval: float = 10.0
+
+    # Due time, sequence number of the entry and key
+    _heap: list[tuple[float, int, _K]] = dataclasses.field(
+        default_factory=list, init=False
+    )
+    # Sequence number of the current entry of every key; other entries of the
+    # key in the heap are stale
+    _entries: dict[_K, int] = dataclasses.field(default_factory=dict, init=False)
+    _last_tick: dict[_K, float] = dataclasses.field(default_factory=dict, init=False)
+    # Fractions of seconds not yet handed to the key
+    _carry: dict[_K, float] = dataclasses.field(default_factory=dict, init=False)
+    _seq: int = dataclasses.field(default=0, init=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: _K) -> bool:
+        return key in self._entries
+
+    def add(self, key: _K, now: float) -> None:
+        if key in self._entries:
+            return
+        self._seq += 1
+        phase = (self._seq * _PHASE_STEP) % 1.0 * self.interval
+        self._entries[key] = self._seq
+        self._last_tick[key] = now
+        self._carry[key] = 0.0
+        heapq.heappush(
+            self._heap, (now + (phase - now) % self.interval, self._seq, key)
+        )
+
+    def remove(self, key: _K) -> None:
+        if self._entries.pop(key, None) is None:
+            return
+        del self._last_tick[key]
+        del self._carry[key]
+
+    def next_due(self) -> Optional[float]:
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: float) -> list[tuple[_K, int]]:
+        # Returns the keys that are due together with the whole seconds passed
+        # since their last tick, and schedules their next ticks
+        due: list[tuple[_K, int]] = []
+        while self._drop_stale() and self._heap[0][0] <= now:
+            at, seq, key = heapq.heappop(self._heap)
+            diff = now - self._last_tick[key] + self._carry[key]
+            self._last_tick[key] = now
+            seconds = max(0, int(diff))
+            self._carry[key] = max(0.0, diff - seconds)
+            due.append((key, seconds))
+
+            # Keep the phase, but do not try to catch up on missed ticks
+            at += self.interval
+            if at <= now:
+                at += math.ceil((now - at) / self.interval) * self.interval
+                if at <= now:
+                    at += self.interval
+            heapq.heappush(self._heap, (at, seq, key))
+        return due
+
+    def _drop_stale(self) -> bool:
+        # Removes stale entries from the top of the heap; returns whether any
+        # entries are left
+        while self._heap:
+            _, seq, key = self._heap[0]
+            if self._entries.get(key) == seq:
+                return True
+            heapq.heappop(self._heap)
+        return False
@@ -1,12 +1,36 @@
+import asyncio
+import collections
+import concurrent.futures
 import dataclasses
+import gzip
+import itertools
+import logging
+import lzma
+import mmap
+import os
 import pathlib
 import json
+import shutil
+import struct
+import tempfile
+import zlib
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
 
 PlayerId = int
 Experience = int
 Level = int
 GuildId = int
 
+# Number of records written with a single write call
+WRITE_BATCH_SIZE = 4096
+# Player files smaller than this are parsed in the current process
+PARALLEL_LOAD_MIN_BYTES = 32 * 1024 * 1024
+
+# Called with the number of bytes loaded so far and the total number of bytes
+LoadProgress = Callable[[int, int], None]
+
 
 @dataclasses.dataclass(slots=True)
 class Player:
@@ -17,24 +41,763 @@ class Player:
     guild_id: GuildId
 
 
+def copy_player(player: Player) -> Player:
+    # Copies are written while the game goes on changing the players
+    return Player(
+        player.id, player.name, player.experience, player.level, player.guild_id
+    )
+
+
+class StoreError(Exception):
+    pass
+
+
+class InvalidRecord(StoreError):
+    def __init__(self, path: pathlib.Path, record: int, reason: str) -> None:
+        super().__init__(f"{path}: record {record}: {reason}")
+        self.path = path
+        self.record = record
+        self.reason = reason
+
+
+def player_from_dict(pdict: Any) -> Player:
+    try:
+        p = Player(**pdict)
+    except TypeError as e:
+        raise ValueError(f"not a player: {pdict!r}") from e
+    if (
+        type(p.id) is not int
+        or type(p.name) is not str
+        or type(p.experience) is not int
+        or type(p.level) is not int
+        or type(p.guild_id) is not int
+    ):
+        raise ValueError(f"player has fields of the wrong type: {pdict!r}")
+    return p
+
+
+def read_jsonl(path: pathlib.Path) -> Iterator[Player]:
+    with open(path, "r") as fh:
+        for i, line in enumerate(fh, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield player_from_dict(json.loads(line))
+            except ValueError as e:
+                raise InvalidRecord(path, i, str(e)) from e
+
+
+def _parse_jsonl_chunk(path: str, start: int, end: int) -> list[tuple]:
+    with open(path, "rb") as fh:
+        fh.seek(start)
+        data = fh.read(end - start)
+    # Plain tuples are much cheaper to send back to the parent than players
+    return [
+        dataclasses.astuple(player_from_dict(json.loads(line)))
+        for line in data.splitlines()
+        if line.strip()
+    ]
+
+
+def jsonl_chunks(path: pathlib.Path, count: int) -> list[tuple[int, int]]:
+    # Split the file into roughly equally sized chunks of whole lines
+    size = path.stat().st_size
+    if size == 0:
+        return []
+    bounds = [0]
+    with (
+        open(path, "rb") as fh,
+        mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm,
+    ):
+        for i in range(1, count):
+            pos = mm.find(b"\n", max(size * i // count, bounds[-1]))
+            if pos == -1 or pos + 1 >= size:
+                break
+            bounds.append(pos + 1)
+    bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+
+def read_jsonl_parallel(
+    path: pathlib.Path,
+    workers: Optional[int] = None,
+    progress: Optional[LoadProgress] = None,
+) -> Iterator[Player]:
+    workers = workers or os.cpu_count() or 1
+    size = path.stat().st_size
+    if workers <= 1 or size < PARALLEL_LOAD_MIN_BYTES:
+        yield from read_jsonl(path)
+        if progress:
+            progress(size, size)
+        return
+
+    # More chunks than workers to balance the load and report progress
+    chunks = jsonl_chunks(path, 4 * workers)
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        futures = [pool.submit(_parse_jsonl_chunk, str(path), s, e) for s, e in chunks]
+        try:
+            # Results are merged in file order, so later records still win
+            for (_, end), future in zip(chunks, futures):
+                for record in future.result():
+                    yield Player(*record)
+                if progress:
+                    progress(end, size)
+        except ValueError as e:
+            for future in futures:
+                future.cancel()
+            # Parse the file again to report the exact record that is broken
+            for _ in read_jsonl(path):
+                pass
+            raise StoreError(f"{path}: {e}") from e
+
+
+def player_to_jsonl(p: Player) -> str:
+    return json.dumps(dataclasses.asdict(p)) + "\n"
+
+
+def write_jsonl(path: pathlib.Path, players: Iterable[Player]) -> int:
+    count = 0
+    with open(path, "w") as fh:
+        it = iter(players)
+        while batch := list(itertools.islice(it, WRITE_BATCH_SIZE)):
+            fh.writelines(map(player_to_jsonl, batch))
+            count += len(batch)
+    return count
+
+
+# Binary snapshots consist of a header, one fixed-width record per player and a
+# heap holding the UTF-8 encoded player names. Records of snapshots written by
+# Store.save are sorted by player id, so single players can be looked up by
+# binary search directly in the memory mapped file.
+SNAPSHOT_MAGIC = b"IDLZSNP1"
+# magic, number of records, flags, offset of the name heap
+SNAPSHOT_HEADER = struct.Struct("<8sQQQ")
+# id, experience, level, guild_id, name offset, name length
+SNAPSHOT_RECORD = struct.Struct("<qqiqqI")
+SNAPSHOT_SORTED = 1
+
+
+class Snapshot:
+    def __init__(self, path: pathlib.Path) -> None:
+        self.path = path
+        with open(path, "rb") as fh:
+            self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if len(self._mm) < SNAPSHOT_HEADER.size:
+                raise StoreError(f"{path}: truncated snapshot")
+            magic, count, flags, heap = SNAPSHOT_HEADER.unpack_from(self._mm)
+            if magic != SNAPSHOT_MAGIC:
+                raise StoreError(f"{path}: not a snapshot")
+            if (
+                SNAPSHOT_HEADER.size + count * SNAPSHOT_RECORD.size != heap
+                or heap > len(self._mm)
+            ):
+                raise StoreError(f"{path}: truncated snapshot")
+        except BaseException:
+            self._mm.close()
+            raise
+        self._count: int = count
+        self._heap: int = heap
+        self.is_sorted = bool(flags & SNAPSHOT_SORTED)
+
+    def __enter__(self) -> "Snapshot":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._mm.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _player(self, record: tuple[int, int, int, int, int, int]) -> Player:
+        id, experience, level, guild_id, name_offset, name_len = record
+        start = self._heap + name_offset
+        if start + name_len > len(self._mm):
+            raise StoreError(f"{self.path}: name of player {id} is out of bounds")
+        name = str(self._mm[start : start + name_len], "utf-8")
+        return Player(id, name, experience, level, guild_id)
+
+    def __getitem__(self, i: int) -> Player:
+        if not 0 <= i < self._count:
+            raise IndexError(i)
+        offset = SNAPSHOT_HEADER.size + i * SNAPSHOT_RECORD.size
+        return self._player(SNAPSHOT_RECORD.unpack_from(self._mm, offset))
+
+    def __iter__(self) -> Iterator[Player]:
+        records = memoryview(self._mm)[SNAPSHOT_HEADER.size : self._heap]
+        try:
+            for record in SNAPSHOT_RECORD.iter_unpack(records):
+                yield self._player(record)
+        finally:
+            records.release()
+
+    def _id_at(self, i: int) -> PlayerId:
+        offset = SNAPSHOT_HEADER.size + i * SNAPSHOT_RECORD.size
+        return struct.unpack_from("<q", self._mm, offset)[0]
+
+    def get(self, player_id: PlayerId) -> Optional[Player]:
+        if not self.is_sorted:
+            return next((p for p in self if p.id == player_id), None)
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._id_at(mid) < player_id:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._count and self._id_at(lo) == player_id:
+            return self[lo]
+        return None
+
+
+def read_snapshot(path: pathlib.Path) -> Iterator[Player]:
+    with Snapshot(path) as snapshot:
+        yield from snapshot
+
+
+def write_snapshot(path: pathlib.Path, players: Iterable[Player]) -> int:
+    count = 0
+    is_sorted = True
+    last_id: Optional[PlayerId] = None
+    with open(path, "wb") as fh, tempfile.TemporaryFile() as heap:
+        fh.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, 0, 0, 0))
+        heap_size = 0
+        it = iter(players)
+        while batch := list(itertools.islice(it, WRITE_BATCH_SIZE)):
+            records = bytearray()
+            names = bytearray()
+            for p in batch:
+                if last_id is not None and p.id <= last_id:
+                    is_sorted = False
+                last_id = p.id
+                name = p.name.encode("utf-8")
+                records += SNAPSHOT_RECORD.pack(
+                    p.id, p.experience, p.level, p.guild_id, heap_size, len(name)
+                )
+                names += name
+                heap_size += len(name)
+            fh.write(records)
+            heap.write(names)
+            count += len(batch)
+
+        # The heap is only appended once all records are known
+        heap_offset = fh.tell()
+        heap.seek(0)
+        shutil.copyfileobj(heap, fh)
+        fh.seek(0)
+        flags = SNAPSHOT_SORTED if is_sorted else 0
+        fh.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, count, flags, heap_offset))
+    return count
+
+
+# Compressed stores are JSONL split into blocks of WRITE_BATCH_SIZE records,
+# each compressed on its own and protected by a checksum. They are written and
+# read as a stream. If the file ends in a torn or corrupt block, the players of
+# all blocks before it are still loaded.
+BLOCKS_MAGIC = b"IDLZBLK1"
+# magic, codec id, compression level
+BLOCKS_HEADER = struct.Struct("<8sBB")
+# compressed size, uncompressed size, number of records, CRC32 of the
+# compressed data
+BLOCK_HEADER = struct.Struct("<IIII")
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class Codec:
+    id: int
+    name: str
+    default_level: int
+    compress: Callable[[bytes, int], bytes]
+    decompress: Callable[[bytes], bytes]
+    levels: range = range(0, 10)
+
+    def check_level(self, level: int) -> None:
+        if level not in self.levels:
+            raise StoreError(
+                f"{self.name} compression level must be between"
+                f" {self.levels.start} and {self.levels.stop - 1}, not {level}"
+            )
+
+
+CODECS = {
+    codec.name: codec
+    for codec in [
+        Codec(1, "zlib", 6, zlib.compress, zlib.decompress),
+        Codec(
+            2,
+            "gzip",
+            6,
+            lambda data, level: gzip.compress(data, level, mtime=0),
+            gzip.decompress,
+        ),
+        Codec(
+            3,
+            "lzma",
+            6,
+            lambda data, level: lzma.compress(data, preset=level),
+            lzma.decompress,
+        ),
+    ]
+}
+_CODECS_BY_ID = {codec.id: codec for codec in CODECS.values()}
+
+
+def write_blocks(
+    path: pathlib.Path,
+    players: Iterable[Player],
+    codec: Codec,
+    level: Optional[int] = None,
+) -> int:
+    level = codec.default_level if level is None else level
+    count = 0
+    with open(path, "wb") as fh:
+        fh.write(BLOCKS_HEADER.pack(BLOCKS_MAGIC, codec.id, level))
+        it = iter(players)
+        while batch := list(itertools.islice(it, WRITE_BATCH_SIZE)):
+            data = "".join(map(player_to_jsonl, batch)).encode("utf-8")
+            compressed = codec.compress(data, level)
+            fh.write(
+                BLOCK_HEADER.pack(
+                    len(compressed), len(data), len(batch), zlib.crc32(compressed)
+                )
+            )
+            fh.write(compressed)
+            count += len(batch)
+    return count
+
+
+def read_blocks(path: pathlib.Path, strict: bool = True) -> Iterator[Player]:
+    # A torn or corrupt block raises a StoreError. Unless strict, the file is
+    # read up to that block instead, which recovers the players of a store
+    # whose last write was interrupted.
+    with open(path, "rb") as fh:
+        header = fh.read(BLOCKS_HEADER.size)
+        if len(header) < BLOCKS_HEADER.size:
+            raise StoreError(f"{path}: truncated block file")
+        magic, codec_id, _ = BLOCKS_HEADER.unpack(header)
+        if magic != BLOCKS_MAGIC:
+            raise StoreError(f"{path}: not a block file")
+        codec = _CODECS_BY_ID.get(codec_id)
+        if codec is None:
+            raise StoreError(f"{path}: unknown codec {codec_id}")
+
+        block = 0
+        record = 0
+        while header := fh.read(BLOCK_HEADER.size):
+            block += 1
+            lines = None
+            if len(header) == BLOCK_HEADER.size:
+                size, raw_size, records, crc = BLOCK_HEADER.unpack(header)
+                compressed = fh.read(size)
+                if len(compressed) == size and zlib.crc32(compressed) == crc:
+                    data = codec.decompress(compressed)
+                    if len(data) == raw_size:
+                        lines = data.splitlines()
+            if lines is None or len(lines) != records:
+                if strict:
+                    raise StoreError(f"{path}: block {block} is torn or corrupt")
+                logger.warning(
+                    "%s: block %d is torn or corrupt; recovering the %d players"
+                    " before it and dropping the rest of the file",
+                    path,
+                    block,
+                    record,
+                    extra={"path": str(path), "block": block, "players": record},
+                )
+                return
+            for line in lines:
+                record += 1
+                try:
+                    yield player_from_dict(json.loads(line))
+                except ValueError as e:
+                    raise InvalidRecord(path, record, str(e)) from e
+
+
+def compressed_format(codec: Codec, level: Optional[int] = None) -> "StoreFormat":
+    if level is not None:
+        codec.check_level(level)
+    return StoreFormat(
+        name=f"jsonl-{codec.name}",
+        suffix=f".jsonl.{codec.name}",
+        read=read_blocks,
+        write=lambda path, players: write_blocks(path, players, codec, level),
+        codec=codec,
+    )
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class StoreFormat:
+    name: str
+    suffix: str
+    read: Callable[[pathlib.Path], Iterator[Player]]
+    write: Callable[[pathlib.Path, Iterable[Player]], int]
+    # Set for compressed formats
+    codec: Optional[Codec] = None
+
+    def recover(self, path: pathlib.Path) -> Iterator[Player]:
+        # Same as read, but reads as much as possible of a damaged file. Only
+        # for loading the store of the bot, never for writing a new file.
+        if self.codec is not None:
+            return read_blocks(path, strict=False)
+        return self.read(path)
+
+
+FORMATS: dict[str, StoreFormat] = {}
+
+
+def register_format(fmt: StoreFormat) -> None:
+    FORMATS[fmt.name] = fmt
+
+
+def format_for_path(path: pathlib.Path) -> StoreFormat:
+    for fmt in FORMATS.values():
+        if path.name.endswith(fmt.suffix):
+            return fmt
+    raise StoreError(f"{path}: unknown store format")
+
+
+def write_atomic(
+    fmt: StoreFormat, path: pathlib.Path, players: Iterable[Player]
+) -> int:
+    # Write to a temporary file first, so a crash never leaves a torn store
+    tmp_path = path.with_name(path.name + ".tmp")
+    try:
+        count = fmt.write(tmp_path, players)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    os.replace(tmp_path, path)
+    return count
+
+
+JSONL = StoreFormat(name="jsonl", suffix=".jsonl", read=read_jsonl, write=write_jsonl)
+register_format(JSONL)
+SNAPSHOT = StoreFormat(
+    name="snapshot", suffix=".snap", read=read_snapshot, write=write_snapshot
+)
+register_format(SNAPSHOT)
+for _codec in CODECS.values():
+    register_format(compressed_format(_codec))
+
+
+def find_newest_file(directory: pathlib.Path, stem: str) -> pathlib.Path:
+    # If players were saved in several formats, the newest file wins
+    found = [
+        f
+        for f in (directory.joinpath(stem + fmt.suffix) for fmt in FORMATS.values())
+        if f.exists()
+    ]
+    if not found:
+        raise FileNotFoundError(directory.joinpath(stem + JSONL.suffix))
+    return max(found, key=lambda f: f.stat().st_mtime_ns)
+
+
 @dataclasses.dataclass
 class Store:
     players: dict[PlayerId, Player]
+    # Format used by save
+    format: StoreFormat = dataclasses.field(default=JSONL, compare=False)
+    guild_players: dict[GuildId, set[PlayerId]] = dataclasses.field(
+        default_factory=dict, init=False, compare=False, repr=False
+    )
+
+    def __post_init__(self):
+        for p in self.players.values():
+            self.guild_players.setdefault(p.guild_id, set()).add(p.id)
 
     @staticmethod
-    def player_file(store_path: pathlib.Path):
-        return store_path.joinpath("players.jsonl")
+    def player_file(store_path: pathlib.Path, fmt: StoreFormat = JSONL):
+        return store_path.joinpath("players" + fmt.suffix)
+
+    @classmethod
+    def find_player_file(cls, store_path: pathlib.Path) -> pathlib.Path:
+        return find_newest_file(store_path, "players")
 
     @classmethod
-    def load(cls, path: pathlib.Path) -> "Store":
+    def load(
+        cls,
+        path: pathlib.Path,
+        workers: Optional[int] = None,
+        progress: Optional[LoadProgress] = None,
+    ) -> "Store":
+        file = cls.find_player_file(path)
+        fmt = format_for_path(file)
+        if fmt is JSONL:
+            players_it = read_jsonl_parallel(file, workers, progress)
+        else:
+            players_it = fmt.recover(file)
+
+        # Snapshots could serve single players straight from the file, but the
+        # game goes over all players on every tick, so all are decoded here
         players: dict[PlayerId, Player] = dict()
-        with open(cls.player_file(path), "r") as fh:
-            for line in fh:
-                player = Player(**json.loads(line))
-                players[player.id] = player
-        return cls(players=players)
+        for player in players_it:
+            players[player.id] = player
+        if progress and fmt is not JSONL:
+            size = file.stat().st_size
+            progress(size, size)
+        return cls(players=players, format=fmt)
 
     def save(self, path: pathlib.Path):
-        with open(self.player_file(path), "w") as fh:
-            for p in self.players.values():
-                print(json.dumps(dataclasses.asdict(p)), file=fh)
+        write_players(
+            self.format, self.player_file(path, self.format), self.players.values()
+        )
+
+    def add_player(self, player: Player) -> None:
+        self.players[player.id] = player
+        self.guild_players.setdefault(player.guild_id, set()).add(player.id)
+
+    def ensure_guild(self, guild_id: GuildId) -> tuple[list[Player], list[Player]]:
+        # Makes sure the players of the given guild are in memory. Returns the
+        # players that were loaded and the players that were evicted for this.
+        # All guilds are always in memory in this store.
+        return [], []
+
+    def has_guild(self, guild_id: GuildId) -> bool:
+        # Whether ensure_guild would not need to load the guild
+        return True
+
+    async def load_guild(self, guild_id: GuildId) -> tuple[list[Player], list[Player]]:
+        # Same as ensure_guild, but without blocking the event loop on file IO
+        return self.ensure_guild(guild_id)
+
+    def save_async(self, path: pathlib.Path) -> "asyncio.Future[None]":
+        # Same as save, but only copies the players right away and writes them
+        # in another thread. Must be called from the event loop.
+        players = [copy_player(p) for p in self.players.values()]
+        file = self.player_file(path, self.format)
+        return asyncio.ensure_future(
+            asyncio.to_thread(write_players, self.format, file, players)
+        )
+
+
+def write_players(fmt: StoreFormat, path: pathlib.Path, players: Iterable[Player]):
+    if fmt is SNAPSHOT:
+        # Sorted snapshots allow looking up players without loading them
+        players = sorted(players, key=lambda p: p.id)
+    write_atomic(fmt, path, players)
+
+
+@dataclasses.dataclass
+class GuildStore(Store):
+    # Keeps the players of each guild in their own file. Guilds are loaded when
+    # they are needed, and the least recently used guilds are written back to
+    # disk and dropped once more than max_players players are in memory.
+    path: pathlib.Path = dataclasses.field(default=pathlib.Path("."), compare=False)
+    max_players: Optional[int] = dataclasses.field(default=None, compare=False)
+    save_workers: int = dataclasses.field(default=8, compare=False)
+
+    _lru: collections.OrderedDict[GuildId, None] = dataclasses.field(
+        default_factory=collections.OrderedDict, init=False, compare=False
+    )
+    # Guilds currently read by load_guild
+    _reading: dict[GuildId, "asyncio.Future[list[Player]]"] = dataclasses.field(
+        default_factory=dict, init=False, compare=False, repr=False
+    )
+    # Evicted guilds whose players are not written yet
+    _saving: dict[GuildId, list[Player]] = dataclasses.field(
+        default_factory=dict, init=False, compare=False, repr=False
+    )
+    # A single thread writes the guild files, so writes happen in order
+    _writer: concurrent.futures.ThreadPoolExecutor = dataclasses.field(
+        default_factory=lambda: concurrent.futures.ThreadPoolExecutor(1),
+        init=False,
+        compare=False,
+        repr=False,
+    )
+
+    @staticmethod
+    def guild_dir(store_path: pathlib.Path) -> pathlib.Path:
+        return store_path.joinpath("guilds")
+
+    @classmethod
+    def open(
+        cls,
+        path: pathlib.Path,
+        max_players: Optional[int] = None,
+        fmt: StoreFormat = JSONL,
+    ) -> "GuildStore":
+        guild_dir = cls.guild_dir(path)
+        if not guild_dir.exists():
+            # Split up an existing single file store. The guild files are
+            # written to a temporary directory first, so a crash never leaves
+            # half of the guilds behind.
+            tmp_dir = guild_dir.with_name(guild_dir.name + ".tmp")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            tmp_dir.mkdir(parents=True)
+            try:
+                store = Store.load(path)
+            except FileNotFoundError:
+                store = Store(players=dict())
+            for guild_id, player_ids in store.guild_players.items():
+                write_players(
+                    fmt,
+                    tmp_dir.joinpath(f"{guild_id}{fmt.suffix}"),
+                    (store.players[player_id] for player_id in player_ids),
+                )
+            os.replace(tmp_dir, guild_dir)
+        cls.retire_player_files(path)
+        return cls(players=dict(), format=fmt, path=path, max_players=max_players)
+
+    @staticmethod
+    def retire_player_files(store_path: pathlib.Path) -> None:
+        # Once split up, the single file store is outdated. It is renamed, so
+        # neither Store.load nor idlez store pick it up any longer.
+        for fmt in FORMATS.values():
+            file = Store.player_file(store_path, fmt)
+            if file.exists():
+                logger.info(
+                    "%s has been split up into guild files",
+                    file,
+                    extra={"path": str(file)},
+                )
+                os.replace(file, file.with_name(file.name + ".migrated"))
+
+    @classmethod
+    def guild_files(cls, store_path: pathlib.Path) -> list[pathlib.Path]:
+        # The newest file of each guild
+        guild_dir = cls.guild_dir(store_path)
+        stems: set[str] = set()
+        for file in guild_dir.iterdir():
+            for fmt in FORMATS.values():
+                if file.name.endswith(fmt.suffix):
+                    stems.add(file.name[: -len(fmt.suffix)])
+        return [find_newest_file(guild_dir, stem) for stem in sorted(stems)]
+
+    def guild_file(self, guild_id: GuildId) -> pathlib.Path:
+        return self.guild_dir(self.path).joinpath(f"{guild_id}{self.format.suffix}")
+
+    @property
+    def loaded_guilds(self) -> list[GuildId]:
+        return list(self._lru)
+
+    def has_guild(self, guild_id: GuildId) -> bool:
+        return guild_id in self._lru
+
+    def ensure_guild(self, guild_id: GuildId) -> tuple[list[Player], list[Player]]:
+        if guild_id in self._lru:
+            self._lru.move_to_end(guild_id)
+            return [], []
+        loaded = self.read_guild(guild_id)
+        evicted = self.add_guild(guild_id, loaded)
+        self._writer.submit(self.write_guilds, evicted).result()
+        self.saved(evicted)
+        return loaded, [p for players in evicted.values() for p in players]
+
+    async def load_guild(self, guild_id: GuildId) -> tuple[list[Player], list[Player]]:
+        # Reads and writes the guild files in another thread. Only the changes
+        # to the players in memory are made on the event loop.
+        if guild_id in self._lru:
+            self._lru.move_to_end(guild_id)
+            return [], []
+        reading = self._reading.get(guild_id)
+        if reading is None:
+            reading = asyncio.ensure_future(
+                asyncio.to_thread(self.read_guild, guild_id)
+            )
+            self._reading[guild_id] = reading
+        try:
+            loaded = await reading
+        finally:
+            self._reading.pop(guild_id, None)
+        if guild_id in self._lru:
+            # Loaded by someone else while reading
+            self._lru.move_to_end(guild_id)
+            return [], []
+        evicted = self.add_guild(guild_id, loaded)
+        await asyncio.wrap_future(self._writer.submit(self.write_guilds, evicted))
+        self.saved(evicted)
+        return loaded, [p for players in evicted.values() for p in players]
+
+    def read_guild(self, guild_id: GuildId) -> list[Player]:
+        saving = self._saving.get(guild_id)
+        if saving is not None:
+            # Evicted, but not written yet; the file may be outdated
+            return list(saving)
+        try:
+            file = find_newest_file(self.guild_dir(self.path), str(guild_id))
+            return list(format_for_path(file).recover(file))
+        except FileNotFoundError:
+            return []
+
+    def add_guild(
+        self, guild_id: GuildId, loaded: list[Player]
+    ) -> dict[GuildId, list[Player]]:
+        # Adds the players of a guild, and evicts the least recently used
+        # guilds if there are too many players in memory. The evicted players
+        # are kept in _saving until they are written, which the caller does.
+        for player in loaded:
+            super().add_player(player)
+        self._lru[guild_id] = None
+
+        evict: list[GuildId] = []
+        in_memory = len(self.players)
+        for lru_guild_id in self._lru:
+            if self.max_players is None or in_memory <= self.max_players:
+                break
+            if lru_guild_id == guild_id:
+                continue
+            evict.append(lru_guild_id)
+            in_memory -= len(self.guild_players.get(lru_guild_id, ()))
+
+        evicted: dict[GuildId, list[Player]] = {}
+        for evict_guild_id in evict:
+            del self._lru[evict_guild_id]
+            evicted[evict_guild_id] = [
+                self.players.pop(player_id)
+                for player_id in self.guild_players.pop(evict_guild_id, ())
+            ]
+            self._saving[evict_guild_id] = evicted[evict_guild_id]
+        return evicted
+
+    def saved(self, guilds: dict[GuildId, list[Player]]) -> None:
+        for guild_id, players in guilds.items():
+            # Unless it was loaded and evicted again in the meantime
+            if self._saving.get(guild_id) is players:
+                del self._saving[guild_id]
+
+    def add_player(self, player: Player) -> None:
+        if player.guild_id not in self._lru:
+            raise StoreError(f"guild {player.guild_id} is not loaded")
+        super().add_player(player)
+
+    def loaded_players(self, guild_ids: list[GuildId]) -> dict[GuildId, list[Player]]:
+        # Copies, so they can be written while the game goes on
+        return {
+            guild_id: [
+                copy_player(self.players[player_id])
+                for player_id in self.guild_players.get(guild_id, ())
+            ]
+            for guild_id in guild_ids
+        }
+
+    def write_guilds(self, guilds: dict[GuildId, list[Player]]) -> None:
+        # Only called through _writer, so that writes of the same guild happen
+        # in the order they were submitted
+        def write_guild(item: tuple[GuildId, list[Player]]) -> None:
+            guild_id, players = item
+            if not players:
+                return
+            write_players(self.format, self.guild_file(guild_id), players)
+
+        if len(guilds) <= 1:
+            for item in guilds.items():
+                write_guild(item)
+            return
+        with concurrent.futures.ThreadPoolExecutor(self.save_workers) as pool:
+            # Iterate over the results to raise errors
+            for _ in pool.map(write_guild, guilds.items()):
+                pass
+
+    def save_guilds(self, guild_ids: list[GuildId]) -> None:
+        guilds = self.loaded_players(guild_ids)
+        self._writer.submit(self.write_guilds, guilds).result()
+
+    def save(self, path: pathlib.Path):
+        self.save_guilds(list(self._lru))
+
+    def save_async(self, path: pathlib.Path) -> "asyncio.Future[None]":
+        guilds = self.loaded_players(list(self._lru))
+        return asyncio.wrap_future(self._writer.submit(self.write_guilds, guilds))
@@ -0,0 +1,309 @@
+import argparse
+import pathlib
+import shutil
+import sys
+import tempfile
+import time
+from typing import Callable, Iterable, Iterator, Optional
+
+from idlez.store import (
+    FORMATS,
+    GuildId,
+    GuildStore,
+    Player,
+    PlayerId,
+    Store,
+    StoreError,
+    StoreFormat,
+    compressed_format,
+    format_for_path,
+    write_atomic,
+)
+
+# All commands stream players from their input to their output, so they work on
+# stores that do not fit into memory. Only player ids are kept around where
+# duplicates have to be detected.
+
+
+COMPRESSION_LEVELS = range(0, 10)
+
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="idlez store", description="Inspect and convert idleZ player data"
+    )
+    formats = sorted(FORMATS)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    validate = sub.add_parser(
+        "validate", help="Check a player file or data directory for errors"
+    )
+    validate.add_argument("file", type=pathlib.Path)
+    validate.add_argument("--format", choices=formats, help="Format of the file")
+
+    def add_filters(p: argparse.ArgumentParser) -> None:
+        p.add_argument(
+            "--guild",
+            type=int,
+            action="append",
+            help="Only include players of this guild; can be given multiple times",
+        )
+
+    def add_level(p: argparse.ArgumentParser) -> None:
+        p.add_argument(
+            "--level",
+            type=int,
+            choices=COMPRESSION_LEVELS,
+            metavar="{0-9}",
+            help="Compression level of compressed formats",
+        )
+
+    convert = sub.add_parser("convert", help="Convert a player file to another format")
+    convert.add_argument("src", type=pathlib.Path)
+    convert.add_argument("dst", type=pathlib.Path)
+    convert.add_argument("--from", dest="src_format", choices=formats)
+    convert.add_argument("--to", dest="dst_format", choices=formats)
+    add_filters(convert)
+    add_level(convert)
+
+    export = sub.add_parser("export", help="Export the players of a data directory")
+    export.add_argument("data_dir", type=pathlib.Path)
+    export.add_argument("dst", type=pathlib.Path)
+    export.add_argument("--to", dest="dst_format", choices=formats)
+    add_filters(export)
+    add_level(export)
+
+    import_ = sub.add_parser(
+        "import", help="Replace the players of a data directory with a player file"
+    )
+    import_.add_argument("src", type=pathlib.Path)
+    import_.add_argument("data_dir", type=pathlib.Path)
+    import_.add_argument("--from", dest="src_format", choices=formats)
+    add_filters(import_)
+
+    merge = sub.add_parser(
+        "merge",
+        help="Merge player files; a player is taken from the first file containing them",
+    )
+    merge.add_argument("dst", type=pathlib.Path)
+    merge.add_argument("srcs", type=pathlib.Path, nargs="+")
+    merge.add_argument("--to", dest="dst_format", choices=formats)
+    add_filters(merge)
+    add_level(merge)
+
+    bench = sub.add_parser(
+        "bench", help="Compare size and speed of all formats on a player file"
+    )
+    bench.add_argument("file", type=pathlib.Path)
+    bench.add_argument("--from", dest="src_format", choices=formats)
+    add_level(bench)
+
+    return parser.parse_args(argv)
+
+
+def resolve_format(path: pathlib.Path, name: Optional[str]) -> StoreFormat:
+    if name:
+        return FORMATS[name]
+    return format_for_path(path)
+
+
+def output_format(
+    path: pathlib.Path, name: Optional[str], level: Optional[int]
+) -> StoreFormat:
+    fmt = resolve_format(path, name)
+    if level is not None and fmt.codec is not None:
+        return compressed_format(fmt.codec, level)
+    return fmt
+
+
+def filter_guilds(
+    players: Iterable[Player], guilds: Optional[list[GuildId]]
+) -> Iterator[Player]:
+    if not guilds:
+        yield from players
+        return
+    wanted = set(guilds)
+    for p in players:
+        if p.guild_id in wanted:
+            yield p
+
+
+def unique_players(players: Iterable[Player]) -> Iterator[Player]:
+    seen: set[PlayerId] = set()
+    for p in players:
+        if p.id in seen:
+            continue
+        seen.add(p.id)
+        yield p
+
+
+def read_data_dir(data_dir: pathlib.Path) -> Iterator[Player]:
+    # The players of a bot's data directory, whether they are kept in a single
+    # file or in a file per guild
+    if GuildStore.guild_dir(data_dir).exists():
+        for file in GuildStore.guild_files(data_dir):
+            yield from format_for_path(file).read(file)
+        return
+    file = Store.find_player_file(data_dir)
+    yield from format_for_path(file).read(file)
+
+
+def validate(path: pathlib.Path, players: Iterable[Player]) -> int:
+    seen: set[PlayerId] = set()
+    guilds: set[GuildId] = set()
+    errors = 0
+    count = 0
+    try:
+        for count, p in enumerate(players, start=1):
+            problem = None
+            if p.id in seen:
+                problem = "duplicate player"
+            elif p.level < 0:
+                problem = f"negative level {p.level}"
+            elif not p.name:
+                problem = "empty name"
+            if problem:
+                errors += 1
+                print(f"{path}: player {p.id}: {problem}", file=sys.stderr)
+            seen.add(p.id)
+            guilds.add(p.guild_id)
+    except StoreError as e:
+        # The rest of the file cannot be read
+        errors += 1
+        print(e, file=sys.stderr)
+
+    print(f"{path}: {count} players in {len(guilds)} guilds, {errors} errors")
+    return 1 if errors else 0
+
+
+def convert(
+    players: Iterable[Player],
+    dst: pathlib.Path,
+    dst_format: StoreFormat,
+    guilds: Optional[list[GuildId]],
+) -> int:
+    count = write_atomic(dst_format, dst, filter_guilds(players, guilds))
+    print(f"Wrote {count} players to {dst}")
+    return 0
+
+
+def merge(
+    srcs: list[pathlib.Path],
+    dst: pathlib.Path,
+    dst_format: StoreFormat,
+    guilds: Optional[list[GuildId]],
+) -> int:
+    def players() -> Iterator[Player]:
+        for src in srcs:
+            yield from filter_guilds(format_for_path(src).read(src), guilds)
+
+    count = write_atomic(dst_format, dst, unique_players(players()))
+    print(f"Wrote {count} players to {dst}")
+    return 0
+
+
+def bench(path: pathlib.Path, src_format: StoreFormat, level: Optional[int]) -> int:
+    # Unlike the other commands, this keeps all players in memory
+    players = list(src_format.read(path))
+    print(f"{path}: {len(players)} players")
+    print(f"{'format':<12} {'bytes':>12} {'ratio':>7} {'write/s':>10} {'read/s':>10}")
+    jsonl_size = None
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in FORMATS.values():
+            if level is not None and fmt.codec is not None:
+                fmt = compressed_format(fmt.codec, level)
+            file = pathlib.Path(tmp, "players" + fmt.suffix)
+            start = time.perf_counter()
+            fmt.write(file, players)
+            write_secs = time.perf_counter() - start
+            start = time.perf_counter()
+            for _ in fmt.read(file):
+                pass
+            read_secs = time.perf_counter() - start
+
+            size = file.stat().st_size
+            if jsonl_size is None:
+                jsonl_size = size
+            ratio = size / jsonl_size if jsonl_size else 1.0
+            print(
+                f"{fmt.name:<12} {size:>12} {ratio:>7.1%}"
+                f" {len(players) / max(write_secs, 1e-9):>10.0f}"
+                f" {len(players) / max(read_secs, 1e-9):>10.0f}"
+            )
+    return 0
+
+
+def run_validate(args: argparse.Namespace) -> int:
+    if args.file.is_dir():
+        return validate(args.file, read_data_dir(args.file))
+    return validate(args.file, resolve_format(args.file, args.format).read(args.file))
+
+
+def run_convert(args: argparse.Namespace) -> int:
+    return convert(
+        resolve_format(args.src, args.src_format).read(args.src),
+        args.dst,
+        output_format(args.dst, args.dst_format, args.level),
+        args.guild,
+    )
+
+
+def run_export(args: argparse.Namespace) -> int:
+    return convert(
+        read_data_dir(args.data_dir),
+        args.dst,
+        output_format(args.dst, args.dst_format, args.level),
+        args.guild,
+    )
+
+
+def run_import(args: argparse.Namespace) -> int:
+    args.data_dir.mkdir(parents=True, exist_ok=True)
+    dst = Store.player_file(args.data_dir)
+    status = convert(
+        resolve_format(args.src, args.src_format).read(args.src),
+        dst,
+        format_for_path(dst),
+        args.guild,
+    )
+    guild_dir = GuildStore.guild_dir(args.data_dir)
+    if guild_dir.exists():
+        # Otherwise the guild files would win over the imported players; they
+        # are split up again when the bot starts with --per-guild-store
+        replaced = guild_dir.with_name(guild_dir.name + ".replaced")
+        shutil.rmtree(replaced, ignore_errors=True)
+        guild_dir.rename(replaced)
+        print(f"Moved the guild files to {replaced}")
+    return status
+
+
+def run_merge(args: argparse.Namespace) -> int:
+    return merge(
+        args.srcs,
+        args.dst,
+        output_format(args.dst, args.dst_format, args.level),
+        args.guild,
+    )
+
+
+def run_bench(args: argparse.Namespace) -> int:
+    return bench(args.file, resolve_format(args.file, args.src_format), args.level)
+
+
+COMMANDS: dict[str, Callable[[argparse.Namespace], int]] = {
+    "validate": run_validate,
+    "convert": run_convert,
+    "export": run_export,
+    "import": run_import,
+    "merge": run_merge,
+    "bench": run_bench,
+}
+
+
+def main(argv: list[str]) -> int:
+    args = parse_args(argv)
+    try:
+        return COMMANDS[args.command](args)
+    except (OSError, StoreError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
@@ -0,0 +1,116 @@
+import dataclasses
+from typing import Generic, TypeVar
+
+_T = TypeVar("_T")
+
+# Slots per level of the wheel; must be a power of two
+WHEEL_BITS = 6
+WHEEL_SIZE = 1 << WHEEL_BITS
+WHEEL_LEVELS = 4
+
+
+@dataclasses.dataclass(slots=True)
+class Timer(Generic[_T]):
+    at: int
+    item: _T
+    cancelled: bool = False
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+
+@dataclasses.dataclass
+class TimingWheel(Generic[_T]):
+    # Hierarchical timing wheel with a resolution of one second. Level l has
+    # WHEEL_SIZE slots of WHEEL_SIZE**l seconds each, so scheduling is O(1) and
+    # a timer is only touched again when it moves down a level or expires.
+    # Timers further away than the wheel spans wait in the top level and are
+    # placed again whenever it turns.
+    now: int = 0
+
+    _levels: list[list[list[Timer[_T]]]] = dataclasses.field(init=False)
+    # Number of timers per level, to skip over turns of empty levels
+    _counts: list[int] = dataclasses.field(init=False)
+
+    def __post_init__(self):
+        self._levels = [[[] for _ in range(WHEEL_SIZE)] for _ in range(WHEEL_LEVELS)]
+        self._counts = [0] * WHEEL_LEVELS
+
+    def __len__(self) -> int:
+        # Number of scheduled timers, including cancelled ones not yet expired
+        return sum(self._counts)
+
+    def schedule(self, delay: int, item: _T) -> Timer[_T]:
+        # Schedules item to expire in delay seconds; at least one second
+        timer = Timer(at=self.now + max(1, delay), item=item)
+        self._place(timer)
+        return timer
+
+    def _place(self, timer: Timer[_T]) -> None:
+        delta = timer.at - self.now
+        level = 0
+        while level < WHEEL_LEVELS - 1 and delta >= WHEEL_SIZE ** (level + 1):
+            level += 1
+        at = min(timer.at, self.now + WHEEL_SIZE**WHEEL_LEVELS - 1)
+        slot = (at >> (WHEEL_BITS * level)) & (WHEEL_SIZE - 1)
+        self._levels[level][slot].append(timer)
+        self._counts[level] += 1
+
+    def advance(self, seconds: int) -> list[Timer[_T]]:
+        # Moves the wheel forward and returns all timers expiring on the way,
+        # in order of expiry
+        expired: list[Timer[_T]] = []
+        end = self.now + seconds
+        while self.now < end:
+            self._skip_empty(end)
+            if self.now >= end:
+                break
+            self.now += 1
+            self._cascade()
+            slot = self._levels[0][self.now & (WHEEL_SIZE - 1)]
+            if not slot:
+                continue
+            timers = slot[:]
+            slot.clear()
+            self._counts[0] -= len(timers)
+            for timer in timers:
+                if timer.at > self.now:
+                    # Further away than the top level spans
+                    self._place(timer)
+                elif not timer.cancelled:
+                    expired.append(timer)
+        return expired
+
+    def _skip_empty(self, end: int) -> None:
+        # Jumps to just before the next turn of the lowest non-empty level, as
+        # nothing can expire before its timers cascade down
+        level = 0
+        while level < WHEEL_LEVELS and not self._counts[level]:
+            level += 1
+        if level == 0:
+            return
+        if level == WHEEL_LEVELS:
+            self.now = end
+            return
+        span = 1 << (WHEEL_BITS * level)
+        turn = (self.now // span + 1) * span
+        self.now = max(self.now, min(end, turn - 1))
+
+    def _cascade(self) -> None:
+        # Whenever a level completes a turn, the timers of the next slot of the
+        # level above are spread over the levels below. Higher levels go first,
+        # as their timers may end up in the slot of a lower level.
+        top = 0
+        while top < WHEEL_LEVELS - 1 and not (
+            self.now & ((1 << (WHEEL_BITS * (top + 1))) - 1)
+        ):
+            top += 1
+        for level in range(top, 0, -1):
+            slot = self._levels[level][
+                (self.now >> (WHEEL_BITS * level)) & (WHEEL_SIZE - 1)
+            ]
+            timers = slot[:]
+            slot.clear()
+            self._counts[level] -= len(timers)
+            for timer in timers:
+                self._place(timer)
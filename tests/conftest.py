@@ -0,0 +1,39 @@
+import json
+
+import pytest
+
+import idlez.data
+
+
+@pytest.fixture
+def write_content(tmp_path):
+    # Writes minimal valid game content to tmp_path, with a single level up
+    # message
+    def write(level_up_message):
+        event_messages = {
+            t.value: ["Something happened."] for t in idlez.data.EventType
+        }
+        event_messages["level_up"] = [level_up_message]
+        elements = {
+            "loot": [{"a_loot": "a can", "category": "food", "worth": 1.0}],
+            "crate": [],
+            "body_crate": [],
+        }
+        encounters = {
+            "single_gain_random": [
+                {
+                    "effect": "gain_exp_element_sum",
+                    "elements": ["loot"],
+                    "message": "{player_name} finds {a_loot}.",
+                }
+            ],
+            "player_fight": [{"success_message": "won", "fail_message": "lost"}],
+        }
+        for name, content in [
+            ("event_messages.json", event_messages),
+            ("elements.json", elements),
+            ("encounters.json", encounters),
+        ]:
+            (tmp_path / name).write_text(json.dumps(content))
+
+    return write
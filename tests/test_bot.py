@@ -1,4 +1,12 @@
+import asyncio
+import time
+import discord
+from unittest import mock
 import idlez.bot
+from idlez.bot import IdleZBot
+from idlez.data import Data, EventType
+from idlez.game import IdleState, IdleZ
+from idlez.store import Player, Store
 
 
 def test_human_secs():
@@ -10,3 +18,170 @@ def test_human_secs():
     assert idlez.bot.human_secs(2 * 60 * 60) == "2 hours"
     assert idlez.bot.human_secs(2 * 60 * 60 + 2) == "2 hours, 2 seconds"
     assert idlez.bot.human_secs(25 * 60 * 60) == "1 day, 1 hour"
+
+
+def test_status_command():
+    player = Player(id=1, name="player1", experience=1000, level=1, guild_id=10)
+    store = Store({1: player})
+    data = Data(event_messages={}, elements=None, encounters=None)  # type: ignore
+    game = IdleZ(store=store, data=data, event_queue=[], event_handlers=[])
+    bot = IdleZBot(game=game, intents=None, store_path=None, data=data)  # type: ignore
+
+    channel = mock.Mock(send=mock.AsyncMock())
+    message = mock.Mock(author=mock.Mock(id=1), channel=channel, content="!status")
+
+    want = (
+        "player1 is level 1 with 16 minutes, 40 seconds experience"
+        " and ranked #1 in this group. Next level in 2 minutes, 1 second."
+    )
+    asyncio.run(bot.on_idlez_message(message))
+    channel.send.assert_awaited_once_with(want)
+    assert bot.status_cache[1][3] == want
+
+    # A second status request right away is ignored
+    asyncio.run(bot.on_idlez_message(message))
+    channel.send.assert_awaited_once()
+
+    # Status is rendered again once the player changed
+    game.player_idle_state_callback = lambda _p, _g: IdleState.ONLINE
+    game.gain_experience(1, 21)
+    assert bot.player_status(player).endswith("Next level in 1 minute, 40 seconds.")
+    assert bot.status_cache[1][2] == 1021
+
+    # Cooldowns and cached statuses expire
+    bot.prune_status(time.monotonic() + bot.status_cache_ttl)
+    assert not bot.status_requested and not bot.status_cache
+
+
+def test_low_memory_presences():
+    player = Player(id=1, name="player1", experience=0, level=1, guild_id=10)
+    store = Store({1: player})
+    data = Data(event_messages={}, elements=None, encounters=None)  # type: ignore
+    game = IdleZ(store=store, data=data, event_queue=[], event_handlers=[])
+    bot = IdleZBot(
+        game=game,
+        intents=idlez.bot.make_intents(low_memory=True),
+        store_path=None,  # type: ignore
+        data=data,
+        low_memory=True,
+    )
+    assert bot.get_player_idle_state(1, 10) == IdleState.OFFLINE
+
+    def presence(user_id, guild_id, status):
+        return mock.Mock(
+            user_id=user_id, guild_id=guild_id, client_status=mock.Mock(status=status)
+        )
+
+    asyncio.run(bot.on_raw_presence_update(presence(1, 10, discord.Status.dnd)))
+    assert bot.get_player_idle_state(1, 10) == IdleState.AWAY
+    asyncio.run(bot.on_raw_presence_update(presence(1, 10, discord.Status.online)))
+    assert bot.get_player_idle_state(1, 10) == IdleState.ONLINE
+
+    # Unregistered users are not tracked
+    asyncio.run(bot.on_raw_presence_update(presence(2, 10, discord.Status.online)))
+    assert bot.presences == {(10, 1): discord.Status.online}
+
+    asyncio.run(bot.on_raw_presence_update(presence(1, 10, discord.Status.offline)))
+    assert bot.get_player_idle_state(1, 10) == IdleState.OFFLINE
+    assert bot.presences == {}
+
+    # Without low memory mode, presences are only counted for the game
+    bot.low_memory = False
+    bot.set_presence(10, 1, discord.Status.online)
+    assert bot.presences == {}
+    assert game.guild_stats(10).online == 1
+
+
+def test_name_list():
+    assert idlez.bot.name_list([]) == ""
+    assert idlez.bot.name_list(["a"]) == "a"
+    assert idlez.bot.name_list(["a", "b", "c"]) == "a, b and c"
+    assert idlez.bot.name_list(list("abcdefg"), limit=3) == "a, b and 5 others"
+
+
+def test_reload_content(tmp_path, write_content):
+    write_content("old")
+    data = Data.from_dir(tmp_path)
+    game = IdleZ(store=Store({}), data=data, event_queue=[], event_handlers=[])
+    bot = IdleZBot(
+        game=game, intents=None, store_path=None, data=data, content_dir=tmp_path  # type: ignore
+    )
+    version = idlez.bot.content_version(tmp_path)
+
+    write_content("{broken")
+    assert not asyncio.run(bot.reload_content())
+    assert game.data is data
+
+    write_content("new")
+    assert idlez.bot.content_version(tmp_path) != version
+    assert asyncio.run(bot.reload_content())
+    assert bot.data is game.data is not data
+    assert game.data_picker.random is game.random
+    assert bot.data_picker.fill_event_message(EventType.LEVEL_UP, {}) == "new"
+
+
+def test_channel_index():
+    store = Store({})
+    data = Data(event_messages={}, elements=None, encounters=None)  # type: ignore
+    game = IdleZ(store=store, data=data, event_queue=[], event_handlers=[])
+    bot = IdleZBot(game=game, intents=None, store_path=None, data=data)  # type: ignore
+    bot.on_idlez_message = mock.AsyncMock()  # type: ignore
+
+    general = mock.Mock(id=100)
+    general.name = "general"
+    guild = mock.Mock(id=10, text_channels=[general], threads=[])
+    general.guild = guild
+    bot.index_guild(guild)
+    assert not bot.channel_ids
+
+    def message(channel):
+        author = mock.Mock(id=1, bot=False, system=False)
+        return mock.Mock(
+            type=discord.MessageType.default,
+            author=author,
+            guild=guild,
+            channel=channel,
+        )
+
+    # The channel is picked up once it is renamed to idlez
+    renamed = mock.Mock(id=100, guild=guild)
+    renamed.name = "idlez"
+    guild.text_channels = [renamed]
+    asyncio.run(bot.on_guild_channel_update(general, renamed))
+    assert bot.channel[10] is renamed
+
+    thread = mock.Mock(id=200, parent_id=100, guild=guild)
+    asyncio.run(bot.on_thread_create(thread))
+    other_thread = mock.Mock(id=300, parent_id=101, guild=guild)
+    asyncio.run(bot.on_thread_create(other_thread))
+    assert bot.channel_ids == {100, 200}
+
+    asyncio.run(bot.on_message(message(general)))
+    asyncio.run(bot.on_message(message(thread)))
+    asyncio.run(bot.on_message(message(other_thread)))
+    assert bot.on_idlez_message.await_count == 2
+
+    asyncio.run(
+        bot.on_raw_thread_delete(mock.Mock(thread_id=200, guild_id=10))  # type: ignore
+    )
+    assert bot.channel_ids == {100}
+
+    # Threads are dropped while archived and come back when unarchived
+    def thread_update(thread_id, archived):
+        payload = mock.Mock(
+            thread_id=thread_id,
+            guild_id=10,
+            parent_id=100,
+            data={"thread_metadata": {"archived": archived}},
+        )
+        asyncio.run(bot.on_raw_thread_update(payload))  # type: ignore
+
+    thread_update(400, archived=False)
+    assert bot.channel_ids == {100, 400}
+    thread_update(400, archived=True)
+    assert bot.channel_ids == {100}
+    asyncio.run(bot.on_thread_join(mock.Mock(id=500, parent_id=100, guild=guild)))
+    assert bot.channel_ids == {100, 500}
+
+    asyncio.run(bot.on_guild_remove(guild))
+    assert not bot.channel_ids and 10 not in bot.channel
@@ -1,3 +1,5 @@
+import pytest
+
 import idlez.data
 
 
@@ -32,3 +34,23 @@ def test_data_picker_fill_event_message():
     )
 
     assert got == "Player_name Text 24. time: SOME TIME"
+
+
+def test_data_from_dir(tmp_path, write_content):
+    write_content("{player_name|upper} reached {new_level}")
+    data = idlez.data.Data.from_dir(tmp_path)
+    picker = idlez.data.DataPicker(data=data).precompile()
+    assert "{player_name|upper} reached {new_level}" in picker.templates
+
+    got = picker.fill_event_message(
+        idlez.data.EventType.LEVEL_UP, {"player_name": "bob", "new_level": 2}
+    )
+    assert got == "BOB reached 2"
+
+    write_content("{player_name reached")
+    with pytest.raises(idlez.data.InvalidData):
+        idlez.data.Data.from_dir(tmp_path)
+
+    (tmp_path / "elements.json").write_text("{}")
+    with pytest.raises(idlez.data.InvalidData):
+        idlez.data.Data.from_dir(tmp_path)
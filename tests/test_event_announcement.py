@@ -8,7 +8,7 @@ import idlez.events.components as components
 from idlez.bot import IdleZBot
 from idlez.data import Data
 from idlez.game import IdleZ
-from idlez.store import Player
+from idlez.store import Player, Store
 
 GUILD_ID = 10
 PLAYER_1 = Player(id=1, name="player1", experience=1000, level=2, guild_id=GUILD_ID)
@@ -90,7 +90,7 @@ def test_noise(test_case: NoiseTestCase):
         ],
     }
     data = Data(event_messages=event_messages, elements=None, encounters=None)  # type: ignore
-    game = IdleZ(store=None, data=data, event_queue=[], event_handlers=[])  # type: ignore
+    game = IdleZ(store=Store({}), data=data, event_queue=[], event_handlers=[])  # type: ignore
 
     channel = mock.Mock(send=mock.AsyncMock(spec=discord.TextChannel.send))  # type: ignore
     bot = IdleZBot(game=game, intents=None, store_path=None, data=data)  # type: ignore
@@ -0,0 +1,79 @@
+import pytest
+import idlez.events as events
+import idlez.events.components as components
+from idlez.store import Player
+
+PLAYER_1 = Player(id=1, name="player1", experience=1000, level=2, guild_id=10)
+PLAYER_2 = Player(id=2, name="player2", experience=1000, level=2, guild_id=10)
+
+
+def test_component_order_does_not_matter():
+    a = events.PlayerFightEvent(
+        components.Player(PLAYER_1),
+        components.OtherPlayer(PLAYER_2),
+        components.FightResult(player_wins=True),
+        components.ExpDiff({1: 10}),
+    )
+    b = events.PlayerFightEvent(
+        components.ExpDiff({1: 10}),
+        components.FightResult(player_wins=True),
+        components.OtherPlayer(PLAYER_2),
+        components.Player(PLAYER_1),
+    )
+
+    assert a == b
+    assert a.component(components.OtherPlayer).player == PLAYER_2
+    assert a.safe_component(components.EventMessage) is None
+    assert not a.has_component(components.EventMessage)
+    with pytest.raises(components.NoSuchComponentError):
+        a.component(components.EventMessage)
+
+
+def test_needs_components_validated():
+    with pytest.raises(components.NoSuchComponentError):
+        events.PlayerNoiseEvent(components.Player(PLAYER_1))
+
+    with pytest.raises(components.NoSuchComponentError):
+        events.LevelUpEvent(
+            components.Player(PLAYER_1), components.FightResult(player_wins=True)
+        )
+
+
+def test_handler_registry():
+    registry = events.HandlerRegistry()
+    got: list[events.Event] = []
+    registry.register(events.LevelUpEvent, got.append)
+
+    level_up = events.LevelUpEvent(components.Player(PLAYER_1))
+    noise = events.PlayerNoiseEvent(
+        components.Player(PLAYER_1),
+        components.ExpProgress({components.ALL_PLAYERS: -0.1}),
+    )
+
+    assert registry.handler(level_up) is not None
+    assert registry.handler(noise) is None
+    registry.handler(level_up)(level_up)  # type: ignore
+    assert got == [level_up]
+
+
+def test_aggregator_folds_bursts_per_guild():
+    other_guild = Player(id=3, name="player3", experience=1000, level=2, guild_id=20)
+    noise = events.PlayerNoiseEvent(
+        components.Player(PLAYER_1), components.ExpProgress({1: -0.1})
+    )
+    level_ups = [
+        events.LevelUpEvent(components.Player(p))
+        for p in [PLAYER_1, PLAYER_2, PLAYER_1, PLAYER_2]
+    ]
+    other = events.LevelUpEvent(components.Player(other_guild))
+    aggregator = events.default_aggregator()
+
+    got = aggregator.aggregate([noise, level_ups[0], other] + level_ups[1:])
+    assert got == [
+        noise,
+        events.LevelUpSummaryEvent(components.Players([PLAYER_1, PLAYER_2])),
+        other,
+    ]
+
+    # Up to the threshold, events are kept as they are
+    assert aggregator.aggregate(level_ups[:3]) == level_ups[:3]
@@ -0,0 +1,50 @@
+import pathlib
+import re
+import subprocess
+import sys
+
+ROOT = pathlib.Path(__file__).parent.parent
+
+# Run in a fresh interpreter, as the test session has already imported discord
+ENGINE_IMPORT = """
+import sys
+import idlez.game, idlez.store, idlez.data, idlez.storetool
+print(sorted(m for m in ("discord", "aiohttp", "idlez.bot") if m in sys.modules))
+"""
+
+# Importing the engine must stay well below this, and below half of what
+# importing the bot takes, which is mostly discord.py
+IMPORT_BUDGET_SECONDS = 1.0
+
+
+def import_seconds(module: str) -> float:
+    # Cumulative import time of the module as reported by -X importtime
+    err = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=ROOT,
+    ).stderr
+    m = re.search(rf"^import time:\s+\d+ \|\s+(\d+) \| {re.escape(module)}$", err, re.M)
+    assert m, err
+    return int(m.group(1)) / 1e6
+
+
+def test_engine_does_not_import_discord():
+    out = subprocess.run(
+        [sys.executable, "-c", ENGINE_IMPORT],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=ROOT,
+    ).stdout
+    assert out.strip() == "[]"
+
+
+def test_engine_import_time():
+    # The fastest of a few runs, to not fail on a busy machine
+    engine = min(import_seconds("idlez.game") for _ in range(3))
+    bot = min(import_seconds("idlez.bot") for _ in range(3))
+    assert engine < IMPORT_BUDGET_SECONDS
+    assert engine < bot / 2
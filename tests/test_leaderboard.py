@@ -0,0 +1,90 @@
+import random
+from unittest import mock
+from idlez.game import IdleZ
+from idlez.leaderboard import Leaderboard, SortedKeys
+from idlez.store import Player, Store
+
+
+def make_player(id: int, exp: int, lvl: int, guild_id: int):
+    return Player(
+        id=id, name=f"player{id}", experience=exp, level=lvl, guild_id=guild_id
+    )
+
+
+def test_sorted_keys_matches_sorted_list():
+    rnd = random.Random(42)
+    with mock.patch.object(SortedKeys, "LOAD", 4):
+        keys = SortedKeys()
+        want: list[tuple[int, int, int]] = []
+        for i in range(500):
+            if want and rnd.random() < 0.3:
+                key = want.pop(rnd.randrange(len(want)))
+                keys.remove(key)
+            else:
+                key = (rnd.randint(-5, 0), rnd.randint(-100, 0), i)
+                want.append(key)
+                keys.add(key)
+            want.sort()
+
+            assert len(keys) == len(want)
+            assert list(keys) == want
+            probe = (rnd.randint(-5, 0), rnd.randint(-100, 0), -1)
+            assert keys.index(probe) == sum(1 for k in want if k < probe)
+
+
+def test_leaderboard_follows_changes():
+    store = Store(
+        {
+            1: make_player(1, 100, 1, guild_id=10),
+            2: make_player(2, 200, 1, guild_id=10),
+            3: make_player(3, 50, 2, guild_id=20),
+        }
+    )
+    game = IdleZ(store=store, data=None, event_queue=[], event_handlers=[])  # type: ignore
+    leaderboard: Leaderboard = game.leaderboard
+
+    assert [p.id for p in leaderboard.top(10)] == [3, 2, 1]
+    assert [p.id for p in leaderboard.top(10, guild_id=10)] == [2, 1]
+    assert leaderboard.rank(1) == 3
+    assert leaderboard.guild_rank(1) == 2
+    assert leaderboard.guild_rank(3) == 1
+
+    game.gain_experience(1, 150)
+    assert leaderboard.rank(1) == 2
+    assert leaderboard.guild_rank(1) == 1
+
+    game.new_player(make_player(4, 0, 5, guild_id=20))
+    assert [p.id for p in leaderboard.top(2)] == [4, 3]
+    assert leaderboard.guild_rank(3) == 2
+    assert leaderboard.rank(5) is None
+
+
+def test_leaderboard_refresh_steps():
+    store = Store({i: make_player(i, i, 0, guild_id=i % 2) for i in range(100)})
+    leaderboard = Leaderboard(store)
+    leaderboard.refresh()
+
+    # Few changes are sorted in one by one
+    for i in range(5):
+        store.players[i].level = 1
+        leaderboard.touch(i)
+    assert not leaderboard.needs_rebuild()
+    assert len(list(leaderboard.refresh_steps())) == 5
+
+    # Many changes rebuild the leaderboard, which a query may see half way
+    for i in range(50):
+        store.players[i].level = 2
+        leaderboard.touch(i)
+    assert leaderboard.needs_rebuild()
+    steps = leaderboard.refresh_steps()
+    for _ in range(10):
+        next(steps)
+    # Player 0 changes after the rebuild has already ranked them
+    store.players[0].level = 3
+    leaderboard.touch(0)
+    assert leaderboard.rank(0) == 1
+    for _ in steps:
+        pass
+    assert leaderboard.rank(0) == 1
+    assert [p.id for p in leaderboard.top(3)] == [0, 49, 48]
+    assert leaderboard.guild_rank(48) == 2
@@ -0,0 +1,52 @@
+import asyncio
+import collections
+
+from idlez.data import Data
+import idlez.events as events
+import idlez.events.components as components
+from idlez.loadtest import LoadTestConfig, run_load_test
+
+
+def test_load_test(tmp_path, write_content):
+    write_content("{player_name} reached {new_level}")
+    config = LoadTestConfig(
+        guilds=2, players_per_guild=10, messages=500, messages_per_tick=100
+    )
+    result = asyncio.run(run_load_test(Data.from_dir(tmp_path), config))
+
+    assert len(result.message_latencies) == 500
+    assert len(result.tick_latencies) == 6
+    # Joins are announced once per guild and tick
+    joins: collections.Counter[tuple[int, int]] = collections.Counter()
+    joined = 0
+    for tick, evt in result.handled_events:
+        if isinstance(evt, events.NewPlayersEvent):
+            players = evt.component(components.Players).players
+        elif isinstance(evt, events.NewPlayerEvent):
+            players = [evt.component(components.Player).player]
+        else:
+            continue
+        assert len({p.guild_id for p in players}) == 1
+        joins[(tick, players[0].guild_id)] += 1
+        joined += len(players)
+    assert joins == {(0, 1): 1, (0, 2): 1, (1, 2): 1}
+    assert joined == 20
+    assert result.sends == 15
+    assert "500 messages" in result.report()
+
+
+def test_load_test_ignores_other_channels(tmp_path, write_content):
+    write_content("{player_name} reached {new_level}")
+    config = LoadTestConfig(
+        guilds=2,
+        players_per_guild=10,
+        messages=200,
+        messages_per_tick=100,
+        command_rate=0.0,
+        other_channel_rate=1.0,
+    )
+    result = asyncio.run(run_load_test(Data.from_dir(tmp_path), config))
+
+    assert len(result.message_latencies) == 200
+    # Nobody posted in #idlez, so nobody joined
+    assert result.sends == 0
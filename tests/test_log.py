@@ -0,0 +1,35 @@
+import json
+import logging
+import random
+from idlez.log import JsonFormatter, SamplingFilter
+
+
+def test_json_formatter():
+    record = logging.makeLogRecord(
+        {
+            "name": "idlez.bot",
+            "levelno": logging.INFO,
+            "levelname": "INFO",
+            "msg": "New player: %s",
+            "args": ("player1",),
+            "player_id": 1,
+        }
+    )
+
+    got = json.loads(JsonFormatter().format(record))
+
+    assert got["level"] == "INFO"
+    assert got["logger"] == "idlez.bot"
+    assert got["message"] == "New player: player1"
+    assert got["player_id"] == 1
+    assert "args" not in got
+
+
+def test_sampling_filter():
+    record = logging.makeLogRecord({})
+    sampling = SamplingFilter(0.1, random.Random(1))
+
+    passed = sum(sampling.filter(record) for _ in range(10000))
+
+    assert 800 < passed < 1200
+    assert SamplingFilter(1.0).filter(record)
@@ -14,7 +14,7 @@ from idlez.data import (
     SingleGainRandomEncounter,
     EffectType,
 )
-from idlez.game import IdleZ
+from idlez.game import IdleZ, PlayerNotFound
 from idlez.store import Experience, Level, Store, Player
 
 GUILD_ID = 10
@@ -172,3 +172,91 @@ def test_player_fight_event(
     game.two_player_event()
 
     assert game.event_queue == [want_evt]
+
+
+def test_queued_noise_resolves_in_one_sweep():
+    fake_random = mock.Mock(
+        spec=_random.Random,
+        # Two messages from player 1, one from player 2
+        randint=mock.Mock(side_effect=[10, 10, 10]),
+        # Second and third message are loud, with 50% and 20% progress loss
+        random=mock.Mock(side_effect=[0.5, 0.01, 0.5, 0.01, 0.2]),
+    )
+    store = Store({1: make_player(1, 1200, 2), 2: make_player(2, 1200, 2)})
+    game = IdleZ(
+        store=store, data=None, event_queue=[], event_handlers=[], random=fake_random  # type: ignore
+    )
+
+    game.queue_noise(1)
+    game.queue_noise(1)
+    game.queue_noise(2)
+    assert game.event_queue == []
+    assert store.players[1].experience == 1200
+
+    game.resolve_noise()
+
+    progress_percent = 1 - (1 - 0.5) * (1 - 0.2)
+    p1_progress = 1200 - 20 - EXP_FOR_LVL_2
+    p2_progress = 1200 - 10 - EXP_FOR_LVL_2
+    assert store.players[1].experience == 1200 - 20 - int(
+        progress_percent * p1_progress
+    )
+    assert store.players[2].experience == 1200 - 10 - int(
+        progress_percent * p2_progress
+    )
+    assert game.event_queue == [
+        events.PlayerNoiseEvent(
+            components.Player(store.players[2]),
+            components.ExpProgress({components.ALL_PLAYERS: -progress_percent}),
+        )
+    ]
+
+    # Noise is only resolved once
+    game.resolve_noise()
+    assert len(game.event_queue) == 1
+
+
+def test_queue_noise_unknown_player():
+    game = IdleZ(store=Store({}), data=None, event_queue=[], event_handlers=[])  # type: ignore
+
+    with pytest.raises(PlayerNotFound):
+        game.queue_noise(1)
+
+
+def test_joins_resolve_in_one_sweep():
+    fake_random = mock.Mock(
+        spec=_random.Random,
+        # Penalties of 0.2, 0.4 and 0.1
+        random=mock.Mock(side_effect=[0.4, 0.8, 0.2]),
+    )
+    store = Store({1: make_player(1, 1200, 2)})
+    game = IdleZ(
+        store=store, data=None, event_queue=[], event_handlers=[], random=fake_random  # type: ignore
+    )
+    other_guild = Player(id=4, name="player4", experience=0, level=0, guild_id=20)
+
+    game.queue_new_player(make_player(2, 0, 0))
+    game.queue_new_player(make_player(3, 0, 0))
+    game.queue_new_player(make_player(2, 0, 0))
+    game.queue_new_player(other_guild)
+    # Joining players do not make noise
+    game.queue_noise(2)
+    assert 2 not in store.players
+    with pytest.raises(PlayerNotFound):
+        game.queue_noise(5)
+
+    game.resolve_joins()
+
+    progress_percent = 1 - (1 - 0.2) * (1 - 0.4) * (1 - 0.1)
+    exp_progress = components.ExpProgress({components.ALL_PLAYERS: -progress_percent})
+    assert game.event_queue == [
+        events.NewPlayersEvent(
+            components.Players([make_player(2, 0, 0), make_player(3, 0, 0)]),
+            exp_progress,
+        ),
+        events.NewPlayerEvent(components.Player(other_guild), exp_progress),
+    ]
+    assert sorted(store.players) == [1, 2, 3, 4]
+    assert store.players[1].experience == 1200 - int(
+        progress_percent * (1200 - EXP_FOR_LVL_2)
+    )
@@ -0,0 +1,67 @@
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from idlez.query import QueryServer, store_records
+from idlez.store import Player, Store
+
+
+@pytest.fixture
+def server():
+    server = QueryServer(("127.0.0.1", 0))
+    server.serve_in_thread()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def get(server: QueryServer, path: str):
+    port = server.server_address[1]
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}") as response:
+        return json.load(response)
+
+
+def test_query_server(server):
+    store = Store(
+        {
+            1: Player(id=1, name="p1", experience=100, level=1, guild_id=10),
+            2: Player(id=2, name="p2", experience=5000, level=3, guild_id=10),
+            3: Player(id=3, name="p3", experience=2000, level=2, guild_id=20),
+        }
+    )
+    assert get(server, "/")["players"] == 0
+
+    server.publish(store_records(store))
+    # Changes to the store are not visible until the next snapshot
+    store.players[1].level = 10
+
+    assert get(server, "/players/1") == {
+        "id": 1,
+        "name": "p1",
+        "experience": 100,
+        "level": 1,
+        "guild_id": 10,
+        "rank": 3,
+        "guild_rank": 2,
+    }
+    assert [p["id"] for p in get(server, "/top")] == [2, 3, 1]
+    assert [p["id"] for p in get(server, "/top?limit=1")] == [2]
+    assert get(server, "/top?limit=-1") == []
+    assert [p["id"] for p in get(server, "/guilds/10/top")] == [2, 1]
+    assert get(server, "/guilds/10") == {
+        "players": 2,
+        "total_experience": 5100,
+        "max_level": 3,
+        "mean_level": 2.0,
+    }
+
+    for path in ["/players/4", "/guilds/30", "/players/x", "/nothing"]:
+        with pytest.raises(urllib.error.HTTPError) as e:
+            get(server, path)
+        assert e.value.code == 404
+
+    with pytest.raises(urllib.error.HTTPError) as e:
+        get(server, "/top?limit=x")
+    assert e.value.code == 400
@@ -0,0 +1,88 @@
+import asyncio
+
+from idlez.replication import ChangeLog, Follower, change_file, lock_primary
+from idlez.store import Player, Store
+
+
+def make_player(id: int, exp: int, guild_id: int = 10) -> Player:
+    return Player(id=id, name=f"p{id}", experience=exp, level=1, guild_id=guild_id)
+
+
+def test_follower_takes_over(tmp_path):
+    store = Store({1: make_player(1, 100)})
+    store.save(tmp_path)
+    primary = ChangeLog(tmp_path, lock_primary(tmp_path))  # type: ignore
+    follower = Follower(tmp_path)
+    assert follower.store == store
+
+    store.players[1].experience = 200
+    store.add_player(make_player(2, 50, guild_id=20))
+    primary.touch(1)
+    primary.touch(2)
+    primary.flush(store)
+    # A line the primary has not finished yet is not applied
+    with open(change_file(tmp_path, primary.generation), "a") as fh:
+        fh.write('{"id": 1, "name"')
+    assert follower.poll() == 2
+    assert follower.store == store
+    assert follower.store.guild_players == {10: {1}, 20: {2}}
+
+    # The primary is still alive
+    assert follower.try_promote() is None
+
+    # Changes of earlier generations are removed after a save
+    old_generation = primary.generation
+    primary.checkpoint(store)
+    primary.checkpoint(store)
+    assert not change_file(tmp_path, old_generation).exists()
+    store.players[2].experience = 60
+    primary.touch(2)
+    primary.flush(store)
+
+    # Fell behind: the follower reloads the saved store
+    follower.poll()
+    assert follower.store == store
+
+    store.players[1].experience = 300
+    primary.touch(1)
+    primary.flush(store)
+    primary.close()
+
+    change_log = follower.try_promote()
+    assert change_log is not None
+    assert follower.store == store
+    assert change_log.generation == primary.generation + 1
+
+    # A restarted primary recovers the changes made after the last save
+    store.players[1].experience = 400
+    change_log.touch(1)
+    change_log.flush(store)
+    change_log.close()
+    restarted = Follower(tmp_path)
+    assert restarted.try_promote() is not None
+    assert restarted.store == store
+
+
+def test_change_log_writes_in_the_background(tmp_path):
+    store = Store({1: make_player(1, 100)})
+    store.save(tmp_path)
+    primary = ChangeLog(tmp_path, lock_primary(tmp_path))  # type: ignore
+    follower = Follower(tmp_path)
+
+    async def run():
+        primary.touch(1)
+        flushed = primary.flush_async(store)
+        # The changes were copied when the flush started
+        store.players[1].experience = 200
+        assert await flushed == 1
+        assert follower.poll() == 1
+        assert follower.store.players[1].experience == 100
+
+        primary.touch(1)
+        saved = primary.checkpoint_async(store)
+        store.players[1].experience = 300
+        await saved
+
+    asyncio.run(run())
+    primary.close()
+    assert Store.load(tmp_path).players[1].experience == 200
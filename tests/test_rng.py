@@ -0,0 +1,45 @@
+import random
+from idlez.game import IdleState, IdleZ
+from idlez.rng import RandomStreams, randints
+from idlez.store import Player, Store
+
+
+def test_randints_range():
+    got = randints(random.Random(1), 3, 5, 1000)
+    assert set(got) == {3, 4, 5}
+
+
+def make_game(seed: int, guilds: list[int]) -> IdleZ:
+    store = Store(
+        {
+            i: Player(id=i, name=f"p{i}", experience=0, level=0, guild_id=guild_id)
+            for i, guild_id in enumerate(guilds)
+        }
+    )
+    game = IdleZ(
+        store=store,
+        data=None,  # type: ignore
+        event_queue=[],
+        event_handlers=[],
+        random_streams=RandomStreams(seed=seed),
+    )
+    game.player_idle_state_callback = lambda _p, _g: IdleState.AWAY
+    return game
+
+
+def test_seeded_streams_are_reproducible_per_guild():
+    a = make_game(seed=7, guilds=[1, 1, 2])
+    b = make_game(seed=7, guilds=[1, 1, 2, 2, 2])
+    c = make_game(seed=8, guilds=[1, 1, 2])
+
+    for game in [a, b, c]:
+        game.all_gain_tick_experience(100)
+        game.all_gain_tick_experience(100)
+
+    def guild_1_exp(game: IdleZ) -> list[int]:
+        return [game.store.players[i].experience for i in (0, 1)]
+
+    # Guild 1 is not affected by the number of players in guild 2
+    assert guild_1_exp(a) == guild_1_exp(b)
+    assert guild_1_exp(a) != guild_1_exp(c)
+    assert all(0 <= exp <= 200 for exp in guild_1_exp(a))
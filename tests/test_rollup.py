@@ -0,0 +1,102 @@
+import asyncio
+import random
+
+from idlez.game import Encounter, IdleState, IdleZ
+from idlez.store import GuildId, GuildStore, Player, Store
+
+
+def make_player(id: int, exp: int, lvl: int, guild_id: int):
+    return Player(
+        id=id, name=f"player{id}", experience=exp, level=lvl, guild_id=guild_id
+    )
+
+
+def scanned_stats(game: IdleZ, guild_id: GuildId) -> tuple[int, int, int]:
+    players = game.guild_players(guild_id)
+    return (
+        len(players),
+        sum(p.level for p in players),
+        sum(p.experience for p in players),
+    )
+
+
+def test_rollups_follow_changes():
+    store = Store(
+        {
+            1: make_player(1, 100, 1, guild_id=10),
+            2: make_player(2, 200, 3, guild_id=10),
+            3: make_player(3, 50, 2, guild_id=20),
+        }
+    )
+    game = IdleZ(store=store, data=None, event_queue=[], event_handlers=[], random=random.Random(3))  # type: ignore
+
+    stats = game.guild_stats(10)
+    assert (stats.players, stats.total_level, stats.total_experience) == (2, 4, 300)
+    assert stats.mean_level == 2.0
+    assert game.guild_stats(30).players == 0
+
+    game.gain_experience(1, 50_000)
+    game.new_player(make_player(4, 0, 0, guild_id=20))
+    game.queue_new_player(make_player(5, 0, 0, guild_id=10))
+    game.resolve_joins()
+    game.all_gain_tick_experience(600)
+    for guild_id in [10, 20]:
+        stats = game.guild_stats(guild_id)
+        assert (
+            stats.players,
+            stats.total_level,
+            stats.total_experience,
+        ) == scanned_stats(game, guild_id)
+
+
+def test_rollups_count_online_players():
+    store = Store(
+        {
+            1: make_player(1, 100, 1, guild_id=10),
+            2: make_player(2, 200, 3, guild_id=10),
+        }
+    )
+    game = IdleZ(store=store, data=None, event_queue=[], event_handlers=[])  # type: ignore
+
+    game.presence_changed(1, IdleState.ONLINE)
+    game.presence_changed(2, IdleState.AWAY)
+    game.presence_changed(2, IdleState.ONLINE)
+    assert game.guild_stats(10).online == 2
+    game.presence_changed(1, IdleState.OFFLINE)
+    assert game.guild_stats(10).online == 1
+
+    # Players may come online before they join
+    game.presence_changed(3, IdleState.ONLINE)
+    game.new_player(make_player(3, 0, 0, guild_id=10))
+    assert game.guild_stats(10).online == 2
+    assert game.guild_stats(10).message_fields()["guild_online"] == 2
+
+
+def test_rollups_of_evicted_guilds(tmp_path):
+    Store({i: make_player(i, 10 * i, i, guild_id=i % 3) for i in range(9)}).save(
+        tmp_path
+    )
+    store = GuildStore.open(tmp_path, max_players=6)
+    game = IdleZ(store=store, data=None, event_queue=[], event_handlers=[], timed_encounters=True)  # type: ignore
+
+    assert not game.guild_stats(1).loaded
+    asyncio.run(game.activate_guild(1))
+    asyncio.run(game.activate_guild(2))
+    assert game.guild_stats(1).players == 3
+    game.presence_changed(4, IdleState.ONLINE)
+
+    # Guild 1 is evicted; its statistics stay, but it gets no encounters
+    asyncio.run(game.activate_guild(0))
+    stats = game.guild_stats(1)
+    assert not stats.loaded
+    assert (stats.players, stats.total_level, stats.online) == (3, 1 + 4 + 7, 1)
+    assert game.schedule_encounter(Encounter.FIGHT, 1, 0) == -1
+    assert game.player_guild(7) == 1
+    game.presence_changed(7, IdleState.AWAY)
+    assert game.guild_stats(1).online == 2
+
+    # Loading it again does not count its players twice
+    asyncio.run(game.activate_guild(1))
+    stats = game.guild_stats(1)
+    assert stats.loaded
+    assert (stats.players, stats.total_level, stats.online) == (3, 1 + 4 + 7, 2)
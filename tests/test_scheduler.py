@@ -0,0 +1,250 @@
+import asyncio
+import datetime
+import time
+from unittest import mock
+import random as _random
+import pytest
+from idlez import game as _game
+from idlez.game import IdleState, IdleZ
+from idlez.scheduler import AdaptiveTickScheduler, StaggeredTicker
+from idlez.store import Player, Store
+
+T0 = datetime.datetime(2023, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def test_elapsed_uses_total_seconds():
+    scheduler = AdaptiveTickScheduler()
+    scheduler.start(T0)
+
+    assert scheduler.elapsed(T0 + datetime.timedelta(days=2, seconds=10.6)) == (
+        2 * 24 * 60 * 60 + 10
+    )
+    # Fractions of seconds are carried over to the next tick
+    assert scheduler.elapsed(T0 + datetime.timedelta(days=2, seconds=20.0)) == 10
+    # Time going backwards does not count
+    assert scheduler.elapsed(T0) == 0
+
+
+def test_interval_adapts_to_tick_cost():
+    scheduler = AdaptiveTickScheduler(min_interval=10, max_interval=60, max_load=0.1)
+
+    assert scheduler.record_tick(cost=0.01, player_count=1000) == 10
+    # 10s per tick would exceed 10% load at a 10s interval
+    assert scheduler.record_tick(cost=10.0, player_count=1000) > 10
+    assert scheduler.record_tick(cost=100.0, player_count=1000) == 60
+
+
+def test_catch_up_tick():
+    fake_random = mock.Mock(
+        spec=_random.Random,
+        # Encounters happen after 1000s, 2000s, ... which is capped
+        expovariate=mock.Mock(return_value=1000.0),
+    )
+    store = Store({1: Player(id=1, name="p1", experience=0, level=0, guild_id=1)})
+    game = IdleZ(
+        store=store, data=None, event_queue=[], event_handlers=[], random=fake_random  # type: ignore
+    )
+
+    with (
+        mock.patch.object(IdleZ, "single_player_event") as single,
+        mock.patch.object(IdleZ, "two_player_event") as two,
+    ):
+        asyncio.run(game.tick(24 * 60 * 60))
+
+    assert single.call_count == _game.MAX_CATCH_UP_ENCOUNTERS
+    assert two.call_count == _game.MAX_CATCH_UP_ENCOUNTERS
+    # A whole day is worth several levels at once
+    assert store.players[1].experience == 24 * 60 * 60
+    assert store.players[1].level > 1
+    assert game.experience_for_level(store.players[1].level + 1) > 24 * 60 * 60
+
+
+def test_time_sliced_tick_matches_tick():
+    from idlez.rng import RandomStreams
+
+    def make_game(budget):
+        players = {
+            i: Player(id=i, name=f"p{i}", experience=i * 10, level=0, guild_id=i % 3)
+            for i in range(1, 2001)
+        }
+        game = IdleZ(
+            store=Store(players),
+            data=None,  # type: ignore
+            event_queue=[],
+            event_handlers=[],
+            random_streams=RandomStreams(seed=1),
+            player_idle_state_callback=lambda p, _g: [
+                IdleState.ONLINE,
+                IdleState.AWAY,
+                IdleState.OFFLINE,
+            ][p % 3],
+            tick_budget=budget,
+        )
+        for i in range(1, 50):
+            game.queue_noise(i)
+        return game
+
+    async def run(game):
+        # Counts how often other tasks got to run during the tick
+        ran = 0
+
+        async def other():
+            nonlocal ran
+            while True:
+                ran += 1
+                await asyncio.sleep(0)
+
+        task = asyncio.create_task(other())
+        await asyncio.sleep(0)
+        ran = 0
+        with mock.patch.object(IdleZ, "single_player_event"):
+            with mock.patch.object(IdleZ, "two_player_event"):
+                await game.tick(600)
+        task.cancel()
+        return ran
+
+    whole = make_game(None)
+    sliced = make_game(0.0)
+    assert asyncio.run(run(whole)) == 0
+    assert asyncio.run(run(sliced)) > 10
+    assert sliced.store == whole.store
+
+
+def test_tick_lock_hides_half_applied_ticks():
+    players = {
+        i: Player(id=i, name=f"p{i}", experience=0, level=0, guild_id=1)
+        for i in range(1, 1001)
+    }
+    game = IdleZ(
+        store=Store(players),
+        data=None,  # type: ignore
+        event_queue=[],
+        event_handlers=[],
+        tick_budget=0.0,
+    )
+    for i in range(1, 50):
+        game.queue_noise(i)
+
+    async def run():
+        seen: list[int] = []
+
+        async def save():
+            # Like saving the store, while the tick is running
+            await asyncio.sleep(0)
+            async with game.tick_lock:
+                seen.append(sum(p.experience for p in game.store.players.values()))
+
+        task = asyncio.create_task(save())
+        with mock.patch.object(IdleZ, "single_player_event"):
+            with mock.patch.object(IdleZ, "two_player_event"):
+                await game.tick(600)
+        await task
+        return seen
+
+    assert asyncio.run(run()) == [
+        sum(p.experience for p in game.store.players.values())
+    ]
+
+
+def test_tick_reports_only_the_sweep():
+    players = {
+        i: Player(id=i, name=f"p{i}", experience=0, level=0, guild_id=1)
+        for i in range(1, 101)
+    }
+    game = IdleZ(
+        store=Store(players),
+        data=None,  # type: ignore
+        event_queue=[],
+        event_handlers=[],
+        tick_budget=0.0,
+    )
+
+    async def slow_sends(_self, _slicer=None):
+        # Like sending messages to discord
+        await asyncio.sleep(0.2)
+
+    async def run():
+        async def other():
+            # Other work that runs while the tick yields
+            while True:
+                time.sleep(0.001)
+                await asyncio.sleep(0)
+
+        task = asyncio.create_task(other())
+        with mock.patch.object(IdleZ, "send_events", slow_sends):
+            with mock.patch.object(IdleZ, "encounter_steps", return_value=iter([])):
+                started = time.perf_counter()
+                swept = await game.tick(600)
+                took = time.perf_counter() - started
+        task.cancel()
+        return swept, took
+
+    swept, took = asyncio.run(run())
+    assert took > 0.2
+    assert swept < 0.05
+
+
+def test_staggered_ticker_spreads_keys():
+    ticker: StaggeredTicker[int] = StaggeredTicker(interval=10.0)
+    for guild_id in range(10):
+        ticker.add(guild_id, 1000.0)
+    ticker.add(0, 1000.0)
+    assert len(ticker) == 10
+
+    ticks: list[tuple[float, int, int]] = []
+    now = 1000.0
+    while now < 1030.0:
+        now = ticker.next_due() or now
+        ticks.extend((now, key, seconds) for key, seconds in ticker.pop_due(now))
+
+    # Every key ticks once per interval, at different times
+    first_round = [t for t in ticks if t[0] < 1010.0]
+    assert sorted(key for _, key, _ in first_round) == list(range(10))
+    assert len({at for at, _, _ in first_round}) == 10
+    for guild_id in range(10):
+        times = [at for at, key, _ in ticks if key == guild_id]
+        assert all(b - a == pytest.approx(10.0) for a, b in zip(times, times[1:]))
+    # No time is lost between ticks
+    assert sum(s for _, key, s in ticks if key == 3) == int(
+        max(at for at, key, _ in ticks if key == 3) - 1000.0
+    )
+
+    ticker.remove(3)
+    assert 3 not in ticker
+    assert all(key != 3 for key, _ in ticker.pop_due(now + 100.0))
+
+    # A long stall is handed over as one catch-up tick
+    ticker.add(3, now + 100.0)
+    due = dict(ticker.pop_due(now + 1000.0))
+    assert due[0] >= 899 and due[3] == 900
+
+
+def test_guild_ticks_match_tick():
+    def make_game():
+        players = {
+            i: Player(id=i, name=f"p{i}", experience=i * 10, level=0, guild_id=i % 3)
+            for i in range(1, 100)
+        }
+        return IdleZ(
+            store=Store(players),
+            data=None,  # type: ignore
+            event_queue=[],
+            event_handlers=[],
+            random=_random.Random(2),
+            player_idle_state_callback=lambda p, _g: [
+                IdleState.ONLINE,
+                IdleState.OFFLINE,
+            ][p % 2],
+        )
+
+    async def run():
+        whole, staggered = make_game(), make_game()
+        with mock.patch.object(IdleZ, "run_encounters"):
+            await whole.tick(600)
+            await staggered.tick_shared(600)
+            for guild_id in range(3):
+                await staggered.tick_guild(guild_id, 600)
+        return whole, staggered
+
+    whole, staggered = asyncio.run(run())
+    assert staggered.store == whole.store
@@ -0,0 +1,298 @@
+import asyncio
+import pathlib
+import shutil
+import pytest
+import idlez.store
+import idlez.storetool
+from idlez.store import (
+    GuildStore,
+    InvalidRecord,
+    Player,
+    Store,
+    read_jsonl,
+    write_jsonl,
+)
+
+
+def make_player(id: int, guild_id: int):
+    return Player(
+        id=id, name=f"player{id}", experience=10 * id, level=id, guild_id=guild_id
+    )
+
+
+def test_store_roundtrip(tmp_path: pathlib.Path):
+    store = Store({i: make_player(i, i % 3) for i in range(10)})
+    store.save(tmp_path)
+
+    assert Store.load(tmp_path) == store
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_read_invalid_record(tmp_path: pathlib.Path):
+    path = tmp_path / "players.jsonl"
+    write_jsonl(path, [make_player(1, 1)])
+    with open(path, "a") as fh:
+        fh.write(
+            '{"id": 2, "name": "x", "experience": "1", "level": 0, "guild_id": 1}\n'
+        )
+
+    with pytest.raises(InvalidRecord) as e:
+        list(read_jsonl(path))
+    assert e.value.record == 2
+
+
+def test_storetool_merge(tmp_path: pathlib.Path):
+    a, b, out = tmp_path / "a.jsonl", tmp_path / "b.jsonl", tmp_path / "out.jsonl"
+    write_jsonl(a, [make_player(1, 1), make_player(2, 2)])
+    write_jsonl(b, [make_player(2, 1), make_player(3, 1), make_player(4, 3)])
+
+    assert (
+        idlez.storetool.main(["merge", str(out), str(a), str(b), "--guild", "1"]) == 0
+    )
+    assert [p.id for p in read_jsonl(out)] == [1, 2, 3]
+    assert idlez.storetool.main(["validate", str(out)]) == 0
+
+    write_jsonl(b, [make_player(2, 1), make_player(2, 1)])
+    assert idlez.storetool.main(["validate", str(b)]) == 1
+
+
+def test_store_parallel_load(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(idlez.store, "PARALLEL_LOAD_MIN_BYTES", 0)
+    store = Store({i: make_player(i, i % 3) for i in range(1000)})
+    store.save(tmp_path)
+
+    progress: list[int] = []
+    loaded = Store.load(
+        tmp_path, workers=2, progress=lambda done, _: progress.append(done)
+    )
+
+    assert loaded == store
+    assert list(loaded.players) == list(store.players)
+    assert progress == sorted(progress)
+    assert progress[-1] == Store.player_file(tmp_path).stat().st_size
+
+    with open(Store.player_file(tmp_path), "a") as fh:
+        fh.write("{}\n")
+    with pytest.raises(InvalidRecord) as e:
+        Store.load(tmp_path, workers=2)
+    assert e.value.record == 1001
+
+
+def test_snapshot(tmp_path: pathlib.Path):
+    store = Store({i: make_player(i, i % 3) for i in [5, 1, 9, 3]})
+    store.players[3].name = "Zoë 🧟"
+    store.format = idlez.store.SNAPSHOT
+    store.save(tmp_path)
+
+    with idlez.store.Snapshot(tmp_path / "players.snap") as snapshot:
+        assert snapshot.is_sorted
+        assert len(snapshot) == 4
+        assert [p.id for p in snapshot] == [1, 3, 5, 9]
+        assert snapshot.get(3) == store.players[3]
+        assert snapshot.get(4) is None
+
+    loaded = Store.load(tmp_path)
+    assert loaded == store
+    assert loaded.format is idlez.store.SNAPSHOT
+
+    # Unsorted snapshots still support lookups
+    path = tmp_path / "unsorted.snap"
+    idlez.store.write_snapshot(path, store.players.values())
+    with idlez.store.Snapshot(path) as snapshot:
+        assert not snapshot.is_sorted
+        assert snapshot.get(9) == store.players[9]
+
+    with open(path, "r+b") as fh:
+        fh.truncate(40)
+    with pytest.raises(idlez.store.StoreError):
+        idlez.store.Snapshot(path)
+
+
+def test_store_loads_newest_format(tmp_path: pathlib.Path):
+    store = Store({1: make_player(1, 1)}, format=idlez.store.SNAPSHOT)
+    store.save(tmp_path)
+    store.players[1].level = 10
+    store.format = idlez.store.JSONL
+    store.save(tmp_path)
+
+    assert Store.load(tmp_path).players[1].level == 10
+
+
+def test_guild_store_evicts_least_recently_used(tmp_path: pathlib.Path):
+    Store({i: make_player(i, i % 3) for i in range(9)}).save(tmp_path)
+
+    store = idlez.store.GuildStore.open(tmp_path, max_players=6)
+    assert store.players == {}
+    assert sorted(f.name for f in GuildStore.guild_dir(tmp_path).iterdir()) == [
+        "0.jsonl",
+        "1.jsonl",
+        "2.jsonl",
+    ]
+
+    loaded, evicted = store.ensure_guild(0)
+    assert sorted(p.id for p in loaded) == [0, 3, 6]
+    assert evicted == []
+    store.ensure_guild(1)
+    store.players[1].level = 42
+
+    # Using guild 0 again makes guild 1 the least recently used one
+    assert store.ensure_guild(0) == ([], [])
+    loaded, evicted = store.ensure_guild(2)
+    assert sorted(p.id for p in evicted) == [1, 4, 7]
+    assert store.loaded_guilds == [0, 2]
+    assert sorted(store.players) == [0, 2, 3, 5, 6, 8]
+
+    # Evicted guilds were saved and can be loaded again
+    loaded, evicted = store.ensure_guild(1)
+    assert [p.level for p in loaded if p.id == 1] == [42]
+    assert sorted(p.id for p in evicted) == [0, 3, 6]
+
+    store.add_player(make_player(10, 1))
+    store.save(tmp_path)
+    store = idlez.store.GuildStore.open(tmp_path)
+    assert sorted(p.id for p in store.ensure_guild(1)[0]) == [1, 4, 7, 10]
+
+    with pytest.raises(idlez.store.StoreError):
+        store.add_player(make_player(11, 5))
+
+
+def test_guild_store_migration(tmp_path: pathlib.Path):
+    Store({i: make_player(i, i % 3) for i in range(9)}).save(tmp_path)
+    store = idlez.store.GuildStore.open(tmp_path)
+
+    # The single file store is retired once split up
+    assert not Store.player_file(tmp_path).exists()
+    assert tmp_path.joinpath("players.jsonl.migrated").exists()
+    with pytest.raises(FileNotFoundError):
+        Store.find_player_file(tmp_path)
+
+    store.ensure_guild(1)
+    store.players[1].experience = 9999
+    store.save(tmp_path)
+    out = tmp_path / "export.jsonl"
+    assert idlez.storetool.main(["export", str(tmp_path), str(out)]) == 0
+    exported = {p.id: p for p in read_jsonl(out)}
+    assert sorted(exported) == list(range(9))
+    assert exported[1].experience == 9999
+    assert idlez.storetool.main(["validate", str(tmp_path)]) == 0
+
+    # Importing replaces the guild files
+    assert idlez.storetool.main(["import", str(out), str(tmp_path)]) == 0
+    assert not GuildStore.guild_dir(tmp_path).exists()
+    store = idlez.store.GuildStore.open(tmp_path)
+    assert [p.experience for p in store.ensure_guild(1)[0] if p.id == 1] == [9999]
+
+
+def test_guild_store_loads_without_blocking(tmp_path: pathlib.Path):
+    Store({i: make_player(i, i % 3) for i in range(9)}).save(tmp_path)
+    store = idlez.store.GuildStore.open(tmp_path, max_players=3)
+
+    async def load_guilds():
+        # Concurrent loads of the same guild read it once
+        results = await asyncio.gather(store.load_guild(0), store.load_guild(0))
+        assert sorted(len(loaded) for loaded, _ in results) == [0, 3]
+        store.players[0].level = 42
+        store.players[3].level = 43
+        await store.save_async(tmp_path)
+        store.players[3].level = 44
+        _, evicted = await store.load_guild(1)
+        assert sorted(p.id for p in evicted) == [0, 3, 6]
+
+    asyncio.run(load_guilds())
+    assert store.loaded_guilds == [1]
+    assert store._saving == {}
+    loaded, _ = store.ensure_guild(0)
+    assert {p.id: p.level for p in loaded if p.id in (0, 3)} == {0: 42, 3: 44}
+
+
+def test_guild_store_reloads_unsaved_guilds(tmp_path: pathlib.Path):
+    Store({i: make_player(i, i % 2) for i in range(4)}).save(tmp_path)
+    store = idlez.store.GuildStore.open(tmp_path, max_players=2)
+    store.ensure_guild(0)
+    store.players[0].level = 42
+    evicted = store.add_guild(1, store.read_guild(1))
+
+    # Guild 0 is evicted, but not written yet
+    assert list(evicted) == [0]
+    assert [p.level for p in store.read_guild(0) if p.id == 0] == [42]
+
+
+@pytest.mark.parametrize("codec", sorted(idlez.store.CODECS))
+def test_compressed_store(tmp_path: pathlib.Path, codec: str):
+    fmt = idlez.store.FORMATS[f"jsonl-{codec}"]
+    store = Store({i: make_player(i, i % 3) for i in range(10)}, format=fmt)
+    store.players[3].name = "Zoë 🧟"
+    store.save(tmp_path)
+
+    loaded = Store.load(tmp_path)
+    assert loaded == store
+    assert loaded.format is fmt
+
+
+def test_compressed_store_recovers_from_torn_write(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(idlez.store, "WRITE_BATCH_SIZE", 4)
+    path = tmp_path / "players.jsonl.zlib"
+    players = [make_player(i, 1) for i in range(10)]
+    assert idlez.store.write_blocks(path, players, idlez.store.CODECS["zlib"], 9) == 10
+    size = path.stat().st_size
+
+    with open(path, "r+b") as fh:
+        fh.truncate(size - 3)
+    with pytest.raises(idlez.store.StoreError):
+        list(idlez.store.read_blocks(path))
+    assert list(idlez.store.read_blocks(path, strict=False)) == players[:8]
+
+    # A corrupt block is detected by its checksum
+    with open(path, "r+b") as fh:
+        fh.seek(idlez.store.BLOCKS_HEADER.size + idlez.store.BLOCK_HEADER.size)
+        byte = fh.read(1)
+        fh.seek(-1, 1)
+        fh.write(bytes([byte[0] ^ 0xFF]))
+    assert list(idlez.store.read_blocks(path, strict=False)) == []
+
+
+def test_storetool_rejects_torn_files(
+    tmp_path: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+):
+    monkeypatch.setattr(idlez.store, "WRITE_BATCH_SIZE", 4)
+    path = tmp_path / "players.jsonl.gzip"
+    idlez.store.write_blocks(
+        path, [make_player(i, 1) for i in range(10)], idlez.store.CODECS["gzip"]
+    )
+    with open(path, "r+b") as fh:
+        fh.truncate(path.stat().st_size - 3)
+
+    assert idlez.storetool.main(["validate", str(path)]) == 1
+    assert "torn or corrupt" in capsys.readouterr().err
+    out = tmp_path / "out.jsonl"
+    assert idlez.storetool.main(["convert", str(path), str(out)]) == 1
+    assert not out.exists()
+    assert idlez.storetool.main(["import", str(path), str(tmp_path / "data")]) == 1
+    assert not Store.player_file(tmp_path / "data").exists()
+
+    # The bot still recovers what it can
+    shutil.copy(path, tmp_path / "data" / path.name)
+    assert len(Store.load(tmp_path / "data").players) == 8
+
+
+def test_storetool_bench(tmp_path: pathlib.Path, capsys: pytest.CaptureFixture[str]):
+    path = tmp_path / "players.jsonl"
+    write_jsonl(path, [make_player(i, i % 3) for i in range(100)])
+
+    assert idlez.storetool.main(["bench", str(path), "--level", "1"]) == 0
+    out = capsys.readouterr().out
+    for name in idlez.store.FORMATS:
+        assert name in out
+
+
+def test_compression_level_is_validated(tmp_path: pathlib.Path):
+    with pytest.raises(idlez.store.StoreError):
+        idlez.store.compressed_format(idlez.store.CODECS["zlib"], 10)
+    path = tmp_path / "players.jsonl"
+    write_jsonl(path, [make_player(1, 1)])
+    with pytest.raises(SystemExit):
+        idlez.storetool.main(["convert", str(path), "out.jsonl.lzma", "--level", "-1"])
@@ -0,0 +1,126 @@
+import asyncio
+import random
+from unittest import mock
+
+import idlez.game as _game
+from idlez.game import Encounter, IdleZ
+from idlez.rng import RandomStreams
+from idlez.store import Player, Store
+from idlez.timing import TimingWheel
+
+
+def test_timing_wheel_expires_in_order():
+    rnd = random.Random(1)
+    wheel: TimingWheel[int] = TimingWheel(now=12345)
+    timers = [wheel.schedule(rnd.randrange(1, 10**7), i) for i in range(500)]
+    timers[0].cancel()
+
+    expired = []
+    while len(wheel):
+        before = wheel.now
+        got = wheel.advance(rnd.randrange(1, 100_000))
+        assert all(before < t.at <= wheel.now for t in got)
+        expired.extend(got)
+
+    assert [t.at for t in expired] == sorted(t.at for t in timers[1:])
+    assert wheel.advance(10) == []
+
+
+def test_timed_encounters_scale_with_guild_size():
+    players = {
+        i: Player(id=i, name=f"p{i}", experience=0, level=0, guild_id=1 + (i >= 100))
+        for i in range(110)
+    }
+    game = IdleZ(
+        store=Store(players),
+        data=None,  # type: ignore
+        event_queue=[],
+        event_handlers=[],
+        random_streams=RandomStreams(seed=1),
+        timed_encounters=True,
+    )
+    asyncio.run(game.activate_guild(1))
+    asyncio.run(game.activate_guild(2))
+    assert len(game.encounter_wheel) == 4
+
+    calls: list[tuple[Encounter, int]] = []
+    with (
+        mock.patch.object(
+            IdleZ,
+            "single_player_event",
+            lambda _self, g: calls.append((Encounter.SINGLE_PLAYER, g)),
+        ),
+        mock.patch.object(
+            IdleZ,
+            "two_player_event",
+            lambda _self, g: calls.append((Encounter.FIGHT, g)),
+        ),
+    ):
+        for _ in range(24 * 60):
+            game.run_timed_encounters(60)
+
+    # 100 players have ~400 single encounters a day, 10 players ~40
+    big = calls.count((Encounter.SINGLE_PLAYER, 1))
+    small = calls.count((Encounter.SINGLE_PLAYER, 2))
+    assert 300 < big < 500
+    assert 20 < small < 60
+    assert calls.count((Encounter.FIGHT, 1)) > calls.count((Encounter.FIGHT, 2))
+    # Every kind stays scheduled once per guild
+    assert len(game.encounter_wheel) == 4
+
+    # A long pause causes a bounded number of encounters per guild
+    with mock.patch.object(IdleZ, "single_player_event") as single:
+        with mock.patch.object(IdleZ, "two_player_event"):
+            game.run_timed_encounters(7 * 24 * 60 * 60)
+    assert single.call_count <= sum(
+        game.encounter_limit(Encounter.SINGLE_PLAYER, guild_id, 7 * 24 * 60 * 60)
+        for guild_id in (1, 2)
+    )
+
+
+def test_timed_encounters_of_large_guilds():
+    players = {
+        i: Player(id=i, name=f"p{i}", experience=0, level=0, guild_id=1)
+        for i in range(5000)
+    }
+    game = IdleZ(
+        store=Store(players),
+        data=None,  # type: ignore
+        event_queue=[],
+        event_handlers=[],
+        random_streams=RandomStreams(seed=1),
+        timed_encounters=True,
+    )
+    asyncio.run(game.activate_guild(1))
+
+    # Far more encounters than MAX_CATCH_UP_ENCOUNTERS per tick
+    with mock.patch.object(IdleZ, "single_player_event") as single:
+        with mock.patch.object(IdleZ, "two_player_event"):
+            for _ in range(60):
+                game.run_timed_encounters(60)
+    # 5000 players have ~833 single encounters an hour
+    assert 700 < single.call_count < 970
+
+
+def test_guild_encounters_do_not_depend_on_other_guilds():
+    def run(guilds: list[int]) -> list[int]:
+        players = {
+            i: Player(id=i, name=f"p{i}", experience=100, level=1, guild_id=guild_id)
+            for i, guild_id in enumerate(guilds)
+        }
+        game = IdleZ(
+            store=Store(players),
+            data=None,  # type: ignore
+            event_queue=[],
+            event_handlers=[],
+            random_streams=RandomStreams(seed=3),
+            timed_encounters=True,
+        )
+        for i in range(0, len(guilds), 2):
+            game.presence_changed(i, _game.IdleState.ONLINE)
+        for _ in range(20):
+            for guild_id in sorted(set(guilds), reverse=True):
+                game.two_player_event(guild_id)
+        return [p.experience for p in game.guild_players(1)]
+
+    assert run([1] * 6) == run([1] * 6 + [2] * 5)